@@ -0,0 +1,281 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from concurrency import LoopSemaphores
+from config import settings
+from exceptions import RateLimitExceededError, ServiceOverloadedError
+from logger import get_logger
+
+logger = get_logger("admission")
+
+# Routes that generate with the LLM and are admitted through the global gate
+LLM_ROUTES = ("/api/chat",)
+
+
+class TokenBucket:
+    """Refills ``rate`` tokens per second up to ``capacity``; each request takes one."""
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+
+    def take(self, now: float) -> float:
+        """Take a token; return 0 on success, else seconds until one is available."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Token buckets per (client, route group).
+
+    Each route group has its own rate, so a client streaming chat turns cannot
+    exhaust its allowance for listing documents and vice versa. Buckets of idle
+    clients are dropped least recently used beyond ``max_clients``.
+    """
+
+    def __init__(self, rates_per_minute: Dict[str, float], burst: int, max_clients: int = 10000):
+        self.rates = {group: rate / 60 for group, rate in rates_per_minute.items()}
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+
+        self.allowed = 0
+        self.limited = 0
+
+    def check(self, client: str, group: str) -> float:
+        """Take a token for ``client`` on ``group``; return 0 or seconds to wait."""
+        rate = self.rates.get(group, self.rates["default"])
+        if rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        key = (client, group)
+        bucket = self._buckets.pop(key, None) or TokenBucket(rate, self.burst, now)
+        self._buckets[key] = bucket
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+
+        retry_after = bucket.take(now)
+        if retry_after:
+            self.limited += 1
+        else:
+            self.allowed += 1
+        return retry_after
+
+    def reset(self) -> None:
+        self._buckets.clear()
+
+    def stats(self) -> dict:
+        return {"clients": len(self._buckets), "allowed": self.allowed, "limited": self.limited}
+
+
+class ConcurrencyGate:
+    """
+    Global limit on LLM requests with a bounded wait queue.
+
+    At most ``max_concurrency`` requests hold a slot and at most ``max_queue``
+    wait for one. A request arriving at a full queue, or waiting longer than
+    ``queue_timeout``, is shed with a retry hint derived from recent slot hold
+    times instead of piling up.
+
+    Chat routes take their slot in the middleware. LLM calls made outside a
+    request, such as session summaries, take one through ``slot``; calls that
+    run in parallel within an admitted request take extra ones through
+    ``try_acquire``.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphores = LoopSemaphores(max_concurrency)
+
+        self._waiting = 0
+        self._in_flight = 0
+        self._peak_waiting = 0
+        self._avg_hold_time = 1.0  # Exponential moving average, in seconds
+        self.admitted = 0
+        self.shed = 0
+
+    def retry_after(self) -> float:
+        """Estimate how long until the current queue has drained."""
+        return self._avg_hold_time * (self._waiting + 1) / self.max_concurrency
+
+    async def acquire(self) -> asyncio.Semaphore:
+        """Wait for a slot or raise ``ServiceOverloadedError``."""
+        semaphore = self._semaphores.get()
+        if semaphore.locked() and self._waiting >= self.max_queue:
+            self.shed += 1
+            raise ServiceOverloadedError("LLM request queue is full", self.retry_after())
+
+        self._waiting += 1
+        self._peak_waiting = max(self._peak_waiting, self._waiting)
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            raise ServiceOverloadedError("timed out waiting for an LLM slot", self.retry_after()) from None
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        self.admitted += 1
+        return semaphore
+
+    async def try_acquire(self) -> Optional[asyncio.Semaphore]:
+        """Take a free slot without waiting; None when all are held or requests are queued."""
+        semaphore = self._semaphores.get()
+        if semaphore.locked():
+            return None
+        await semaphore.acquire()  # Free, so this returns without suspending
+        self._in_flight += 1
+        self.admitted += 1
+        return semaphore
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the block; raises ``ServiceOverloadedError`` when shed."""
+        semaphore = await self.acquire()
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(semaphore, time.monotonic() - start_time)
+
+    def release(self, semaphore: asyncio.Semaphore, hold_time: float) -> None:
+        self._in_flight -= 1
+        self._avg_hold_time = 0.9 * self._avg_hold_time + 0.1 * hold_time
+        semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "queue_depth": self._waiting,
+            "peak_queue_depth": self._peak_waiting,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "avg_hold_ms": round(self._avg_hold_time * 1000, 1),
+        }
+
+
+def route_group(path: str) -> Optional[str]:
+    """Map a request path to its rate limit group; None for unlimited paths."""
+    if not path.startswith("/api/"):
+        return None
+    if path.startswith("/api/chat"):
+        return "chat"
+    if path.startswith("/api/upload"):
+        return "upload"
+    return "default"
+
+
+class AdmissionController:
+    """Rate limiting and LLM concurrency state shared by the middleware."""
+
+    def __init__(
+        self,
+        limiter: Optional[RateLimiter],
+        gate: ConcurrencyGate,
+        client_header: Optional[str] = None,
+    ):
+        self.limiter = limiter
+        self.gate = gate
+        self.client_header = client_header
+
+    def client_id(self, request: Request) -> str:
+        """Identify the client; the header is only trusted when configured."""
+        if self.client_header:
+            forwarded = request.headers.get(self.client_header)
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return request.client.host if request.client else "unknown"
+
+    def stats(self) -> dict:
+        return {
+            "rate_limiter": self.limiter.stats() if self.limiter else None,
+            "llm_gate": self.gate.stats(),
+        }
+
+
+def error_response(exc) -> JSONResponse:
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail}, headers=exc.headers)
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that rate-limits API requests and gates LLM routes.
+
+    The gate slot is held until the response body has been sent, so streamed
+    answers count against the limit for their full duration.
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        group = route_group(path)
+        limiter = self.controller.limiter
+        if group is not None and limiter is not None:
+            client = self.controller.client_id(Request(scope))
+            retry_after = limiter.check(client, group)
+            if retry_after:
+                logger.warning("Rate limited %s on %s routes for %.1fs", client, group, retry_after)
+                await error_response(RateLimitExceededError(retry_after))(scope, receive, send)
+                return
+
+        if scope["method"] != "POST" or not path.startswith(LLM_ROUTES):
+            await self.app(scope, receive, send)
+            return
+
+        gate = self.controller.gate
+        try:
+            semaphore = await gate.acquire()
+        except ServiceOverloadedError as exc:
+            logger.warning("Shed %s: %s", path, exc.detail)
+            await error_response(exc)(scope, receive, send)
+            return
+        start_time = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(semaphore, time.monotonic() - start_time)
+
+
+admission_controller = AdmissionController(
+    limiter=RateLimiter(
+        {
+            "chat": settings.rate_limit_chat_per_minute,
+            "upload": settings.rate_limit_upload_per_minute,
+            "default": settings.rate_limit_default_per_minute,
+        },
+        burst=settings.rate_limit_burst,
+        max_clients=settings.rate_limit_max_clients,
+    ) if settings.rate_limit_enabled else None,
+    gate=ConcurrencyGate(
+        max_concurrency=settings.llm_max_concurrency,
+        max_queue=settings.llm_max_queue,
+        queue_timeout=settings.llm_queue_timeout,
+    ),
+    client_header=settings.rate_limit_client_header,
+)
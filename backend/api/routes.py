@@ -1,272 +1,591 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import List
-import shutil
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime
+import asyncio
+import json
 import os
-from pathlib import Path
+import time
 
 from gemini_client import gemini_client
-from database import get_db
-from models import ChatSession, Document, Message
+from database import get_db, release_connection
+from models import ChatSession, Document, IngestionJob, Message
 from schemas import (
+    BatchUploadItem, BatchUploadResponse,
     ChatRequest, ChatResponse, ChatSessionCreate, ChatSessionResponse,
     DocumentUploadResponse, DocumentResponse, DocumentListResponse,
-    MessageResponse, SessionMessagesResponse
+    IngestionJobResponse, MessageResponse, SessionMessagesResponse
 )
 from exceptions import (
     DocumentUploadError, GeminiAPIError, SessionNotFoundError,
-    DocumentNotFoundError, FileSizeExceededError, InvalidFileTypeError
+    DocumentNotFoundError, FileSizeExceededError, InvalidFileTypeError,
+    JobNotFoundError, GeminiUnavailableError, InvalidCursorError, ServiceOverloadedError
 )
 from config import settings
-from logger import get_logger
+from logger import get_logger, logging_stats
+from upload_pipeline import stage_upload
+from ingestion import ingest_staged_batch, ingest_staged_upload, ingestion_queue
+from retrieval import build_chat_contents
+from fanout import answer_map_reduce, stream_map_reduce
+from conversation import ConversationHistory, load_history, session_summarizer
+from vector_store import vector_store
+from response_cache import CacheLookup, response_cache
+from transport import CircuitOpenError
+from concurrency import QueueTimeoutError
+from admission import admission_controller
+from tracing import span, tracer
+from pagination import TotalCache, fetch_page, projected_columns
+import lexical_index
 
 router = APIRouter()
 logger = get_logger("routes")
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+os.makedirs(settings.upload_dir, exist_ok=True)
 
+# List endpoints read only the columns their response schemas need
+DOCUMENT_COLUMNS = projected_columns(DocumentResponse, Document)
+SESSION_COLUMNS = projected_columns(ChatSessionResponse, ChatSession)
 
-def validate_file(file: UploadFile) -> None:
-    """Validate uploaded file size and type."""
-    # Check file size
-    file.file.seek(0, 2)  # Seek to end
-    file_size = file.file.tell()
-    file.file.seek(0)  # Reset to beginning
-    
-    if file_size > settings.max_file_size:
-        raise FileSizeExceededError(settings.max_file_size)
-    
-    # Check file type
-    if file.content_type not in settings.allowed_file_types_list:
-        raise InvalidFileTypeError(file.content_type, settings.allowed_file_types_list)
+list_totals = TotalCache(settings.list_total_cache_ttl)
+list_totals.track(Document)
+
+
+def gemini_error(e: Exception) -> HTTPException:
+    """Map a failed Gemini call to the HTTP error returned to the client."""
+    if isinstance(e, CircuitOpenError):
+        return GeminiUnavailableError(str(e), e.retry_after)
+    if isinstance(e, QueueTimeoutError):
+        return ServiceOverloadedError(str(e), 1.0)
+    return GeminiAPIError(str(e))
+
+
+def document_upload_response(document: Document, deduplicated: bool = False) -> DocumentUploadResponse:
+    """Build the upload response for a stored document."""
+    return DocumentUploadResponse(
+        id=document.id,
+        filename=document.filename,
+        original_filename=document.original_filename,
+        mime_type=document.mime_type,
+        file_size=document.file_size,
+        gemini_uri=document.gemini_uri,
+        gemini_name=document.gemini_name,
+        uploaded_at=document.uploaded_at,
+        deduplicated=deduplicated
+    )
 
 
 @router.post("/upload", response_model=DocumentUploadResponse)
-async def upload_document(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_document(file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
     """Upload a document to Gemini and save metadata to database."""
     try:
-        logger.info(f"Uploading file: {file.filename}")
+        logger.info("Uploading file: %s", file.filename)
         
-        # Validate file
-        validate_file(file)
-        
-        # Save file temporarily
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Get file size
-        file_size = Path(file_path).stat().st_size
-        
-        # Upload to Gemini
-        gemini_file = gemini_client.upload_file(file_path, mime_type=file.content_type)
-        
-        # Save to database
-        db_document = Document(
-            filename=file.filename,
-            original_filename=file.filename,
-            mime_type=file.content_type,
-            file_size=file_size,
-            gemini_uri=gemini_file.uri,
-            gemini_name=gemini_file.name
-        )
-        db.add(db_document)
-        db.commit()
-        db.refresh(db_document)
+        # Stream to a unique local path, validating size and type and hashing on the way
+        staged = await stage_upload(file)
+    except (FileSizeExceededError, InvalidFileTypeError):
+        raise
+    except Exception as e:
+        logger.error("Error uploading file: %s", e)
+        raise DocumentUploadError(str(e))
+    
+    try:
+        db_document, deduplicated = await ingest_staged_upload(db, staged)
+        if not deduplicated:
+            logger.info("Successfully uploaded file: %s (ID: %s)", file.filename, db_document.id)
         
+        return document_upload_response(db_document, deduplicated=deduplicated)
+    except (CircuitOpenError, QueueTimeoutError) as e:
+        raise gemini_error(e)
+    except Exception as e:
+        logger.error("Error uploading file: %s", e)
+        raise DocumentUploadError(str(e))
+    finally:
         # Clean up local file
-        os.remove(file_path)
-        
-        logger.info(f"Successfully uploaded file: {file.filename} (ID: {db_document.id})")
+        staged.discard()
+
+
+@router.post("/upload/batch", response_model=BatchUploadResponse)
+async def upload_documents_batch(files: List[UploadFile] = File(...), db: AsyncSession = Depends(get_db)):
+    """
+    Upload many documents in one request.
+
+    Every file is staged and validated independently, new content is sent to Gemini
+    with bounded parallelism and all new Documents are saved in one transaction.
+    A file that fails does not affect the others; see each entry's status.
+    """
+    if len(files) > settings.max_batch_files:
+        raise DocumentUploadError(f"at most {settings.max_batch_files} files per batch")
+    
+    logger.info("Uploading batch of %s files", len(files))
+    
+    staging_results = await asyncio.gather(
+        *(stage_upload(file) for file in files), return_exceptions=True
+    )
+    results = [None] * len(files)
+    staged_uploads = []
+    staged_indexes = []
+    for index, (file, staged) in enumerate(zip(files, staging_results)):
+        if isinstance(staged, Exception):
+            detail = getattr(staged, "detail", str(staged))
+            logger.warning("Rejected file in batch: %s - %s", file.filename, detail)
+            results[index] = BatchUploadItem(filename=file.filename, status="failed", error=detail)
+        else:
+            staged_uploads.append(staged)
+            staged_indexes.append(index)
+    
+    try:
+        ingested = await ingest_staged_batch(db, staged_uploads, settings.batch_upload_concurrency)
+    except Exception as e:
+        logger.error("Error uploading batch: %s", e)
+        raise DocumentUploadError(str(e))
+    finally:
+        for staged in staged_uploads:
+            staged.discard()
+    
+    for index, (document, deduplicated, error) in zip(staged_indexes, ingested):
+        if error is not None:
+            results[index] = BatchUploadItem(filename=files[index].filename, status="failed", error=error)
+        else:
+            results[index] = BatchUploadItem(
+                filename=files[index].filename,
+                status="deduplicated" if deduplicated else "uploaded",
+                document=document_upload_response(document, deduplicated=deduplicated)
+            )
+    
+    failed = sum(1 for result in results if result.status == "failed")
+    logger.info("Batch upload completed: %s succeeded, %s failed", len(results) - failed, failed)
+    
+    return BatchUploadResponse(results=results, succeeded=len(results) - failed, failed=failed)
+
+
+@router.post("/upload/async", response_model=IngestionJobResponse, status_code=202)
+async def upload_document_async(file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
+    """Accept a document for background upload and return its ingestion job."""
+    try:
+        logger.info("Queueing file for ingestion: %s", file.filename)
         
-        return DocumentUploadResponse(
-            id=db_document.id,
-            filename=db_document.filename,
-            original_filename=db_document.original_filename,
-            mime_type=db_document.mime_type,
-            file_size=db_document.file_size,
-            gemini_uri=db_document.gemini_uri,
-            gemini_name=db_document.gemini_name,
-            uploaded_at=db_document.uploaded_at
-        )
+        staged = await stage_upload(file)
     except (FileSizeExceededError, InvalidFileTypeError):
         raise
     except Exception as e:
-        logger.error(f"Error uploading file: {str(e)}")
+        logger.error("Error staging file: %s", e)
+        raise DocumentUploadError(str(e))
+    
+    try:
+        job = await ingestion_queue.submit(db, staged)
+    except Exception as e:
+        staged.discard()
+        logger.error("Error queueing file: %s", e)
         raise DocumentUploadError(str(e))
+    
+    logger.info("Queued ingestion job %s for file: %s", job.id, file.filename)
+    return IngestionJobResponse.model_validate(job)
+
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobResponse)
+async def get_job(job_id: str, db: AsyncSession = Depends(get_db)):
+    """Get the status of a background ingestion job."""
+    job = await db.get(IngestionJob, job_id)
+    if not job:
+        raise JobNotFoundError(job_id)
+    return IngestionJobResponse.model_validate(job)
+
+
+async def get_or_create_session(db: AsyncSession, request: ChatRequest) -> ChatSession:
+    """Return the requested chat session, creating a new one if no id was given."""
+    if request.session_id:
+        with span("session.lookup"):
+            session = await db.get(ChatSession, request.session_id)
+        if not session:
+            raise SessionNotFoundError(request.session_id)
+        return session
+    
+    with span("session.create"):
+        session = ChatSession(title=request.query[:50])  # Use first 50 chars as title
+        db.add(session)
+        await db.commit()
+    logger.info("Created new session: %s", session.id)
+    return session
+
+
+async def save_message(db: AsyncSession, session_id: int, role: str, content: str) -> Message:
+    """Persist a single chat message and bump its session's counters in the same transaction."""
+    with span(f"message.save_{role}"):
+        now = datetime.utcnow()
+        message = Message(session_id=session_id, role=role, content=content, created_at=now)
+        db.add(message)
+        # Incremented in SQL so concurrent turns on one session cannot lose a count
+        await db.execute(
+            update(ChatSession)
+            .where(ChatSession.id == session_id)
+            .values(message_count=ChatSession.message_count + 1, last_message_at=now)
+        )
+        await db.commit()
+    # Not refreshed: the id and timestamps are set by the flush, and a refresh would begin
+    # a new transaction that holds the connection through the model call
+    return message
+
+
+async def load_turn_history(db: AsyncSession, session: ChatSession, user_message: Message) -> Optional[ConversationHistory]:
+    """Load the earlier turns sent with this one, or None when history is disabled."""
+    if not settings.history_enabled:
+        return None
+    with span("history.load"):
+        return await load_history(db, session, before_message_id=user_message.id)
+
+
+async def lookup_cached_response(
+    request: ChatRequest, history: Optional[ConversationHistory]
+) -> Optional[CacheLookup]:
+    """
+    Look up a cached answer for the turn.
+
+    Returns None when the response cache is disabled, for map-reduce turns, or when
+    the turn has history: the cache key does not cover earlier turns, so only
+    opening questions are shared.
+    """
+    if not settings.response_cache_enabled or request.mode != "standard":
+        return None
+    if history is not None and not history.empty:
+        return None
+    with span("response_cache.lookup") as lookup_span:
+        lookup = await response_cache.get(request.query, request.file_uris)
+        if lookup_span is not None:
+            lookup_span.set_attribute("hit", lookup.hit)
+        return lookup
+
+
+async def single_chunk_stream(text: str):
+    """Replay a cached answer through the streaming path as one token event."""
+    yield "token", {"text": text}
+
+
+async def token_events(upstream):
+    """Wrap a text stream as ``token`` events."""
+    try:
+        async for text in upstream:
+            yield "token", {"text": text}
+    finally:
+        await upstream.aclose()
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Format a Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest, db: Session = Depends(get_db)):
+async def chat(request: ChatRequest, db: AsyncSession = Depends(get_db)):
     """Send a chat message and get response from Gemini."""
     try:
-        logger.info(f"Processing chat request for session: {request.session_id}")
+        logger.debug("Processing chat request for session: %s", request.session_id)
         
         # Get or create session
-        if request.session_id:
-            session = db.query(ChatSession).filter(ChatSession.id == request.session_id).first()
-            if not session:
-                raise SessionNotFoundError(request.session_id)
-        else:
-            session = ChatSession(title=request.query[:50])  # Use first 50 chars as title
-            db.add(session)
-            db.commit()
-            db.refresh(session)
-            logger.info(f"Created new session: {session.id}")
+        session = await get_or_create_session(db, request)
         
         # Save user message
-        user_message = Message(
-            session_id=session.id,
-            role="user",
-            content=request.query
-        )
-        db.add(user_message)
-        db.commit()
-        db.refresh(user_message)
+        user_message = await save_message(db, session.id, "user", request.query)
         
-        # Get response from Gemini
-        try:
-            response_text = gemini_client.chat_with_files(request.query, request.file_uris)
-        except Exception as e:
-            logger.error(f"Gemini API error: {str(e)}")
-            raise GeminiAPIError(str(e))
+        # Get response from the cache or Gemini
+        history = await load_turn_history(db, session, user_message)
+        cache_lookup = await lookup_cached_response(request, history)
+        if cache_lookup is not None and cache_lookup.hit:
+            logger.info("Response cache %s hit for session: %s", cache_lookup.layer, session.id)
+            response_text = cache_lookup.response
+        else:
+            try:
+                start_time = time.perf_counter()
+                if request.mode == "map_reduce":
+                    with span("map_reduce", files=len(request.file_uris)):
+                        response_text = await answer_map_reduce(db, request.query, request.file_uris, history)
+                else:
+                    with span("context.build", files=len(request.file_uris)):
+                        contents = await build_chat_contents(db, request.query, request.file_uris, history)
+                    response_text = await gemini_client.agenerate(contents)
+            except Exception as e:
+                logger.error("Gemini API error: %s", e)
+                raise gemini_error(e)
+            if cache_lookup is not None:
+                response_cache.put(cache_lookup, response_text, time.perf_counter() - start_time)
         
         # Save assistant message
-        assistant_message = Message(
-            session_id=session.id,
-            role="assistant",
-            content=response_text
-        )
-        db.add(assistant_message)
-        db.commit()
-        db.refresh(assistant_message)
+        await save_message(db, session.id, "assistant", response_text)
+        if settings.history_enabled:
+            session_summarizer.schedule(session.id)
         
-        logger.info(f"Chat response generated for session: {session.id}")
+        logger.info("Chat response generated for session: %s", session.id)
         
-        return ChatResponse(
-            session_id=session.id,
-            message=MessageResponse(
-                id=user_message.id,
-                role=user_message.role,
-                content=user_message.content,
-                created_at=user_message.created_at
-            ),
-            response=response_text
-        )
-    except (SessionNotFoundError, GeminiAPIError):
+        with span("response.build"):
+            return ChatResponse(
+                session_id=session.id,
+                message=MessageResponse(
+                    id=user_message.id,
+                    role=user_message.role,
+                    content=user_message.content,
+                    created_at=user_message.created_at
+                ),
+                response=response_text,
+                cached=cache_lookup is not None and cache_lookup.hit
+            )
+    except (SessionNotFoundError, GeminiAPIError, GeminiUnavailableError, ServiceOverloadedError):
         raise
     except Exception as e:
-        logger.error(f"Error processing chat: {str(e)}")
+        logger.error("Error processing chat: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Send a chat message and stream the Gemini response as Server-Sent Events.
+
+    Emits a ``session`` event with the saved user message, one ``token`` event per
+    generated chunk, and a final ``done`` event carrying the assistant message id,
+    time-to-first-token and total latency. In map-reduce mode a ``progress`` event
+    precedes the tokens for every finished document group. Upstream failures are
+    reported as an ``error`` event since the response status has already been sent.
+    """
+    logger.debug("Processing streaming chat request for session: %s", request.session_id)
+    
+    session = await get_or_create_session(db, request)
+    user_message = await save_message(db, session.id, "user", request.query)
+    
+    async def event_stream():
+        start_time = time.perf_counter()
+        first_token_time = None
+        chunks = []
+        
+        yield format_sse("session", {
+            "session_id": session.id,
+            "message": MessageResponse.model_validate(user_message).model_dump(mode="json"),
+        })
+        
+        upstream = None
+        cache_lookup = None
+        try:
+            history = await load_turn_history(db, session, user_message)
+            cache_lookup = await lookup_cached_response(request, history)
+            if cache_lookup is not None and cache_lookup.hit:
+                logger.info("Response cache %s hit for session: %s", cache_lookup.layer, session.id)
+                await release_connection(db)
+                upstream = single_chunk_stream(cache_lookup.response)
+            elif request.mode == "map_reduce":
+                upstream = stream_map_reduce(db, request.query, request.file_uris, history)
+            else:
+                with span("context.build", files=len(request.file_uris)):
+                    contents = await build_chat_contents(db, request.query, request.file_uris, history)
+                upstream = token_events(gemini_client.astream_generate(contents))
+            async for event, data in upstream:
+                if event == "token":
+                    if first_token_time is None:
+                        first_token_time = time.perf_counter()
+                    chunks.append(data["text"])
+                yield format_sse(event, data)
+                
+                if await http_request.is_disconnected():
+                    logger.info("Client disconnected from stream for session: %s", session.id)
+                    return
+        except asyncio.CancelledError:
+            logger.info("Stream cancelled for session: %s", session.id)
+            raise
+        except Exception as e:
+            logger.error("Gemini API error: %s", e)
+            yield format_sse("error", {"detail": gemini_error(e).detail})
+            return
+        finally:
+            if upstream is not None:
+                await upstream.aclose()
+        
+        total_time = time.perf_counter() - start_time
+        ttft = (first_token_time - start_time) if first_token_time is not None else total_time
+        
+        response_text = "".join(chunks)
+        if cache_lookup is not None and not cache_lookup.hit:
+            response_cache.put(cache_lookup, response_text, total_time)
+        assistant_message = await save_message(db, session.id, "assistant", response_text)
+        if settings.history_enabled:
+            session_summarizer.schedule(session.id)
+        
+        logger.info(
+            "Chat stream completed for session: %s - TTFT: %.3fs - Total: %.3fs",
+            session.id, ttft, total_time
+        )
+        yield format_sse("done", {
+            "message_id": assistant_message.id,
+            "ttft_ms": round(ttft * 1000, 1),
+            "total_ms": round(total_time * 1000, 1),
+            "cached": cache_lookup is not None and cache_lookup.hit,
+        })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/documents", response_model=DocumentListResponse)
 async def list_documents(
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     active_only: bool = True,
-    db: Session = Depends(get_db)
+    include_total: bool = True,
+    skip: int = Query(0, ge=0, deprecated=True),
+    db: AsyncSession = Depends(get_db)
 ):
-    """List all uploaded documents with pagination."""
+    """
+    List uploaded documents, newest first, one page at a time.
+
+    Pass ``next_cursor`` from the previous page as ``cursor``. ``total`` may be
+    up to ``LIST_TOTAL_CACHE_TTL`` seconds old.
+    """
     try:
-        logger.info(f"Listing documents (skip={skip}, limit={limit}, active_only={active_only})")
+        logger.debug("Listing documents (cursor=%s, limit=%s, active_only=%s)", cursor, limit, active_only)
         
-        query = db.query(Document)
+        query = select(*DOCUMENT_COLUMNS)
         if active_only:
-            query = query.filter(Document.is_active == True)
+            query = query.where(Document.is_active == True)
         
-        total = query.count()
-        documents = query.order_by(Document.uploaded_at.desc()).offset(skip).limit(limit).all()
+        total = None
+        if include_total:
+            total = await list_totals.count(db, (Document.__tablename__, active_only), query)
+        rows, next_cursor = await fetch_page(
+            db, query.offset(skip) if skip else query, Document.uploaded_at, Document.id, limit, cursor
+        )
         
         return DocumentListResponse(
-            documents=[DocumentResponse.from_orm(doc) for doc in documents],
-            total=total
+            documents=[DocumentResponse(**row._mapping) for row in rows],
+            total=total,
+            next_cursor=next_cursor
         )
+    except InvalidCursorError:
+        raise
     except Exception as e:
-        logger.error(f"Error listing documents: {str(e)}")
+        logger.error("Error listing documents: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.delete("/documents/{document_id}")
-async def delete_document(document_id: int, db: Session = Depends(get_db)):
+async def delete_document(document_id: int, db: AsyncSession = Depends(get_db)):
     """Delete a document (soft delete - marks as inactive)."""
     try:
-        logger.info(f"Deleting document: {document_id}")
+        logger.info("Deleting document: %s", document_id)
         
-        document = db.query(Document).filter(Document.id == document_id).first()
+        document = await db.get(Document, document_id)
         if not document:
             raise DocumentNotFoundError(document_id)
         
-        # Soft delete
+        # Soft delete; the full-text entries go in the same transaction
+        if document.is_active:
+            await lexical_index.remove_document(db, document_id)
         document.is_active = False
-        db.commit()
+        await db.commit()
+        response_cache.invalidate_file(document.gemini_name)
+        await run_in_threadpool(vector_store.remove_document, document_id)
         
         # Optionally delete from Gemini
         try:
-            gemini_client.delete_file(document.gemini_name)
-            logger.info(f"Deleted file from Gemini: {document.gemini_name}")
+            await gemini_client.adelete_file(document.gemini_name)
+            logger.info("Deleted file from Gemini: %s", document.gemini_name)
         except Exception as e:
-            logger.warning(f"Could not delete file from Gemini: {str(e)}")
+            logger.warning("Could not delete file from Gemini: %s", e)
         
         return {"message": f"Document {document_id} deleted successfully"}
     except DocumentNotFoundError:
         raise
     except Exception as e:
-        logger.error(f"Error deleting document: {str(e)}")
+        logger.error("Error deleting document: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/sessions", response_model=ChatSessionResponse)
-async def create_session(session: ChatSessionCreate, db: Session = Depends(get_db)):
+async def create_session(session: ChatSessionCreate, db: AsyncSession = Depends(get_db)):
     """Create a new chat session."""
     try:
-        logger.info(f"Creating new session with title: {session.title}")
+        logger.info("Creating new session with title: %s", session.title)
         
         db_session = ChatSession(title=session.title)
         db.add(db_session)
-        db.commit()
-        db.refresh(db_session)
+        await db.commit()
+        await db.refresh(db_session)
         
-        return ChatSessionResponse.from_orm(db_session)
+        return ChatSessionResponse.model_validate(db_session)
     except Exception as e:
-        logger.error(f"Error creating session: {str(e)}")
+        logger.error("Error creating session: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/sessions/{session_id}/messages", response_model=SessionMessagesResponse)
-async def get_session_messages(session_id: int, db: Session = Depends(get_db)):
+async def get_session_messages(session_id: int, db: AsyncSession = Depends(get_db)):
     """Get all messages for a specific session."""
     try:
-        logger.info(f"Getting messages for session: {session_id}")
+        logger.debug("Getting messages for session: %s", session_id)
         
-        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        session = await db.get(ChatSession, session_id)
         if not session:
             raise SessionNotFoundError(session_id)
         
-        messages = db.query(Message).filter(Message.session_id == session_id).order_by(Message.created_at).all()
+        result = await db.scalars(
+            select(Message).where(Message.session_id == session_id).order_by(Message.created_at)
+        )
+        messages = result.all()
         
         return SessionMessagesResponse(
             session_id=session_id,
-            messages=[MessageResponse.from_orm(msg) for msg in messages],
+            messages=[MessageResponse.model_validate(msg) for msg in messages],
             total=len(messages)
         )
     except SessionNotFoundError:
         raise
     except Exception as e:
-        logger.error(f"Error getting session messages: {str(e)}")
+        logger.error("Error getting session messages: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/sessions", response_model=List[ChatSessionResponse])
-async def list_sessions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """List all chat sessions."""
+async def list_sessions(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    skip: int = Query(0, ge=0, deprecated=True),
+    db: AsyncSession = Depends(get_db)
+):
+    """List chat sessions, most recently updated first; the next page's cursor is in ``X-Next-Cursor``."""
     try:
-        logger.info(f"Listing sessions (skip={skip}, limit={limit})")
+        logger.debug("Listing sessions (cursor=%s, limit=%s)", cursor, limit)
         
-        sessions = db.query(ChatSession).order_by(ChatSession.updated_at.desc()).offset(skip).limit(limit).all()
+        query = select(*SESSION_COLUMNS)
+        rows, next_cursor = await fetch_page(
+            db, query.offset(skip) if skip else query, ChatSession.updated_at, ChatSession.id, limit, cursor
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         
-        return [ChatSessionResponse.from_orm(session) for session in sessions]
+        return [ChatSessionResponse(**row._mapping) for row in rows]
+    except InvalidCursorError:
+        raise
     except Exception as e:
-        logger.error(f"Error listing sessions: {str(e)}")
+        logger.error("Error listing sessions: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/stats")
+async def get_stats():
+    """Report runtime statistics for internal components."""
+    return {
+        "llm_backend": gemini_client.backend.stats(),
+        "gemini_executor": gemini_client.executor.stats(),
+        "gemini_transport": gemini_client.transport.stats(),
+        "gemini_file_cache": gemini_client.file_cache.stats(),
+        "gemini_context_cache": gemini_client.context_cache.stats() if gemini_client.context_cache else None,
+        "ingestion_queue": ingestion_queue.stats(),
+        "vector_store": vector_store.stats(),
+        "response_cache": response_cache.stats(),
+        "admission": admission_controller.stats(),
+        "tracing": tracer.stats(),
+        "logging": logging_stats(),
+        "list_totals": list_totals.stats(),
+    }
@@ -0,0 +1,353 @@
+"""
+Load-test the API end to end against the fake LLM backend.
+
+Boots ``main:app`` under uvicorn in a subprocess with a scratch database,
+upload directory and vector store, seeds documents and sessions, then drives a
+weighted mix of chat, upload, document listing and session history requests
+from closed-loop workers at each concurrency level. Reports p50/p95/p99
+latency, throughput and status codes per operation, and the server's peak RSS.
+
+Usage (from the backend directory):
+    python benchmarks/bench_api.py --concurrency 1 8 32 --duration 10
+    python benchmarks/bench_api.py --mix chat=1,documents=4 --llm-latency-ms 50
+    python benchmarks/bench_api.py --json > bench_api.json
+    python benchmarks/bench_api.py --baseline bench_api.json --max-regression 0.25
+
+With ``--baseline`` the run exits with status 1 when a p95 latency or
+throughput is worse than the baseline by more than ``--max-regression``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+OPERATIONS = ("chat", "upload", "documents", "messages")
+DEFAULT_MIX = "chat=3,upload=1,documents=3,messages=3"
+QUESTIONS = [
+    "What are the service intervals?",
+    "Summarize the safety requirements.",
+    "Who owns the maintenance schedule?",
+    "Which parts need replacing first?",
+    "What does the report say about costs?",
+]
+WORDS = (
+    "pump valve pressure schedule inspection filter seal motor bearing report "
+    "owner budget safety interval replacement calibration sensor warranty"
+).split()
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parse ``op=weight,...`` into weights for the known operations."""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation '{name}', expected one of {OPERATIONS}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of ``values`` (which must be non-empty)."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def read_peak_rss_mb(pid: int) -> Optional[float]:
+    """Return a process's peak resident set size (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def make_document(rng: random.Random, size_words: int) -> bytes:
+    """Build a unique text document so uploads are never deduplicated."""
+    words = [rng.choice(WORDS) for _ in range(size_words)]
+    return (f"Document {rng.getrandbits(64):x}. " + " ".join(words) + ".").encode()
+
+
+def server_env(workdir: str, args) -> Dict[str, str]:
+    """Environment for the server: scratch state, fake backend, no rate limits."""
+    return {
+        **os.environ,
+        "PYTHONPATH": str(BACKEND_DIR),
+        "DATABASE_URL": f"sqlite+aiosqlite:///{workdir}/bench.db",
+        "UPLOAD_DIR": f"{workdir}/uploads",
+        "VECTOR_STORE_DIR": f"{workdir}/vector_store",
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "FAKE_LLM_CHUNK_INTERVAL_MS": str(args.llm_chunk_interval_ms),
+        "FAKE_LLM_ERROR_RATE": str(args.llm_error_rate),
+        "FAKE_LLM_SEED": str(args.seed),
+        "RATE_LIMIT_ENABLED": "false",
+        "LOG_LEVEL": "WARNING",
+    }
+
+
+def start_server(workdir: str, port: int, args) -> subprocess.Popen:
+    """Start uvicorn and wait until /health answers."""
+    log_path = Path(workdir) / "server.log"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=workdir,
+        env=server_env(workdir, args),
+        stdout=subprocess.DEVNULL,
+        stderr=log_path.open("wb"),
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited during startup:\n{log_path.read_text()}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("Server did not become healthy within 30s")
+
+
+class Workload:
+    """Shared state for the request mix: seeded documents and sessions."""
+
+    def __init__(self, client: httpx.AsyncClient, weights: Dict[str, float], rng: random.Random, doc_words: int):
+        self.client = client
+        self.operations = list(weights)
+        self.weights = [weights[name] for name in self.operations]
+        self.rng = rng
+        self.doc_words = doc_words
+        self.file_uris: List[str] = []
+        self.session_ids: List[int] = []
+
+    async def seed(self, documents: int, sessions: int) -> None:
+        for _ in range(documents):
+            await self.upload()
+        for _ in range(sessions):
+            response = await self.client.post("/api/chat", json={"query": self.rng.choice(QUESTIONS)})
+            response.raise_for_status()
+            self.session_ids.append(response.json()["session_id"])
+
+    async def upload(self) -> httpx.Response:
+        name = f"doc-{self.rng.getrandbits(32):08x}.txt"
+        body = make_document(self.rng, self.doc_words)
+        response = await self.client.post("/api/upload", files={"file": (name, body, "text/plain")})
+        if response.status_code == 200:
+            self.file_uris.append(response.json()["gemini_uri"])
+        return response
+
+    async def chat(self) -> httpx.Response:
+        return await self.client.post("/api/chat", json={
+            "query": self.rng.choice(QUESTIONS),
+            "session_id": self.rng.choice(self.session_ids),
+            "file_uris": self.rng.sample(self.file_uris, min(2, len(self.file_uris))),
+        })
+
+    async def documents(self) -> httpx.Response:
+        return await self.client.get("/api/documents", params={"limit": 20})
+
+    async def messages(self) -> httpx.Response:
+        return await self.client.get(f"/api/sessions/{self.rng.choice(self.session_ids)}/messages")
+
+    def pick(self) -> str:
+        return self.rng.choices(self.operations, weights=self.weights)[0]
+
+
+async def run_level(workload: Workload, concurrency: int, duration: float) -> Dict[str, list]:
+    """Run closed-loop workers for ``duration`` seconds; return samples per operation."""
+    samples: Dict[str, list] = {name: [] for name in workload.operations}
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            name = workload.pick()
+            start_time = time.perf_counter()
+            try:
+                status = (await getattr(workload, name)()).status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            samples[name].append((time.perf_counter() - start_time, status))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+
+def summarize(samples: Dict[str, list], elapsed: float) -> dict:
+    """Latency percentiles, throughput and status counts per operation and overall."""
+    def describe(entries):
+        latencies = [latency for latency, _ in entries]
+        statuses: Dict[str, int] = {}
+        for _, status in entries:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        if not latencies:
+            return {"requests": 0}
+        return {
+            "requests": len(latencies),
+            "rps": round(len(latencies) / elapsed, 2),
+            "errors": sum(count for status, count in statuses.items() if not status.startswith("2")),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+            "status": statuses,
+        }
+
+    operations = {name: describe(entries) for name, entries in samples.items()}
+    return {"overall": describe([entry for entries in samples.values() for entry in entries]), "operations": operations}
+
+
+async def benchmark(port: int, server_pid: int, args) -> List[dict]:
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+        workload = Workload(client, parse_mix(args.mix), rng, args.doc_words)
+        await workload.seed(args.documents, args.sessions)
+
+        levels = []
+        for concurrency in args.concurrency:
+            if args.warmup:
+                await run_level(workload, concurrency, args.warmup)
+            start_time = time.perf_counter()
+            samples = await run_level(workload, concurrency, args.duration)
+            elapsed = time.perf_counter() - start_time
+            levels.append({
+                "concurrency": concurrency,
+                "duration_s": round(elapsed, 2),
+                **summarize(samples, elapsed),
+                "peak_rss_mb": read_peak_rss_mb(server_pid),
+            })
+        return levels
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def find_regressions(results: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Compare p95 latency and throughput per level and operation against a baseline run."""
+    regressions = []
+    previous_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in results["levels"]:
+        previous = previous_levels.get(level["concurrency"])
+        if previous is None:
+            continue
+        pairs = [("overall", level["overall"], previous["overall"])] + [
+            (name, stats, previous["operations"].get(name, {})) for name, stats in level["operations"].items()
+        ]
+        for name, current, before in pairs:
+            if not current.get("requests") or not before.get("requests"):
+                continue
+            label = f"c={level['concurrency']} {name}"
+            if current["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+                regressions.append(f"{label}: p95 {before['p95_ms']}ms -> {current['p95_ms']}ms")
+            if current["rps"] < before["rps"] * (1 - max_regression):
+                regressions.append(f"{label}: rps {before['rps']} -> {current['rps']}")
+    return regressions
+
+
+def print_table(results: dict) -> None:
+    print(f"{'conc':>5} {'operation':<10} {'reqs':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for level in results["levels"]:
+        rows = [("overall", level["overall"])] + list(level["operations"].items())
+        for name, stats in rows:
+            if not stats.get("requests"):
+                continue
+            print(
+                f"{level['concurrency']:>5} {name:<10} {stats['requests']:>6} {stats['rps']:>8} "
+                f"{stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['errors']:>7}"
+            )
+        print(f"{'':>5} peak server RSS: {level['peak_rss_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Concurrent clients per level")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before each level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Operation weights, e.g. chat=3,upload=1")
+    parser.add_argument("--documents", type=int, default=20, help="Documents uploaded before measuring")
+    parser.add_argument("--sessions", type=int, default=10, help="Chat sessions created before measuring")
+    parser.add_argument("--doc-words", type=int, default=2000, help="Words per uploaded document")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="Fake LLM median time to first token")
+    parser.add_argument("--llm-chunk-interval-ms", type=float, default=10.0, help="Fake LLM time between chunks")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Fraction of fake LLM calls that fail")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Emit results as JSON")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Tolerated fractional slowdown")
+    args = parser.parse_args()
+    parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        port = free_port()
+        server = start_server(workdir, port, args)
+        try:
+            levels = asyncio.run(benchmark(port, server.pid, args))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    results = {
+        "benchmark": "api",
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {name: value for name, value in vars(args).items() if name not in ("json", "output", "baseline", "max_regression")},
+        "levels": levels,
+        "peak_rss_mb": round(max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+    }
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline.get("config") != results["config"]:
+            print("WARNING baseline was recorded with different options", file=sys.stderr)
+        regressions = find_regressions(results, baseline, args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
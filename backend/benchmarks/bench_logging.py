@@ -0,0 +1,136 @@
+"""
+Benchmark the logging cost of one chat request on the calling thread.
+
+Compares the previous setup (synchronous console and file handlers attached to
+the logger, eager f-strings, an incoming and a completed line per request) with
+the queue pipeline in ``logger.py`` (records handed to a writer thread
+unformatted, per-request chatter at DEBUG, one structured access line). The
+calling thread is the event loop in the server, so its time per request is what
+every request pays; the writer's drain time is reported separately. Console
+output goes to /dev/null and files to a scratch directory.
+
+Usage (from the backend directory):
+    python benchmarks/bench_logging.py --requests 20000
+    python benchmarks/bench_logging.py --sample-rate 0.1 --json
+"""
+import argparse
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from logger import JsonFormatter, NonBlockingQueueHandler, SamplingFilter, detailed_formatter, simple_formatter
+
+
+def isolated_logger(name: str, handlers) -> logging.Logger:
+    log = logging.getLogger(f"bench.{name}")
+    log.handlers = []
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    for handler in handlers:
+        log.addHandler(handler)
+    return log
+
+
+def console_handler(devnull) -> logging.Handler:
+    handler = logging.StreamHandler(devnull)
+    handler.setLevel(logging.INFO)
+    handler.setFormatter(simple_formatter)
+    return handler
+
+
+def previous_request(log: logging.Logger, session_id: int, elapsed: float) -> None:
+    """The lines a chat request logged before the pipeline: all INFO, formatted eagerly."""
+    method, path = "POST", "/api/chat"
+    log.info(f"Incoming request: {method} {path}")
+    log.info(f"Processing chat request for session: {session_id}")
+    log.info(f"Packed context: ~{2048} tokens, {8}/{32} passages from {3} documents, {4}/{6} turns")
+    log.info(f"Chat response generated for session: {session_id}")
+    log.info(f"Request completed: {method} {path} - Status: {200} - Time: {elapsed:.3f}s")
+
+
+def pipeline_request(log: logging.Logger, access: logging.Logger, session_id: int, elapsed: float) -> None:
+    """The same request with lazy arguments, DEBUG chatter and one structured access line."""
+    log.debug("Processing chat request for session: %s", session_id)
+    log.info("Packed context: ~%s tokens, %s/%s passages from %s documents, %s/%s turns", 2048, 8, 32, 3, 4, 6)
+    log.info("Chat response generated for session: %s", session_id)
+    access.info(
+        "Request completed: %s %s - Status: %s - Time: %.3fs", "POST", "/api/chat", 200, elapsed,
+        extra={"method": "POST", "path": "/api/chat", "status": 200, "duration_ms": round(elapsed * 1000, 2)}
+    )
+
+
+def measure_previous(workdir: str, devnull, requests: int) -> dict:
+    file_handler = logging.FileHandler(os.path.join(workdir, "previous.log"))
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(detailed_formatter)
+    log = isolated_logger("previous", [console_handler(devnull), file_handler])
+
+    start = time.perf_counter()
+    for index in range(requests):
+        previous_request(log, index, 0.0123)
+    caller = time.perf_counter() - start
+    file_handler.close()
+    return {"caller_us_per_request": round(caller / requests * 1e6, 2), "drain_ms": 0.0}
+
+
+def measure_pipeline(workdir: str, devnull, requests: int, sample_rate: float) -> dict:
+    file_handler = logging.FileHandler(os.path.join(workdir, "pipeline.log"))
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(JsonFormatter())
+    log_queue = queue.Queue(maxsize=requests * 4)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter({"bench.pipeline.access": sample_rate}))
+    listener = logging.handlers.QueueListener(
+        log_queue, console_handler(devnull), file_handler, respect_handler_level=True
+    )
+    log = isolated_logger("pipeline", [queue_handler])
+    access = logging.getLogger("bench.pipeline.access")
+    listener.start()
+
+    start = time.perf_counter()
+    for index in range(requests):
+        pipeline_request(log, access, index, 0.0123)
+    caller = time.perf_counter() - start
+    listener.stop()
+    drain = time.perf_counter() - start - caller
+    file_handler.close()
+    return {
+        "caller_us_per_request": round(caller / requests * 1e6, 2),
+        "drain_ms": round(drain * 1000, 1),
+        "dropped": queue_handler.dropped,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--sample-rate", type=float, default=1.0, help="Fraction of access lines kept")
+    parser.add_argument("--json", action="store_true", help="Emit results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir, open(os.devnull, "w") as devnull:
+        results = {
+            "requests": args.requests,
+            "previous": measure_previous(workdir, devnull, args.requests),
+            "pipeline": measure_pipeline(workdir, devnull, args.requests, args.sample_rate),
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'setup':>10} {'caller us/request':>18} {'writer drain ms':>16}")
+    for name in ("previous", "pipeline"):
+        print(f"{name:>10} {results[name]['caller_us_per_request']:>18} {results[name]['drain_ms']:>16}")
+
+
+if __name__ == "__main__":
+    main()
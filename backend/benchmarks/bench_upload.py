@@ -0,0 +1,124 @@
+"""
+Benchmark the upload staging path.
+
+Compares the previous path (seek to the end to measure the spooled upload, then
+copy and hash it to disk) with the single-pass streaming pipeline in
+``upload_pipeline.stream_to_disk``. Reports wall time and peak Python memory per
+file size.
+
+Usage (from the backend directory):
+    python benchmarks/bench_upload.py --sizes 1 8 64 --repeat 5
+    python benchmarks/bench_upload.py --json > bench_upload.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from upload_pipeline import UPLOAD_CHUNK_SIZE, stream_to_disk
+
+MB = 1024 * 1024
+ALLOWED_TYPES = ["application/pdf"]
+
+
+def make_source(size: int) -> tempfile.SpooledTemporaryFile:
+    """Build a spooled upload body the way Starlette does (1MB in memory, then disk)."""
+    source = tempfile.SpooledTemporaryFile(max_size=MB)
+    source.write(b"%PDF-1.4\n")
+    remaining = size - 9
+    block = os.urandom(MB)
+    while remaining > 0:
+        source.write(block[:remaining])
+        remaining -= MB
+    source.seek(0)
+    return source
+
+
+def previous_path(source, dest_path: str, max_size: int):
+    """The upload path before streaming staging: measure, copy with hashing, stat."""
+    source.seek(0, 2)
+    file_size = source.tell()
+    source.seek(0)
+    if file_size > max_size:
+        raise ValueError("file too large")
+
+    digest = hashlib.sha256()
+    with open(dest_path, "wb") as buffer:
+        while chunk := source.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+            buffer.write(chunk)
+    return Path(dest_path).stat().st_size, digest.hexdigest()
+
+
+def streaming_path(source, dest_path: str, max_size: int):
+    """The single-pass pipeline."""
+    return stream_to_disk(source, dest_path, "application/pdf", max_size, ALLOWED_TYPES)
+
+
+def measure(fn, source, dest_path: str, max_size: int, repeat: int) -> dict:
+    """Run ``fn`` ``repeat`` times and report median time and peak traced memory."""
+    timings = []
+    for _ in range(repeat):
+        source.seek(0)
+        start = time.perf_counter()
+        fn(source, dest_path, max_size)
+        timings.append(time.perf_counter() - start)
+        os.remove(dest_path)
+
+    source.seek(0)
+    tracemalloc.start()
+    fn(source, dest_path, max_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    os.remove(dest_path)
+
+    return {
+        "median_ms": round(statistics.median(timings) * 1000, 2),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 8, 64], help="File sizes in MB")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Emit results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        dest_path = os.path.join(workdir, "upload.bin")
+        for size_mb in args.sizes:
+            size = size_mb * MB
+            source = make_source(size)
+            results.append({
+                "size_mb": size_mb,
+                "previous": measure(previous_path, source, dest_path, size, args.repeat),
+                "streaming": measure(streaming_path, source, dest_path, size, args.repeat),
+            })
+            source.close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'size':>8} {'previous ms':>12} {'streaming ms':>13} {'previous KB':>12} {'streaming KB':>13}")
+    for result in results:
+        print(
+            f"{result['size_mb']:>6}MB "
+            f"{result['previous']['median_ms']:>12} {result['streaming']['median_ms']:>13} "
+            f"{result['previous']['peak_memory_kb']:>12} {result['streaming']['peak_memory_kb']:>13}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import asyncio
+import functools
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterable, Optional
+
+_SENTINEL = object()
+
+
+class QueueTimeoutError(Exception):
+    """
+    Raised when no executor slot frees up within the queue timeout.
+
+    Not a ``TimeoutError``: the call never started, so it says nothing about
+    upstream health and is not worth retrying into the same queue.
+    """
+
+    def __init__(self, name: str, timeout: float):
+        super().__init__(f"No {name} executor slot became free within {timeout:.1f}s")
+        self.timeout = timeout
+
+
+class LoopSemaphores:
+    """
+    One ``asyncio.Semaphore`` of ``value`` slots per running event loop.
+
+    asyncio primitives cannot be shared across loops, and the app, the tests and
+    worker threads each run their own.
+    """
+
+    def __init__(self, value: int):
+        self.value = value
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def get(self) -> asyncio.Semaphore:
+        """Return the semaphore of the running loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.value)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+
+class BoundedExecutor:
+    """
+    Runs blocking calls on a dedicated thread pool behind a global concurrency limit.
+
+    Callers await a free slot before their call is handed to the pool, so the number
+    of in-flight calls never exceeds ``max_concurrency`` and the event loop stays free
+    while they run. Queue depth and in-flight counts are tracked for observability.
+    """
+
+    def __init__(self, max_workers: int, max_concurrency: int, name: str):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self._pool = None
+        self._semaphores = LoopSemaphores(max_concurrency)
+
+        self._waiting = 0
+        self._in_flight = 0
+        self._peak_waiting = 0
+        self._peak_in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._queue_timeouts = 0
+        self._total_wait_time = 0.0
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix=self.name
+            )
+        return self._pool
+
+    async def _acquire(self, queue_timeout: Optional[float] = None) -> asyncio.Semaphore:
+        """Wait for a free slot, tracking how many callers are queued."""
+        semaphore = self._semaphores.get()
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+
+        self._waiting += 1
+        self._peak_waiting = max(self._peak_waiting, self._waiting)
+        try:
+            await asyncio.wait_for(semaphore.acquire(), queue_timeout)
+        except asyncio.TimeoutError:
+            self._queue_timeouts += 1
+            raise QueueTimeoutError(self.name, queue_timeout) from None
+        finally:
+            self._waiting -= 1
+            self._total_wait_time += loop.time() - start_time
+
+        self._in_flight += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        return semaphore
+
+    def _release(self, semaphore: asyncio.Semaphore, failed: bool) -> None:
+        self._in_flight -= 1
+        if failed:
+            self._failed += 1
+        else:
+            self._completed += 1
+        semaphore.release()
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run ``fn(*args, **kwargs)`` on the pool once a slot is free."""
+        return await self.submit(fn, args, kwargs)
+
+    async def submit(
+        self,
+        fn: Callable[..., Any],
+        args: tuple = (),
+        kwargs: Optional[dict] = None,
+        queue_timeout: Optional[float] = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """
+        Like ``run``, with separate bounds on the wait for a slot and on the call.
+
+        Raises ``QueueTimeoutError`` when no slot frees up within ``queue_timeout``,
+        and ``asyncio.TimeoutError`` when the call, once started, takes longer than
+        ``timeout``.
+        """
+        semaphore = await self._acquire(queue_timeout)
+        failed = True
+        try:
+            loop = asyncio.get_running_loop()
+            result = await asyncio.wait_for(
+                loop.run_in_executor(self._get_pool(), functools.partial(fn, *args, **(kwargs or {}))),
+                timeout
+            )
+            failed = False
+            return result
+        finally:
+            self._release(semaphore, failed)
+
+    def stream(self, fn: Callable[..., Iterable], *args, **kwargs) -> AsyncIterator:
+        """
+        Iterate a blocking iterator produced by ``fn`` without blocking the loop.
+
+        A single slot is held for the lifetime of the stream and each ``next()``
+        call runs on the pool.
+        """
+        return self.submit_stream(fn, args, kwargs)
+
+    async def submit_stream(
+        self,
+        fn: Callable[..., Iterable],
+        args: tuple = (),
+        kwargs: Optional[dict] = None,
+        queue_timeout: Optional[float] = None,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator:
+        """Like ``stream``, bounding the wait for a slot and then the wait for each item as in ``submit``."""
+        semaphore = await self._acquire(queue_timeout)
+        failed = True
+        iterator = None
+        pending = False
+        try:
+            loop = asyncio.get_running_loop()
+            pool = self._get_pool()
+            pending = True
+            iterator = await asyncio.wait_for(
+                loop.run_in_executor(pool, lambda: iter(fn(*args, **(kwargs or {})))), timeout
+            )
+            while True:
+                item = await asyncio.wait_for(loop.run_in_executor(pool, next, iterator, _SENTINEL), timeout)
+                pending = False
+                if item is _SENTINEL:
+                    break
+                yield item
+                pending = True
+            failed = False
+        finally:
+            # A cancelled or timed-out next() may still be running in the pool; the
+            # iterator is dropped in that case instead of being closed from under it
+            if iterator is not None and not pending and hasattr(iterator, "close"):
+                iterator.close()
+            self._release(semaphore, failed)
+
+    def stats(self) -> dict:
+        """Return a snapshot of executor queue and throughput counters."""
+        finished = self._completed + self._failed
+        return {
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "queue_depth": self._waiting,
+            "peak_in_flight": self._peak_in_flight,
+            "peak_queue_depth": self._peak_waiting,
+            "completed": self._completed,
+            "failed": self._failed,
+            "queue_timeouts": self._queue_timeouts,
+            "avg_wait_ms": round(self._total_wait_time / finished * 1000, 3) if finished else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        """Shut down the thread pool; it is recreated on next use."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
@@ -1,25 +1,143 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
     """Application configuration settings."""
     
     # API Keys
-    gemini_api_key: str
+    gemini_api_key: Optional[str] = None  # Required by the gemini LLM backend
+    
+    # LLM backend
+    llm_backend: str = "gemini"  # 'gemini' or 'fake' (in-process, no network)
+    gemini_model: str = "gemini-1.5-flash"
+    fake_llm_latency: str = "lognormal"  # Latency distribution: 'fixed', 'uniform' or 'lognormal'
+    fake_llm_latency_ms: float = 400.0  # Median time to first token
+    fake_llm_latency_spread: float = 0.5  # Sigma for lognormal, +/- fraction of the median for uniform
+    fake_llm_chunk_interval_ms: float = 25.0  # Time between streamed chunks
+    fake_llm_answer_words: int = 120  # Words per canned answer
+    fake_llm_chunk_words: int = 4  # Words per streamed chunk
+    fake_llm_file_latency_ms: float = 30.0  # Median latency of file lookups and deletes
+    fake_llm_upload_latency_ms: float = 300.0  # Median latency of uploads
+    fake_llm_error_rate: float = 0.0  # Fraction of calls failing with a retryable 503
+    fake_llm_seed: Optional[int] = None  # Seed for reproducible latencies and failures
     
     # Database
     database_url: str = "sqlite:///./rag_chat.db"
     
     # File Upload Settings
+    upload_dir: str = "uploads"
     max_file_size: int = 10485760  # 10MB in bytes
     allowed_file_types: str = "application/pdf,text/plain,application/vnd.openxmlformats-officedocument.wordprocessingml.document"
     
+    # Gemini call execution
+    gemini_max_workers: int = 16  # Threads dedicated to blocking Gemini SDK calls
+    gemini_max_concurrency: int = 8  # Global limit on in-flight Gemini calls per worker
+    gemini_file_cache_size: int = 1024  # Maximum cached Gemini file handles
+    gemini_file_cache_ttl: int = 3600  # Seconds to cache handles without an expiration time
+    gemini_timeout: float = 30.0  # Seconds per attempt for file lookups and deletes
+    gemini_generate_timeout: float = 120.0  # Seconds per generate attempt, and per chunk when streaming
+    gemini_upload_timeout: float = 300.0  # Seconds per upload attempt
+    gemini_retry_max_attempts: int = 3  # Attempts per call on transient errors
+    gemini_retry_base_delay: float = 0.5  # Seconds before the first retry; doubles each attempt, with full jitter
+    gemini_retry_max_delay: float = 8.0  # Cap on the retry delay
+    gemini_breaker_failure_threshold: int = 5  # Consecutive failures that open the circuit breaker
+    gemini_breaker_reset_timeout: float = 30.0  # Seconds the breaker stays open before a probe call
+    gemini_hedge_delay: Optional[float] = None  # Seconds before hedging a slow file lookup; unset disables
+    context_cache_backend: str = "gemini"  # 'gemini', 'local' (offline stub) or 'none'
+    context_cache_model: Optional[str] = None  # Versioned model for cached contents, e.g. gemini-1.5-flash-002; unset uses GEMINI_MODEL if versioned, else caching is off
+    context_cache_ttl: int = 600  # Seconds a cached file set lives; refreshed while in use
+    context_cache_min_uses: int = 2  # Turns with the same file set before it is cached
+    context_cache_max_entries: int = 256  # Cached file sets kept per process
+    context_cache_failure_cooldown: int = 600  # Seconds before retrying a file set that could not be cached
+    
+    # Retrieval
+    retrieval_enabled: bool = True  # Send top-k passages instead of whole indexed files
+    retrieval_top_k: int = 8  # Passages per chat turn
+    chunk_size: int = 1200  # Characters per chunk
+    chunk_overlap: int = 200  # Characters shared by consecutive chunks
+    embedding_backend: str = "local"  # 'local' (offline hashing embedder) or 'gemini'
+    embedding_dim: int = 384
+    gemini_embedding_model: str = "models/text-embedding-004"
+    lexical_search_enabled: bool = True  # Fuse BM25 (SQLite FTS5) with vector search
+    retrieval_candidates: int = 32  # Candidates taken from each ranking before fusion
+    retrieval_rrf_k: int = 60  # Reciprocal rank fusion damping constant
+    vector_store_dir: str = "vector_store"  # Memory-mapped embedding files
+    vector_store_compact_ratio: float = 0.3  # Compact once this fraction of rows is deleted
+    
+    # Conversation history
+    history_enabled: bool = True  # Send earlier turns of the session with each question
+    context_token_budget: int = 6000  # Estimated prompt tokens for question, summary, passages and turns
+    context_passage_share: float = 0.6  # Share of the budget reserved for retrieved passages
+    history_recent_messages: int = 12  # Most recent messages sent verbatim
+    summary_batch_messages: int = 8  # Older messages folded into the session summary at a time
+    summary_max_words: int = 250  # Target length of the session summary
+    
+    # Map-reduce chat mode
+    fanout_group_size: int = 4  # Files per map request
+    fanout_concurrency: int = 8  # Map requests in flight per chat turn
+    
+    # Response cache
+    response_cache_enabled: bool = True
+    response_cache_size: int = 1024  # Maximum cached answers
+    response_cache_ttl: int = 3600  # Seconds an answer stays reusable
+    response_cache_semantic_threshold: Optional[float] = None  # Cosine similarity to reuse answers of similar queries; unset disables
+    
+    # List endpoints
+    list_total_cache_ttl: float = 30  # Seconds a list total is reused; writes in this process drop it sooner, 0 disables
+    
+    # Batch upload
+    max_batch_files: int = 50  # Maximum files per batch upload request
+    batch_upload_concurrency: int = 8  # Concurrent Gemini uploads per batch
+    
+    # Background ingestion
+    ingestion_workers: int = 4  # Concurrent background upload workers
+    ingestion_max_attempts: int = 3  # Attempts per job before it is marked failed
+    ingestion_retry_backoff: float = 2.0  # Seconds before the first retry; doubles each attempt
+    
+    # Admission control
+    rate_limit_enabled: bool = True  # Per-client token buckets on /api routes
+    rate_limit_chat_per_minute: float = 30  # Chat requests per client per minute
+    rate_limit_upload_per_minute: float = 60  # Upload requests per client per minute
+    rate_limit_default_per_minute: float = 600  # Other API requests per client per minute
+    rate_limit_burst: int = 10  # Requests a client may send at once before the rate applies
+    rate_limit_max_clients: int = 10000  # Client buckets kept; idle clients are dropped first
+    rate_limit_client_header: Optional[str] = None  # Header identifying the client behind a trusted proxy, e.g. X-Forwarded-For
+    llm_max_concurrency: int = 16  # LLM slots across all clients: chat requests, their extra map shards and session summaries
+    llm_max_queue: int = 32  # Chat requests waiting for a slot before new ones are shed
+    llm_queue_timeout: float = 10.0  # Seconds a chat request may wait for a slot
+    
     # CORS
     cors_origins: str = "http://localhost:3000,http://127.0.0.1:3000"
     
     # Logging
     log_level: str = "INFO"
+    log_dir: str = "logs"
+    log_format: str = "json"  # File log format: 'json' (one object per line) or 'text'
+    log_rotation: str = "time"  # 'time' (daily at midnight) or 'size'
+    log_max_bytes: int = 10485760  # Size at which the file rotates with 'size' rotation
+    log_backup_count: int = 14  # Rotated log files kept
+    log_queue_size: int = 10000  # Records waiting for the writer thread before new ones are dropped
+    log_sample_rates: str = ""  # Fraction of INFO/DEBUG records kept per logger, e.g. 'rag_chat.access=0.1'
+    
+    # Metrics
+    metrics_enabled: bool = True  # Serve Prometheus metrics at /metrics
+    
+    # Tracing
+    tracing_enabled: bool = True  # Per-stage spans for sampled requests
+    tracing_sample_rate: float = 0.01  # Fraction of requests traced; a sampled traceparent header always is
+    tracing_server_timing: bool = True  # Summarize stages of sampled requests in a Server-Timing header
+    tracing_file: Optional[str] = "logs/traces.jsonl"  # OTLP/JSON export file; unset keeps only Server-Timing
+    tracing_max_bytes: int = 10485760  # Rotate the trace file at this size
+    tracing_backup_count: int = 5  # Rotated trace files kept
+    
+    # Query profiling
+    query_profiler_enabled: bool = False  # Per-request statement counts and the slow-query log; no hooks when off
+    slow_query_threshold_ms: float = 100.0  # Statements at least this slow are logged
+    slow_query_explain: bool = True  # Add the SQLite EXPLAIN QUERY PLAN to slow-query log entries
+    slow_query_log_size: int = 100  # Recent slow queries kept for /debug/queries
+    slow_query_log_parameters: bool = False  # Show bound values in the slow-query log; they may hold user data, keep off in production
+    query_profiler_warn_statements: int = 50  # Log requests running at least this many statements
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,324 @@
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from logger import get_logger
+
+logger = get_logger("context_cache")
+
+ContextKey = Tuple[str, Tuple[str, ...]]
+
+# Context caching only accepts explicitly versioned models, such as gemini-1.5-flash-002
+VERSIONED_MODEL_PATTERN = re.compile(r"-\d{3}$")
+
+
+def is_file_handle(part: Any) -> bool:
+    """Return True for Gemini file handles (as opposed to text parts)."""
+    return not isinstance(part, str) and getattr(part, "uri", None) is not None
+
+
+def split_contents(contents: list) -> Tuple[list, list]:
+    """Split generation contents into ``(file handles, other parts)``."""
+    files = [part for part in contents if is_file_handle(part)]
+    others = [part for part in contents if not is_file_handle(part)]
+    return files, others
+
+
+class GeminiCachingAPI:
+    """
+    Server-side context caching through ``google.generativeai.caching``.
+
+    Caches are created for ``model_name``, a versioned model, whatever unversioned
+    alias the registry is keyed by.
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def create(self, model_name: str, files: list, ttl: float):
+        from google.generativeai import caching
+
+        return caching.CachedContent.create(
+            model=f"models/{self.model_name}",
+            contents=files,
+            ttl=timedelta(seconds=ttl),
+        )
+
+    def refresh(self, handle, ttl: float):
+        handle.update(ttl=timedelta(seconds=ttl))
+        return handle
+
+    def delete(self, handle) -> None:
+        handle.delete()
+
+    def model_for(self, handle):
+        import google.generativeai as genai
+
+        return genai.GenerativeModel.from_cached_content(cached_content=handle)
+
+
+@dataclass
+class LocalCachedContent:
+    """Handle returned by the local caching stub."""
+    name: str
+    model: str
+    files: list
+    expire_time: datetime
+
+
+class LocalCachedModel:
+    """Model bound to a stub cache: prepends the cached files, like the server does."""
+
+    def __init__(self, base_model: Any, handle: LocalCachedContent):
+        self.base_model = base_model
+        self.handle = handle
+
+    def generate_content(self, contents, **kwargs):
+        if self.handle.expire_time <= datetime.now(timezone.utc):
+            raise LookupError(f"Cached content {self.handle.name} has expired")
+        return self.base_model.generate_content(list(self.handle.files) + list(contents), **kwargs)
+
+
+class LocalCachingAPI:
+    """
+    Offline stand-in for the Gemini caching API.
+
+    Cached contents live in memory and generation is delegated to the regular
+    model with the cached files prepended, so the caching path can be exercised
+    without network access or a minimum token count.
+    """
+
+    def __init__(self, base_model: Callable[[], Any]):
+        self.base_model = base_model
+        self.contents: Dict[str, LocalCachedContent] = {}
+
+    def create(self, model_name: str, files: list, ttl: float) -> LocalCachedContent:
+        handle = LocalCachedContent(
+            name=f"cachedContents/{uuid.uuid4().hex}",
+            model=model_name,
+            files=list(files),
+            expire_time=datetime.now(timezone.utc) + timedelta(seconds=ttl),
+        )
+        self.contents[handle.name] = handle
+        return handle
+
+    def refresh(self, handle: LocalCachedContent, ttl: float) -> LocalCachedContent:
+        if handle.name not in self.contents:
+            raise LookupError(f"Cached content {handle.name} not found")
+        handle.expire_time = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        return handle
+
+    def delete(self, handle: LocalCachedContent) -> None:
+        self.contents.pop(handle.name, None)
+
+    def model_for(self, handle: LocalCachedContent) -> LocalCachedModel:
+        return LocalCachedModel(self.base_model(), handle)
+
+
+@dataclass
+class ContextCacheEntry:
+    """A server-side cached content and when it expires locally."""
+    handle: Any
+    expires_at: float
+
+
+class ContextCacheRegistry:
+    """
+    Local registry of server-side cached contents, keyed by (model, file set).
+
+    A file set is cached once it has been sent ``min_uses`` times, so one-off
+    questions never pay for cache creation. Entries are refreshed when less than
+    half their TTL remains, the least recently used are deleted beyond
+    ``max_entries``, and a file set whose cache cannot be created (for example,
+    too few tokens) is not retried until ``failure_cooldown`` has passed. Every
+    failure leaves the caller on the uncached path.
+
+    With an ``executor``, creation and refresh run on it instead of in the
+    caller's generation request: the turn that makes a file set due goes
+    uncached, and a refreshed entry is served from its current handle meanwhile.
+    """
+
+    def __init__(
+        self,
+        api: Any,
+        ttl: float,
+        min_uses: int = 2,
+        max_entries: int = 256,
+        failure_cooldown: float = 600.0,
+        executor: Optional[Executor] = None,
+    ):
+        self.api = api
+        self.executor = executor
+        self.ttl = ttl
+        self.min_uses = min_uses
+        self.max_entries = max_entries
+        self.failure_cooldown = failure_cooldown
+        self._entries: "OrderedDict[ContextKey, ContextCacheEntry]" = OrderedDict()
+        self._uses: "OrderedDict[ContextKey, int]" = OrderedDict()
+        self._failed_until: Dict[ContextKey, float] = {}
+        self._pending: set = set()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.creates = 0
+        self.refreshes = 0
+        self.failures = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def key_for(model_name: str, files: list) -> ContextKey:
+        return model_name, tuple(sorted({file.name for file in files}))
+
+    def _count_use(self, key: ContextKey) -> int:
+        """Count a use of a file set. Caller holds the lock."""
+        uses = self._uses.pop(key, 0) + 1
+        self._uses[key] = uses
+        while len(self._uses) > self.max_entries * 16:
+            self._uses.popitem(last=False)
+        return uses
+
+    def lookup(self, model_name: str, files: list) -> Optional[Any]:
+        """
+        Return a cached-content handle covering exactly ``files``, or None.
+
+        Creates or refreshes the server-side cache when due, in the background when
+        the registry has an executor. Runs on a worker thread.
+        """
+        key = self.key_for(model_name, files)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                if entry.expires_at - now > self.ttl / 2 or key in self._pending:
+                    return entry.handle
+                self._pending.add(key)
+                action = "refresh"
+            else:
+                if entry is not None:
+                    del self._entries[key]
+                if (
+                    self._count_use(key) < self.min_uses
+                    or self._failed_until.get(key, 0) > now
+                    or key in self._pending
+                ):
+                    return None
+                self._pending.add(key)
+                action = "create"
+
+        if self.executor is None:
+            return self._update(action, key, model_name, files, entry)
+        self.executor.submit(self._update, action, key, model_name, files, entry)
+        return entry.handle if action == "refresh" else None
+
+    def _update(
+        self, action: str, key: ContextKey, model_name: str, files: list, entry: Optional[ContextCacheEntry]
+    ) -> Optional[Any]:
+        """Create or refresh the cache for a file set marked pending by ``lookup``."""
+        try:
+            if action == "refresh":
+                handle = self.api.refresh(entry.handle, self.ttl)
+            else:
+                handle = self.api.create(model_name, files, self.ttl)
+        except Exception as e:
+            logger.warning("Could not %s context cache for %s files: %s", action, len(key[1]), e)
+            with self._lock:
+                self._pending.discard(key)
+                self._entries.pop(key, None)
+                self._failed_until[key] = time.monotonic() + self.failure_cooldown
+                self.failures += 1
+            return None
+
+        evicted = []
+        with self._lock:
+            self._pending.discard(key)
+            self._failed_until.pop(key, None)
+            self._entries[key] = ContextCacheEntry(handle=handle, expires_at=time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            if action == "refresh":
+                self.refreshes += 1
+            else:
+                self.creates += 1
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[1].handle)
+        for stale in evicted:
+            self._delete(stale)
+        if action == "create":
+            logger.info("Created context cache %s for %s files", handle.name, len(key[1]))
+        return handle
+
+    def model_for(self, handle: Any) -> Any:
+        """Return a model that generates against a cached content."""
+        return self.api.model_for(handle)
+
+    def discard(self, handle: Any) -> None:
+        """Forget a cache the server rejected; the caller falls back to uncached generation."""
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.handle is handle:
+                    del self._entries[key]
+            self.fallbacks += 1
+        self._delete(handle)
+
+    def invalidate_file(self, name: str) -> None:
+        """Delete every cache that includes the given file."""
+        with self._lock:
+            keys = [key for key in self._entries if name in key[1]]
+            handles = [self._entries.pop(key).handle for key in keys]
+        for handle in handles:
+            self._delete(handle)
+
+    def _delete(self, handle: Any) -> None:
+        try:
+            self.api.delete(handle)
+        except Exception as e:
+            logger.warning("Could not delete context cache %s: %s", getattr(handle, "name", handle), e)
+
+    def stats(self) -> dict:
+        """Return a snapshot of registry counters."""
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "creates": self.creates,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "fallbacks": self.fallbacks,
+        }
+
+
+def create_context_cache(
+    backend: str,
+    base_model: Callable[[], Any],
+    model_name: str,
+    cache_model: Optional[str] = None,
+    **kwargs
+) -> Optional[ContextCacheRegistry]:
+    """
+    Create the registry for ``settings.context_cache_backend``; 'none' disables caching.
+
+    The 'gemini' backend needs a versioned model: ``cache_model`` when set, else
+    ``model_name`` if it carries a version suffix. Without one caching is disabled,
+    since the server would reject every cache. Creation runs in the background.
+    """
+    if backend == "none":
+        return None
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="context-cache")
+    if backend == "gemini":
+        versioned = cache_model or model_name
+        if not VERSIONED_MODEL_PATTERN.search(versioned):
+            logger.warning(
+                "Context caching disabled: %s has no version suffix; set CONTEXT_CACHE_MODEL "
+                "to a versioned model such as %s-002", versioned, versioned
+            )
+            return None
+        return ContextCacheRegistry(GeminiCachingAPI(versioned), executor=executor, **kwargs)
+    if backend == "local":
+        return ContextCacheRegistry(LocalCachingAPI(base_model), executor=executor, **kwargs)
+    raise ValueError(f"Unknown context cache backend: {backend}")
@@ -0,0 +1,242 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from admission import admission_controller
+from config import settings
+from database import AsyncSessionLocal, release_connection
+from gemini_client import gemini_client
+from logger import get_logger
+from models import ChatSession, Message
+
+logger = get_logger("conversation")
+
+CHARS_PER_TOKEN = 4  # Rough average for English text with Gemini tokenizers
+TURN_OVERHEAD_TOKENS = 4  # Role label and separators per turn or passage
+
+SUMMARY_PROMPT_TEMPLATE = """You maintain a running summary of a conversation between a user and an \
+assistant answering questions about documents. Update the summary with the new messages below. \
+Keep facts, names, numbers and open questions the user may refer back to. Write at most \
+{max_words} words of plain prose.
+
+Current summary:
+{summary}
+
+New messages:
+{transcript}
+
+Updated summary:"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text without calling a tokenizer."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+@dataclass
+class Turn:
+    """One earlier message of the conversation."""
+    role: str
+    content: str
+
+
+@dataclass
+class ConversationHistory:
+    """What the model should know about earlier turns of a session."""
+    summary: Optional[str] = None
+    turns: List[Turn] = field(default_factory=list)  # Oldest first
+
+    @property
+    def empty(self) -> bool:
+        return not self.summary and not self.turns
+
+
+@dataclass
+class PackedContext:
+    """The parts of a turn's context that fit the token budget."""
+    summary: Optional[str]
+    turns: List[Turn]
+    passages: list
+    tokens: int
+
+
+def format_turns(turns: List[Turn]) -> str:
+    """Render turns as a plain transcript."""
+    return "\n".join(f"{turn.role.capitalize()}: {turn.content}" for turn in turns)
+
+
+async def load_history(db: AsyncSession, session: ChatSession, before_message_id: int) -> ConversationHistory:
+    """
+    Load the session summary and the most recent messages it does not cover.
+
+    Only messages newer than the summary are read, so the cost does not grow with
+    the length of the session.
+    """
+    result = await db.scalars(
+        select(Message)
+        .where(
+            Message.session_id == session.id,
+            Message.id > (session.summarized_message_id or 0),
+            Message.id < before_message_id,
+        )
+        .order_by(Message.id.desc())
+        .limit(settings.history_recent_messages)
+    )
+    turns = [Turn(role=message.role, content=message.content) for message in reversed(result.all())]
+    return ConversationHistory(summary=session.summary, turns=turns)
+
+
+def pack_context(
+    query: str,
+    passages: list,
+    history: Optional[ConversationHistory],
+    budget: int,
+    passage_share: float,
+) -> PackedContext:
+    """
+    Choose the summary, passages and recent turns that fit ``budget`` tokens.
+
+    The question always goes in, then the summary. ``passage_share`` of what is left
+    is reserved for passages in rank order, recent turns fill the rest newest
+    first, and any budget they leave over takes further passages. Whole files
+    attached alongside the prompt are not counted.
+    """
+    history = history or ConversationHistory()
+    used = estimate_tokens(query)
+
+    summary = None
+    if history.summary and used + estimate_tokens(history.summary) <= budget:
+        summary = history.summary
+        used += estimate_tokens(summary) + TURN_OVERHEAD_TOKENS
+
+    passage_costs = [estimate_tokens(passage.text) + TURN_OVERHEAD_TOKENS for passage in passages]
+    kept = set()
+    passage_budget = int(max(budget - used, 0) * passage_share)
+    for index, cost in enumerate(passage_costs):
+        if cost > passage_budget:
+            break
+        kept.add(index)
+        passage_budget -= cost
+        used += cost
+
+    turns = []
+    for turn in reversed(history.turns):
+        cost = estimate_tokens(turn.content) + TURN_OVERHEAD_TOKENS
+        if used + cost > budget:
+            break
+        turns.append(turn)
+        used += cost
+    turns.reverse()
+
+    for index, cost in enumerate(passage_costs):
+        if index not in kept and used + cost <= budget:
+            kept.add(index)
+            used += cost
+
+    return PackedContext(
+        summary=summary,
+        turns=turns,
+        passages=[passage for index, passage in enumerate(passages) if index in kept],
+        tokens=used,
+    )
+
+
+def build_history_prompt(packed: PackedContext, prompt: str) -> str:
+    """Prefix a turn's prompt with the packed summary and recent turns."""
+    sections = []
+    if packed.summary:
+        sections.append(f"Summary of the earlier conversation:\n{packed.summary}")
+    if packed.turns:
+        sections.append(f"Recent conversation:\n{format_turns(packed.turns)}")
+    if not sections:
+        return prompt
+    return "\n\n".join(sections + [prompt])
+
+
+async def update_summary(db: AsyncSession, session: ChatSession) -> bool:
+    """
+    Fold messages that have left the recent window into the session summary.
+
+    Runs once at least ``summary_batch_messages`` such messages have accumulated,
+    and reads only messages the summary does not cover yet, so each update costs
+    O(new messages). The model call takes a slot of the global LLM gate, as it
+    runs outside any chat request; when shed, the update is retried after the
+    next turn. No connection is held while the model writes the summary;
+    the session is re-loaded afterwards and left alone if another update got
+    there first. Returns True if the summary changed.
+    """
+    recent = settings.history_recent_messages
+    result = await db.scalars(
+        select(Message)
+        .where(Message.session_id == session.id, Message.id > (session.summarized_message_id or 0))
+        .order_by(Message.id)
+    )
+    pending = result.all()
+    foldable = pending[:-recent] if recent else pending
+    if len(foldable) < settings.summary_batch_messages:
+        return False
+
+    prompt = SUMMARY_PROMPT_TEMPLATE.format(
+        max_words=settings.summary_max_words,
+        summary=session.summary or "(none yet)",
+        transcript=format_turns([Turn(role=message.role, content=message.content) for message in foldable]),
+    )
+    summarized_message_id = session.summarized_message_id
+    await release_connection(db)
+    async with admission_controller.gate.slot():
+        summary = await gemini_client.agenerate([prompt])
+
+    session = await db.get(ChatSession, session.id, populate_existing=True)
+    if session is None or session.summarized_message_id != summarized_message_id:
+        await db.rollback()
+        return False
+    session.summary = summary.strip()
+    session.summarized_message_id = foldable[-1].id
+    await db.commit()
+    logger.info("Folded %s messages into the summary of session %s", len(foldable), session.id)
+    return True
+
+
+class SessionSummarizer:
+    """
+    Updates session summaries in the background after each answered turn.
+
+    At most one update runs per session; turns that finish while it runs are
+    picked up by the next one.
+    """
+
+    def __init__(self, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self.session_factory = session_factory
+        self._tasks: Set[asyncio.Task] = set()
+        self._running: Set[int] = set()
+
+    def schedule(self, session_id: int) -> None:
+        """Queue a summary update for a session unless one is already running."""
+        if session_id in self._running:
+            return
+        self._running.add(session_id)
+        task = asyncio.create_task(self._summarize(session_id), name=f"summarize-{session_id}")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, session_id: int) -> None:
+        try:
+            async with self.session_factory() as db:
+                session = await db.get(ChatSession, session_id)
+                if session is not None:
+                    await update_summary(db, session)
+        except Exception as e:
+            logger.warning("Could not update summary of session %s: %s", session_id, e)
+        finally:
+            self._running.discard(session_id)
+
+    async def drain(self) -> None:
+        """Wait for running updates to finish."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+session_summarizer = SessionSummarizer()
@@ -1,30 +1,93 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import settings
+from metrics import instrument_engine
+import tracing
+from query_profiler import query_profiler
 
-# Create database engine
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
-)
+# Sync and async drivers for each supported backend
+SYNC_DRIVERS = {
+    "sqlite": "sqlite",
+    "postgresql": "postgresql+psycopg2",
+    "mysql": "mysql+pymysql",
+}
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def get_sync_url(database_url: str):
+    """Return the database URL using the backend's synchronous driver."""
+    url = make_url(database_url)
+    return url.set(drivername=SYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+def get_async_url(database_url: str):
+    """Return the database URL using the backend's asyncio driver."""
+    url = make_url(database_url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+def create_engines(database_url: str, **kwargs):
+    """
+    Create a sync and an async engine for the same database.
 
-# Create session factory
+    ``database_url`` may name either driver (``sqlite://`` or ``sqlite+aiosqlite://``);
+    the request path always runs on the async engine, while the sync engine is used
+    for schema setup and offline tooling.
+    """
+    connect_args = {"check_same_thread": False} if "sqlite" in database_url else {}
+    sync_engine = create_engine(get_sync_url(database_url), connect_args=connect_args, **kwargs)
+    async_engine = create_async_engine(get_async_url(database_url), connect_args=connect_args, **kwargs)
+    if settings.metrics_enabled:
+        instrument_engine(sync_engine)
+        instrument_engine(async_engine.sync_engine)
+    if settings.tracing_enabled:
+        tracing.instrument_engine(sync_engine)
+        tracing.instrument_engine(async_engine.sync_engine)
+    if settings.query_profiler_enabled:
+        query_profiler.instrument(sync_engine)
+        query_profiler.instrument(async_engine.sync_engine)
+    return sync_engine, async_engine
+
+
+# Create database engines
+engine, async_engine = create_engines(settings.database_url)
+
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 
 # Base class for models
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency to get database session."""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Dependency to get an async database session."""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+async def release_connection(db: AsyncSession) -> None:
+    """
+    End the session's transaction so its connection goes back to the pool.
+
+    Called before waiting on the model: a read that autobegan a transaction
+    would otherwise hold a pooled connection for the whole generation or
+    stream. Sessions are created with ``expire_on_commit=False``, so loaded
+    objects keep their values and the session can be used again afterwards.
+    """
+    await db.commit()
 
 
 def init_db():
-    """Initialize database tables."""
-    Base.metadata.create_all(bind=engine)
+    """Create missing tables and upgrade an existing database to the current schema."""
+    from migrations import upgrade_database  # Imports the models, which import this module
+    upgrade_database(engine)
@@ -0,0 +1,103 @@
+import hashlib
+import re
+from typing import List
+
+import numpy as np
+
+from config import settings
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+GEMINI_BATCH_SIZE = 100  # Maximum texts per embed_content request
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length so dot products are cosine similarities."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class Embedder:
+    """Base class for text embedding backends."""
+
+    dim: int
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Return a ``(len(texts), dim)`` float32 matrix of unit-length embeddings."""
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Embed a single search query."""
+        return self.embed([text])[0]
+
+
+class HashingEmbedder(Embedder):
+    """
+    Deterministic local embedder based on feature hashing.
+
+    Words and word bigrams are hashed into ``dim`` signed buckets. It needs no
+    network or model download, which makes the whole retrieval pipeline testable
+    offline, and captures lexical overlap well enough for passage selection.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                sign = 1.0 if value & 1 else -1.0
+                vectors[row, (value >> 1) % self.dim] += sign
+        return normalize_rows(vectors)
+
+
+class GeminiEmbedder(Embedder):
+    """Embedder backed by the Gemini embedding API."""
+
+    def __init__(self, model: str, dim: int):
+        self.model = model
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        import google.generativeai as genai
+
+        vectors = []
+        for start in range(0, len(texts), GEMINI_BATCH_SIZE):
+            result = genai.embed_content(
+                model=self.model,
+                content=texts[start:start + GEMINI_BATCH_SIZE],
+                task_type="retrieval_document",
+                output_dimensionality=self.dim
+            )
+            vectors.extend(result["embedding"])
+        return normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dim))
+
+    def embed_query(self, text: str) -> np.ndarray:
+        import google.generativeai as genai
+
+        result = genai.embed_content(
+            model=self.model,
+            content=text,
+            task_type="retrieval_query",
+            output_dimensionality=self.dim
+        )
+        return normalize_rows(np.asarray([result["embedding"]], dtype=np.float32))[0]
+
+
+def create_embedder() -> Embedder:
+    """Create the embedder selected by ``settings.embedding_backend``."""
+    if settings.embedding_backend == "local":
+        return HashingEmbedder(dim=settings.embedding_dim)
+    if settings.embedding_backend == "gemini":
+        return GeminiEmbedder(model=settings.gemini_embedding_model, dim=settings.embedding_dim)
+    raise ValueError(f"Unknown embedding backend: {settings.embedding_backend}")
+
+
+embedder = create_embedder()
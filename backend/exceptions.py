@@ -1,3 +1,5 @@
+import math
+
 from fastapi import HTTPException, status
 
 
@@ -19,6 +21,36 @@ class GeminiAPIError(HTTPException):
         )
 
 
+class GeminiUnavailableError(HTTPException):
+    """Exception raised while Gemini calls are rejected by the circuit breaker."""
+    def __init__(self, detail: str, retry_after: float):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Gemini API unavailable: {detail}",
+            headers={"Retry-After": str(max(int(retry_after), 1))}
+        )
+
+
+class RateLimitExceededError(HTTPException):
+    """Exception raised when a client exceeds its request rate."""
+    def __init__(self, retry_after: float):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded, slow down",
+            headers={"Retry-After": str(max(math.ceil(retry_after), 1))}
+        )
+
+
+class ServiceOverloadedError(HTTPException):
+    """Exception raised when an LLM request is shed because the service is at capacity."""
+    def __init__(self, detail: str, retry_after: float):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Service overloaded: {detail}",
+            headers={"Retry-After": str(max(math.ceil(retry_after), 1))}
+        )
+
+
 class SessionNotFoundError(HTTPException):
     """Exception raised when chat session is not found."""
     def __init__(self, session_id: int):
@@ -37,6 +69,15 @@ class DocumentNotFoundError(HTTPException):
         )
 
 
+class JobNotFoundError(HTTPException):
+    """Exception raised when ingestion job is not found."""
+    def __init__(self, job_id: str):
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Ingestion job with id {job_id} not found"
+        )
+
+
 class FileSizeExceededError(HTTPException):
     """Exception raised when uploaded file size exceeds limit."""
     def __init__(self, max_size: int):
@@ -53,3 +94,12 @@ class InvalidFileTypeError(HTTPException):
             status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
             detail=f"File type '{file_type}' is not allowed. Allowed types: {', '.join(allowed_types)}"
         )
+
+
+class InvalidCursorError(HTTPException):
+    """Exception raised when a pagination cursor cannot be decoded."""
+    def __init__(self, cursor: str):
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid pagination cursor: {cursor}"
+        )
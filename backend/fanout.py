@@ -0,0 +1,229 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from admission import admission_controller
+from config import settings
+from conversation import ConversationHistory, build_history_prompt, pack_context
+from database import release_connection
+from gemini_client import gemini_client
+from logger import get_logger
+from retrieval import build_chat_prompt
+
+logger = get_logger("fanout")
+
+NO_INFORMATION = "NO_RELEVANT_INFORMATION"
+
+MAP_PROMPT_TEMPLATE = """You are answering one part of a question that spans many documents; \
+only some of them are attached here. Extract every fact in this material that helps answer \
+the request below, citing the document names. If nothing here is relevant, reply exactly \
+{no_information}.
+
+{prompt}"""
+
+REDUCE_PROMPT_TEMPLATE = """The question below was put to {total} groups of documents separately. \
+Combine the partial answers into one complete answer. Resolve overlaps, keep document names \
+when citing, and say so if the partial answers do not contain the answer.
+
+{partials}
+
+Question: {query}"""
+
+
+@dataclass
+class Shard:
+    """One group of files and the map request sent for it."""
+    index: int
+    file_uris: List[str]
+    contents: list
+
+
+@dataclass
+class ShardResult:
+    """The partial answer of one shard."""
+    index: int
+    file_uris: List[str]
+    answer: Optional[str]
+    error: Optional[str]
+    elapsed: float
+
+    @property
+    def status(self) -> str:
+        if self.error is not None:
+            return "failed"
+        if self.answer is None or self.answer.strip() == NO_INFORMATION:
+            return "empty"
+        return "ok"
+
+
+def group_files(file_uris: List[str], group_size: int) -> List[List[str]]:
+    """Split the requested files into groups of at most ``group_size``."""
+    unique = list(dict.fromkeys(file_uris))
+    return [unique[start:start + group_size] for start in range(0, len(unique), group_size)]
+
+
+async def prepare_shards(db: AsyncSession, query: str, file_uris: List[str]) -> List[Shard]:
+    """
+    Build the map request for every file group.
+
+    Retrieval shares the request's database session, so the reads run group by
+    group. The session's transaction is then ended, and the handles of files
+    attached whole, which may need Gemini round trips, are resolved for all
+    groups at once.
+    """
+    groups = group_files(file_uris, settings.fanout_group_size)
+    prompts = [await build_chat_prompt(db, query, group) for group in groups]
+    await release_connection(db)
+    handles = await asyncio.gather(*(
+        gemini_client.aget_files(whole_files) if whole_files else asyncio.sleep(0, result=[])
+        for _, whole_files in prompts
+    ))
+    shards = []
+    for index, (group, (contents, _), files) in enumerate(zip(groups, prompts, handles)):
+        contents[0] = MAP_PROMPT_TEMPLATE.format(no_information=NO_INFORMATION, prompt=contents[0])
+        shards.append(Shard(index=index, file_uris=group, contents=contents + files))
+    return shards
+
+
+async def map_shards(shards: List[Shard], concurrency: int) -> AsyncIterator[ShardResult]:
+    """
+    Generate a partial answer per shard with at most ``concurrency`` in flight.
+
+    Results are yielded as shards finish, so wall-clock time tracks the slowest
+    shard. A failed shard is reported rather than raised; stopping iteration
+    cancels the shards still running.
+
+    Shards run in the chat request's own LLM gate slot and, in parallel, on
+    slots the gate has free right now; they never queue for one, so a turn's
+    fan-out stays within ``LLM_MAX_CONCURRENCY`` without waiting behind other
+    requests or starving them.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    gate = admission_controller.gate
+    own_slot = asyncio.Lock()
+
+    async def generate(contents: list) -> str:
+        extra = None if not own_slot.locked() else await gate.try_acquire()
+        if extra is None:
+            async with own_slot:
+                return await gemini_client.agenerate(contents)
+        start_time = time.monotonic()
+        try:
+            return await gemini_client.agenerate(contents)
+        finally:
+            gate.release(extra, time.monotonic() - start_time)
+
+    async def run(shard: Shard) -> ShardResult:
+        async with semaphore:
+            start_time = time.perf_counter()
+            try:
+                answer = await generate(shard.contents)
+                error = None
+            except Exception as e:
+                logger.warning("Map shard %s (%s files) failed: %s", shard.index, len(shard.file_uris), e)
+                answer, error = None, str(e)
+            return ShardResult(
+                index=shard.index,
+                file_uris=shard.file_uris,
+                answer=answer,
+                error=error,
+                elapsed=time.perf_counter() - start_time,
+            )
+
+    tasks = [asyncio.ensure_future(run(shard)) for shard in shards]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def build_reduce_contents(
+    query: str,
+    results: List[ShardResult],
+    history: Optional[ConversationHistory] = None,
+) -> list:
+    """Build the final request that merges the useful partial answers."""
+    useful = sorted((result for result in results if result.status == "ok"), key=lambda result: result.index)
+    partials = "\n\n".join(
+        f"[{position}] (from {', '.join(result.file_uris)})\n{result.answer.strip()}"
+        for position, result in enumerate(useful, start=1)
+    ) or "(none of the groups contained relevant information)"
+    prompt = REDUCE_PROMPT_TEMPLATE.format(total=len(results), partials=partials, query=query)
+    packed = pack_context(query, [], history, settings.context_token_budget, settings.context_passage_share)
+    return [build_history_prompt(packed, prompt)]
+
+
+def check_map_results(file_uris: List[str], results: List[ShardResult], start_time: float) -> None:
+    """Log the map phase and fail the turn if no shard produced an answer."""
+    logger.info(
+        "Mapped %s files in %s shards in %.3fs (slowest shard %.3fs, %s failed)",
+        len(file_uris), len(results), time.perf_counter() - start_time,
+        max((result.elapsed for result in results), default=0),
+        sum(result.status == "failed" for result in results)
+    )
+    if results and all(result.status == "failed" for result in results):
+        raise RuntimeError(f"All {len(results)} map shards failed: {results[0].error}")
+
+
+def progress_event(result: ShardResult, completed: int, total: int) -> dict:
+    """Describe a finished shard for the client."""
+    return {
+        "completed": completed,
+        "total": total,
+        "shard": result.index,
+        "files": result.file_uris,
+        "status": result.status,
+        "elapsed_ms": round(result.elapsed * 1000, 1),
+    }
+
+
+async def stream_map_reduce(
+    db: AsyncSession,
+    query: str,
+    file_uris: List[str],
+    history: Optional[ConversationHistory] = None,
+) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Answer a question over many files by fanning it out per file group.
+
+    Yields ``("progress", ...)`` as each shard finishes, then ``("token", ...)``
+    events as the merged answer streams. The reduce request runs in the chat
+    request's own LLM gate slot, which the map has released by then.
+    """
+    start_time = time.perf_counter()
+    shards = await prepare_shards(db, query, file_uris)
+    results = []
+    shard_results = map_shards(shards, settings.fanout_concurrency)
+    try:
+        async for result in shard_results:
+            results.append(result)
+            yield "progress", progress_event(result, len(results), len(shards))
+    finally:
+        await shard_results.aclose()
+    check_map_results(file_uris, results, start_time)
+
+    upstream = gemini_client.astream_generate(build_reduce_contents(query, results, history))
+    try:
+        async for text in upstream:
+            yield "token", {"text": text}
+    finally:
+        await upstream.aclose()
+
+
+async def answer_map_reduce(
+    db: AsyncSession,
+    query: str,
+    file_uris: List[str],
+    history: Optional[ConversationHistory] = None,
+) -> str:
+    """Non-streaming variant of ``stream_map_reduce``; returns the merged answer."""
+    start_time = time.perf_counter()
+    shards = await prepare_shards(db, query, file_uris)
+    results = [result async for result in map_shards(shards, settings.fanout_concurrency)]
+    check_map_results(file_uris, results, start_time)
+    return await gemini_client.agenerate(build_reduce_contents(query, results, history))
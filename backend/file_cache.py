@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+
+def normalize_file_name(uri: str) -> str:
+    """
+    Return the Gemini resource name (``files/...``) for a file name or URI.
+
+    Clients may send either the name or the full download URI, which ends in the name.
+    """
+    index = uri.find("files/")
+    return uri[index:] if index > 0 else uri
+
+
+class FileHandleCache:
+    """
+    Process-wide LRU cache of Gemini file handles.
+
+    Entries live until shortly before the file's own ``expiration_time`` (or for
+    ``default_ttl`` seconds when the handle does not carry one), and the least
+    recently used entry is evicted once ``max_entries`` is reached.
+    """
+
+    def __init__(self, max_entries: int, default_ttl: float, expiry_margin: float = 60.0):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.expiry_margin = expiry_margin
+        self._entries: "OrderedDict[str, tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _ttl_for(self, file: Any) -> float:
+        """Seconds the handle stays valid, derived from its expiration time."""
+        expiration_time = getattr(file, "expiration_time", None)
+        if not isinstance(expiration_time, datetime):
+            return self.default_ttl
+        if expiration_time.tzinfo is None:
+            expiration_time = expiration_time.replace(tzinfo=timezone.utc)
+        remaining = (expiration_time - datetime.now(timezone.utc)).total_seconds()
+        return remaining - self.expiry_margin
+
+    def get(self, name: str) -> Optional[Any]:
+        """Return the cached handle for ``name``, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            file, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[name]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(name)
+            self.hits += 1
+            return file
+
+    def put(self, name: str, file: Any) -> None:
+        """Cache a handle, evicting the least recently used entries if full."""
+        ttl = self._ttl_for(file)
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[name] = (file, time.monotonic() + ttl)
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, name: str) -> None:
+        """Drop the handle for ``name`` if cached."""
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def clear(self) -> None:
+        """Drop all cached handles."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return a snapshot of cache counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
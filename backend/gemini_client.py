@@ -1,81 +1,158 @@
-import os
-import google.generativeai as genai
-from dotenv import load_dotenv
+import asyncio
+from typing import Optional
 
-load_dotenv()
+from concurrency import BoundedExecutor
+from transport import CircuitBreaker, ResilientTransport
+from file_cache import FileHandleCache, normalize_file_name
+from llm_backend import LLMBackend, create_llm_backend
+from config import settings
+from logger import get_logger
+from tracing import SPAN_KIND_CLIENT, span, start_span
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment variables")
+logger = get_logger("gemini_client")
 
-genai.configure(api_key=GEMINI_API_KEY)
 
 class GeminiClient:
-    def __init__(self):
-        self.model_name = "gemini-1.5-flash" # Or gemini-1.5-pro
-        self.model = genai.GenerativeModel(self.model_name)
-
-    def upload_file(self, file_path: str, mime_type: str = None):
-        """Uploads a file to Gemini File API."""
-        print(f"Uploading file: {file_path}")
-        file = genai.upload_file(file_path, mime_type=mime_type)
-        print(f"Uploaded file: {file.name}")
+    """
+    Model client used by the routes and background work.
+
+    Provider calls go to an ``LLMBackend`` (Gemini, or the in-process fake
+    selected with ``LLM_BACKEND=fake``); this class adds the executor, transport
+    policy and file handle cache around them.
+    """
+
+    def __init__(self, backend: Optional[LLMBackend] = None):
+        self.backend = backend or create_llm_backend()
+        self.model_name = self.backend.model_name
+        # The SDK is synchronous; async callers go through this pool so a slow
+        # Gemini call never blocks the event loop
+        self.executor = BoundedExecutor(
+            max_workers=settings.gemini_max_workers,
+            max_concurrency=settings.gemini_max_concurrency,
+            name="gemini"
+        )
+        # Deadlines, retries, circuit breaking and hedging for every async call
+        self.transport = ResilientTransport(
+            self.executor,
+            timeouts={
+                "default": settings.gemini_timeout,
+                "generate": settings.gemini_generate_timeout,
+                "upload": settings.gemini_upload_timeout,
+            },
+            max_attempts=settings.gemini_retry_max_attempts,
+            base_delay=settings.gemini_retry_base_delay,
+            max_delay=settings.gemini_retry_max_delay,
+            breaker=CircuitBreaker(
+                failure_threshold=settings.gemini_breaker_failure_threshold,
+                reset_timeout=settings.gemini_breaker_reset_timeout
+            ),
+            hedge_delay=settings.gemini_hedge_delay
+        )
+        # File handles are reused across turns instead of re-fetched per request
+        self.file_cache = FileHandleCache(
+            max_entries=settings.gemini_file_cache_size,
+            default_ttl=settings.gemini_file_cache_ttl
+        )
+
+    @property
+    def context_cache(self):
+        """The backend's context cache registry, if it has one."""
+        return self.backend.context_cache
+
+    def upload_file(self, file_path: str, mime_type: str = None, display_name: str = None):
+        """Uploads a file through the backend and caches its handle."""
+        file = self.backend.upload_file(file_path, mime_type=mime_type, display_name=display_name)
+        self.file_cache.put(file.name, file)
         return file
 
     def list_files(self):
-        """Lists files uploaded to Gemini."""
-        return list(genai.list_files())
+        """Lists uploaded files."""
+        return self.backend.list_files()
 
     def delete_file(self, file_name: str):
-        """Deletes a file from Gemini."""
-        genai.delete_file(file_name)
+        """Deletes an uploaded file."""
+        self.file_cache.invalidate(normalize_file_name(file_name))
+        if self.context_cache is not None:
+            self.context_cache.invalidate_file(normalize_file_name(file_name))
+        self.backend.delete_file(file_name)
+
+    def get_file(self, file_name: str):
+        """Fetches a file handle from the backend and caches it."""
+        file = self.backend.get_file(file_name)
+        self.file_cache.put(file_name, file)
+        return file
 
-    def chat_with_files(self, query: str, file_uris: list[str]):
+    def generate(self, contents: list):
+        """Generates a complete answer for the given prompt contents."""
+        return self.backend.generate(contents)
+
+    def stream_generate(self, contents: list):
+        """Generates an answer for the given prompt contents, yielding text chunks as they arrive."""
+        yield from self.backend.stream_generate(contents)
+
+    async def aupload_file(self, file_path: str, mime_type: str = None, display_name: str = None):
+        """Async variant of upload_file that runs on the Gemini executor."""
+        with span("gemini.upload", SPAN_KIND_CLIENT):
+            return await self.transport.call(
+                "upload", self.upload_file, file_path, mime_type=mime_type, display_name=display_name
+            )
+
+    async def adelete_file(self, file_name: str):
+        """Async variant of delete_file that runs on the Gemini executor."""
+        with span("gemini.delete", SPAN_KIND_CLIENT):
+            return await self.transport.call("delete", self.delete_file, file_name)
+
+    async def aget_files(self, file_uris: list[str]):
         """
-        Sends a query to Gemini using the uploaded files as context.
-        Note: In a real production scenario with many files, you would use 
-        File Search (Vector Store) instead of passing all file URIs directly 
-        if the context window is exceeded. For this MVP with File Search API,
-        we will assume we are using the 'tools' approach or direct context 
-        depending on the specific Gemini API version capabilities for 'File Search'.
-        
-        For the 'File Search' specific feature (Knowledge Retrieval), we need to 
-        create a corpus/cache.
+        Resolves file handles from the cache, fetching all misses concurrently.
+        Files that cannot be fetched are skipped.
         """
-        # This is a simplified implementation using direct file context for now.
-        # For true "File Search" with large scale, we'd use the retrieval tools.
-        
-        # Construct the prompt with file context
-        # In 1.5 Flash/Pro, we can pass file objects directly to generate_content
-        
-        # Fetch file objects (simplified, assuming we have the names/URIs)
-        # In SDK, we might need to pass the file object returned from upload, 
-        # or retrieve it by name.
-        
-        # For this implementation, let's assume we are using the standard generate_content
-        # with the file objects.
-        
-        # NOTE: To properly use "File Search" (Semantic Retrieval), we should use
-        # the `tools=[{'google_search_retrieval': ...}]` or similar if available,
-        # but for *uploaded user files*, we typically pass them in the history or request.
-        
-        # Let's try the direct approach first which is robust for < 1M tokens.
-        
-        # We need to get the file objects first.
-        files = []
-        for uri in file_uris:
-             # We can't easily get the file object back from just URI in the standard SDK 
-             # without re-fetching or keeping track. 
-             # Let's assume the caller passes the file names (files/...)
-             try:
-                 file = genai.get_file(uri)
-                 files.append(file)
-             except Exception as e:
-                 print(f"Error getting file {uri}: {e}")
-
-        response = self.model.generate_content(
-            [query] + files
-        )
-        return response.text
+        names = [normalize_file_name(uri) for uri in file_uris]
+        resolved = {}
+        misses = []
+        for name in names:
+            file = self.file_cache.get(name)
+            if file is not None:
+                resolved[name] = file
+            elif name not in misses:
+                misses.append(name)
+
+        with span("gemini.get_files", SPAN_KIND_CLIENT, files=len(names), cache_misses=len(misses)):
+            results = await asyncio.gather(
+                *(self.transport.call("get", self.get_file, name, idempotent=True) for name in misses),
+                return_exceptions=True
+            )
+        for name, result in zip(misses, results):
+            if isinstance(result, Exception):
+                logger.warning("Error getting file %s: %s", name, result)
+            else:
+                resolved[name] = result
+        return [resolved[name] for name in names if name in resolved]
+
+    async def agenerate(self, contents: list):
+        """Async variant of generate that runs on the Gemini executor."""
+        with span("gemini.generate", SPAN_KIND_CLIENT, model=self.model_name):
+            return await self.transport.call("generate", self.generate, contents)
+
+    async def astream_generate(self, contents: list):
+        """Async variant of stream_generate; holds one executor slot for the whole stream."""
+        # Not made current: the span is open across yields to the caller
+        stream_span = start_span("gemini.stream", SPAN_KIND_CLIENT, model=self.model_name)
+        chunks = 0
+        error = None
+        try:
+            async for text in self.transport.stream("generate", self.stream_generate, contents):
+                if stream_span is not None and not chunks:
+                    stream_span.set_attribute("first_chunk_ms", round(stream_span.duration_ms, 1))
+                chunks += 1
+                yield text
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if stream_span is not None:
+                stream_span.set_attribute("chunks", chunks)
+                stream_span.end(error)
+
 
 gemini_client = GeminiClient()
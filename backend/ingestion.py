@@ -0,0 +1,333 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from database import AsyncSessionLocal, release_connection
+from gemini_client import gemini_client
+from logger import get_logger
+from models import Document, IngestionJob
+from retrieval import build_chunks, index_document, save_chunks
+from upload_pipeline import StagedUpload
+
+logger = get_logger("ingestion")
+
+# Job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# Progress checkpoints reported through the job status endpoint
+PROGRESS_STAGED = 10
+PROGRESS_UPLOADING = 30
+PROGRESS_DONE = 100
+
+
+def to_naive_utc(value):
+    """Convert an aware datetime to the naive UTC form stored in the database."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+async def find_reusable_document(db: AsyncSession, content_hash: str):
+    """Return an active document with the same content whose Gemini file has not expired."""
+    result = await db.scalars(
+        select(Document)
+        .where(
+            Document.content_hash == content_hash,
+            Document.is_active == True,
+        )
+        .order_by(Document.uploaded_at.desc())
+    )
+    now = datetime.utcnow()
+    for document in result:
+        if document.gemini_expires_at is None or document.gemini_expires_at > now:
+            return document
+    return None
+
+
+def build_document(staged: StagedUpload, gemini_file) -> Document:
+    """Build the Document row for a staged file uploaded to Gemini."""
+    return Document(
+        filename=staged.original_filename,
+        original_filename=staged.original_filename,
+        mime_type=staged.mime_type,
+        file_size=staged.size,
+        gemini_uri=gemini_file.uri,
+        gemini_name=gemini_file.name,
+        gemini_expires_at=to_naive_utc(getattr(gemini_file, "expiration_time", None)),
+        content_hash=staged.content_hash
+    )
+
+
+async def upload_staged(staged: StagedUpload):
+    """Upload a staged file to Gemini."""
+    return await gemini_client.aupload_file(
+        staged.path, mime_type=staged.mime_type, display_name=staged.original_filename
+    )
+
+
+async def ingest_staged_upload(db: AsyncSession, staged: StagedUpload) -> Tuple[Document, bool]:
+    """
+    Upload a staged file to Gemini and record it as a Document.
+
+    Returns ``(document, deduplicated)``; an active document with identical content
+    is reused without contacting Gemini. The staged file is left for the caller to
+    discard. No connection is held during the upload or while chunks are built.
+    """
+    existing_document = await find_reusable_document(db, staged.content_hash)
+    if existing_document:
+        logger.info("Reusing existing document for %s (ID: %s)", staged.original_filename, existing_document.id)
+        return existing_document, True
+
+    await release_connection(db)
+    gemini_file = await upload_staged(staged)
+    document = build_document(staged, gemini_file)
+    db.add(document)
+    await db.commit()
+    await index_document(db, document, staged)
+    return document, False
+
+
+async def ingest_staged_batch(
+    db: AsyncSession,
+    staged_uploads: List[StagedUpload],
+    concurrency: int,
+) -> List[Tuple[Optional[Document], bool, Optional[str]]]:
+    """
+    Ingest many staged files at once.
+
+    Files whose content is already stored (or repeated within the batch) are
+    deduplicated, the rest are uploaded to Gemini with at most ``concurrency``
+    transfers in flight, and every new Document is committed in one transaction.
+    Returns ``(document, deduplicated, error)`` per input, in order; a failed
+    upload only fails its own entry.
+    """
+    results: List[Tuple[Optional[Document], bool, Optional[str]]] = [None] * len(staged_uploads)
+    to_upload = {}  # content hash -> index of the first staged file with that content
+    for index, staged in enumerate(staged_uploads):
+        if staged.content_hash in to_upload:
+            continue
+        existing_document = await find_reusable_document(db, staged.content_hash)
+        if existing_document:
+            results[index] = (existing_document, True, None)
+        else:
+            to_upload[staged.content_hash] = index
+    await release_connection(db)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def upload(index: int):
+        async with semaphore:
+            return await upload_staged(staged_uploads[index])
+
+    indexes = list(to_upload.values())
+    gemini_files = await asyncio.gather(*(upload(index) for index in indexes), return_exceptions=True)
+
+    documents = {}
+    for index, gemini_file in zip(indexes, gemini_files):
+        if isinstance(gemini_file, Exception):
+            logger.error("Error uploading file %s: %s", staged_uploads[index].original_filename, gemini_file)
+            results[index] = (None, False, str(gemini_file))
+            continue
+        document = build_document(staged_uploads[index], gemini_file)
+        documents[index] = document
+        results[index] = (document, False, None)
+
+    if documents:
+        db.add_all(documents.values())
+        await db.commit()
+        await index_batch(db, documents, staged_uploads)
+
+    # Later copies of content uploaded in this batch share the first copy's result
+    for index, staged in enumerate(staged_uploads):
+        if results[index] is None:
+            document, _, error = results[to_upload[staged.content_hash]]
+            results[index] = (document, document is not None, error)
+
+    return results
+
+
+async def index_batch(db: AsyncSession, documents: dict, staged_uploads: List[StagedUpload]) -> None:
+    """Chunk and embed newly created batch documents, saving all chunks in one commit."""
+    try:
+        built = await asyncio.gather(*(
+            run_in_threadpool(build_chunks, document.id, staged_uploads[index])
+            for index, document in documents.items()
+        ))
+        await save_chunks(db, [
+            (document.id, chunks, vectors)
+            for document, (chunks, vectors) in zip(documents.values(), built)
+        ])
+    except Exception as e:
+        await db.rollback()
+        for document in documents.values():
+            await db.refresh(document)
+        logger.warning("Could not index batch documents: %s", e)
+
+
+def staged_upload_for(job: IngestionJob) -> StagedUpload:
+    """Rebuild the staged upload a job refers to."""
+    return StagedUpload(
+        path=job.staged_path,
+        original_filename=job.original_filename,
+        mime_type=job.mime_type,
+        size=job.file_size,
+        content_hash=job.content_hash,
+    )
+
+
+class IngestionQueue:
+    """
+    Background queue that uploads staged files to Gemini and records Documents.
+
+    Job state lives in the ``ingestion_jobs`` table, so jobs that were queued or
+    running when the process stopped are picked up again on the next start.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        max_attempts: int,
+        retry_backoff: float,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+    ):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.session_factory = session_factory
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Start the workers and re-enqueue unfinished jobs from the database."""
+        self._queue = asyncio.Queue()
+        async with self.session_factory() as db:
+            result = await db.scalars(
+                select(IngestionJob)
+                .where(IngestionJob.status.in_([JOB_QUEUED, JOB_RUNNING]))
+                .order_by(IngestionJob.created_at)
+            )
+            pending = result.all()
+            for job in pending:
+                if os.path.exists(job.staged_path):
+                    job.status = JOB_QUEUED
+                    self._queue.put_nowait(job.id)
+                else:
+                    job.status = JOB_FAILED
+                    job.error = "Staged file is missing after restart"
+            await db.commit()
+        if pending:
+            logger.info("Recovered %s unfinished ingestion jobs", len(pending))
+
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"ingestion-{index}")
+            for index in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        """Stop the workers; jobs in progress are resumed on the next start."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    async def submit(self, db: AsyncSession, staged: StagedUpload) -> IngestionJob:
+        """Record a job for a staged upload and queue it."""
+        job = IngestionJob(
+            id=uuid.uuid4().hex,
+            status=JOB_QUEUED,
+            progress=PROGRESS_STAGED,
+            original_filename=staged.original_filename,
+            staged_path=staged.path,
+            mime_type=staged.mime_type,
+            file_size=staged.size,
+            content_hash=staged.content_hash,
+        )
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        self._queue.put_nowait(job.id)
+        return job
+
+    def stats(self) -> dict:
+        """Return a snapshot of queue state."""
+        return {
+            "workers": len(self._workers),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            except Exception as e:
+                logger.error("Ingestion worker failed on job %s: %s", job_id, e, exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _update(self, job_id: str, **fields) -> None:
+        """Write job fields in a short transaction of their own."""
+        async with self.session_factory() as db:
+            await db.execute(
+                update(IngestionJob)
+                .where(IngestionJob.id == job_id)
+                .values(**fields, updated_at=datetime.utcnow())
+            )
+            await db.commit()
+
+    async def _process(self, job_id: str) -> None:
+        # Each database step gets its own short-lived session, so no connection is
+        # held across the upload, between attempts or during the backoff sleep
+        async with self.session_factory() as db:
+            job = await db.get(IngestionJob, job_id)
+            if job is None or job.status not in (JOB_QUEUED, JOB_RUNNING):
+                return
+            staged = staged_upload_for(job)
+            attempts = job.attempts
+
+        while True:
+            attempts += 1
+            await self._update(job_id, status=JOB_RUNNING, attempts=attempts, progress=PROGRESS_UPLOADING)
+            try:
+                async with self.session_factory() as db:
+                    document, deduplicated = await ingest_staged_upload(db, staged)
+            except Exception as e:
+                if attempts >= self.max_attempts:
+                    logger.error("Ingestion job %s failed after %s attempts: %s", job_id, attempts, e)
+                    await self._update(job_id, status=JOB_FAILED, error=str(e))
+                    staged.discard()
+                    return
+                delay = self.retry_backoff * 2 ** (attempts - 1)
+                logger.warning("Ingestion job %s attempt %s failed, retrying in %.1fs: %s", job_id, attempts, delay, e)
+                await self._update(job_id, error=str(e))
+                await asyncio.sleep(delay)
+                continue
+
+            await self._update(
+                job_id,
+                status=JOB_SUCCEEDED,
+                progress=PROGRESS_DONE,
+                document_id=document.id,
+                deduplicated=deduplicated,
+                error=None,
+            )
+            staged.discard()
+            logger.info("Ingestion job %s completed (document ID: %s)", job_id, document.id)
+            return
+
+ingestion_queue = IngestionQueue(
+    concurrency=settings.ingestion_workers,
+    max_attempts=settings.ingestion_max_attempts,
+    retry_backoff=settings.ingestion_retry_backoff,
+)
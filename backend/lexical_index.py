@@ -0,0 +1,70 @@
+import re
+from typing import List
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import CHUNK_FTS_TABLE
+
+TERM_PATTERN = re.compile(r"\S+")
+WORD_PATTERN = re.compile(r"\w", re.UNICODE)
+
+INDEX_DOCUMENTS_SQL = text(
+    f"INSERT INTO {CHUNK_FTS_TABLE}(rowid, text) "
+    "SELECT id, text FROM document_chunks WHERE document_id IN :document_ids"
+).bindparams(bindparam("document_ids", expanding=True))
+
+# External-content FTS5 tables remove rows with the special 'delete' command,
+# which needs the original text to find the postings to drop
+REMOVE_DOCUMENT_SQL = text(
+    f"INSERT INTO {CHUNK_FTS_TABLE}({CHUNK_FTS_TABLE}, rowid, text) "
+    "SELECT 'delete', id, text FROM document_chunks WHERE document_id = :document_id"
+)
+
+SEARCH_SQL = text(
+    f"SELECT document_chunks.id FROM {CHUNK_FTS_TABLE} "
+    f"JOIN document_chunks ON document_chunks.id = {CHUNK_FTS_TABLE}.rowid "
+    f"WHERE {CHUNK_FTS_TABLE} MATCH :query AND document_chunks.document_id IN :document_ids "
+    f"ORDER BY bm25({CHUNK_FTS_TABLE}) LIMIT :k"
+).bindparams(bindparam("document_ids", expanding=True))
+
+
+def build_match_query(query: str) -> str:
+    """
+    Turn free text into an FTS5 query.
+
+    Each whitespace-separated term becomes a quoted phrase, so identifiers such as
+    ``AB-1234`` or ``4.2.1`` must match as a unit and user punctuation can never be
+    parsed as query syntax. Terms are ORed; BM25 ranks chunks that match more and
+    rarer terms first.
+    """
+    terms = [term for term in TERM_PATTERN.findall(query) if WORD_PATTERN.search(term)]
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def is_supported(db: AsyncSession) -> bool:
+    """FTS5 is SQLite-only; other databases fall back to vector search alone."""
+    return db.bind.dialect.name == "sqlite"
+
+
+async def index_documents(db: AsyncSession, document_ids: List[int]) -> None:
+    """Add the flushed chunks of the given documents to the full-text index."""
+    if document_ids and is_supported(db):
+        await db.execute(INDEX_DOCUMENTS_SQL, {"document_ids": document_ids})
+
+
+async def remove_document(db: AsyncSession, document_id: int) -> None:
+    """Drop a document's chunks from the full-text index."""
+    if is_supported(db):
+        await db.execute(REMOVE_DOCUMENT_SQL, {"document_id": document_id})
+
+
+async def search(db: AsyncSession, query: str, document_ids: List[int], k: int) -> List[int]:
+    """Return the ids of the ``k`` chunks of the given documents ranked best by BM25."""
+    match_query = build_match_query(query)
+    if not match_query or not document_ids or not is_supported(db):
+        return []
+    result = await db.scalars(
+        SEARCH_SQL, {"query": match_query, "document_ids": document_ids, "k": k}
+    )
+    return list(result)
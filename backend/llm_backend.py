@@ -0,0 +1,354 @@
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, Optional
+
+import google.generativeai as genai
+
+from config import settings
+from context_cache import create_context_cache, split_contents
+from logger import get_logger
+
+logger = get_logger("llm_backend")
+
+FAKE_FILE_LIFETIME = timedelta(hours=48)  # Matches Gemini File API retention
+
+FAKE_ANSWER_WORDS = (
+    "the documents describe this in detail and the relevant passages agree on the main points "
+    "while a few sections add context about scope dates owners and open questions"
+).split()
+
+
+class LLMBackend:
+    """
+    Base class for the model provider behind ``GeminiClient``.
+
+    Implementations are synchronous; the client runs them on its executor with
+    deadlines and retries. File handles need ``name`` and ``uri`` attributes and
+    may carry an ``expiration_time``.
+    """
+
+    name: str
+    model_name: str
+    context_cache = None
+
+    def upload_file(self, file_path: str, mime_type: str = None, display_name: str = None) -> Any:
+        """Upload a file and return its handle."""
+        raise NotImplementedError
+
+    def list_files(self) -> list:
+        """List uploaded file handles."""
+        raise NotImplementedError
+
+    def get_file(self, file_name: str) -> Any:
+        """Fetch the handle of an uploaded file."""
+        raise NotImplementedError
+
+    def delete_file(self, file_name: str) -> None:
+        """Delete an uploaded file."""
+        raise NotImplementedError
+
+    def generate(self, contents: list) -> str:
+        """Generate a complete answer for prompt contents (text parts and file handles)."""
+        raise NotImplementedError
+
+    def stream_generate(self, contents: list) -> Iterator[str]:
+        """Generate an answer, yielding text chunks as they are produced."""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "model": self.model_name}
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through ``google.generativeai``, with optional context caching."""
+
+    name = "gemini"
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        model_name: str,
+        context_cache_backend: str = "none",
+        context_cache_model: Optional[str] = None,
+        **context_cache_options
+    ):
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY is required for the gemini LLM backend")
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+        # Files that recur across turns are served from server-side cached contents
+        self.context_cache = create_context_cache(
+            context_cache_backend, lambda: self.model, model_name, context_cache_model, **context_cache_options
+        )
+
+    def upload_file(self, file_path: str, mime_type: str = None, display_name: str = None):
+        logger.info("Uploading file: %s", file_path)
+        file = genai.upload_file(file_path, mime_type=mime_type, display_name=display_name)
+        logger.info("Uploaded file: %s", file.name)
+        return file
+
+    def list_files(self):
+        return list(genai.list_files())
+
+    def get_file(self, file_name: str):
+        return genai.get_file(file_name)
+
+    def delete_file(self, file_name: str):
+        genai.delete_file(file_name)
+
+    def _cached_request(self, contents: list):
+        """
+        Returns ``(handle, model, contents)`` for generating against a context cache
+        holding the attached files, or None when no cache applies.
+        """
+        if self.context_cache is None:
+            return None
+        files, others = split_contents(contents)
+        if not files:
+            return None
+        handle = self.context_cache.lookup(self.model_name, files)
+        if handle is None:
+            return None
+        return handle, self.context_cache.model_for(handle), others
+
+    def generate(self, contents: list):
+        cached = self._cached_request(contents)
+        if cached is not None:
+            handle, model, parts = cached
+            try:
+                return model.generate_content(parts).text
+            except Exception as e:
+                logger.warning("Cached generation failed, retrying without context cache: %s", e)
+                self.context_cache.discard(handle)
+        response = self.model.generate_content(contents)
+        return response.text
+
+    def stream_generate(self, contents: list):
+        cached = self._cached_request(contents)
+        if cached is not None:
+            handle, model, parts = cached
+            started = False
+            try:
+                for chunk in model.generate_content(parts, stream=True):
+                    started = True
+                    yield chunk.text
+                return
+            except Exception as e:
+                # Once text has been streamed a retry would repeat it
+                if started:
+                    raise
+                logger.warning("Cached generation failed, retrying without context cache: %s", e)
+                self.context_cache.discard(handle)
+        response = self.model.generate_content(contents, stream=True)
+        for chunk in response:
+            yield chunk.text
+
+
+class FakeBackendError(Exception):
+    """Injected upstream failure; carries a 503 code so the transport retries it."""
+    code = 503
+
+
+class LatencyDistribution:
+    """
+    Samples delays around a median.
+
+    ``fixed`` always returns the median, ``uniform`` spreads it by ±``spread``
+    (a fraction of the median) and ``lognormal`` uses ``spread`` as sigma, which
+    gives the long tail typical of LLM APIs.
+    """
+
+    KINDS = ("fixed", "uniform", "lognormal")
+
+    def __init__(self, kind: str, median_ms: float, spread: float, rng: random.Random):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.kind = kind
+        self.median = median_ms / 1000
+        self.spread = spread
+        self.rng = rng
+
+    def sample(self) -> float:
+        """Return a delay in seconds."""
+        if self.median <= 0:
+            return 0.0
+        if self.kind == "uniform":
+            return self.rng.uniform(self.median * max(1 - self.spread, 0), self.median * (1 + self.spread))
+        if self.kind == "lognormal":
+            return self.median * math.exp(self.rng.gauss(0, self.spread))
+        return self.median
+
+
+@dataclass
+class FakeFile:
+    """File handle returned by the fake backend."""
+    name: str
+    uri: str
+    display_name: Optional[str]
+    mime_type: Optional[str]
+    size_bytes: int
+    expiration_time: datetime
+
+
+class FakeBackend(LLMBackend):
+    """
+    In-process stand-in for Gemini for load tests and CI.
+
+    Files are kept in memory. Answers are canned text whose first token arrives
+    after a sampled latency and whose chunks follow at ``chunk_interval_ms``; a
+    non-streamed answer takes as long as the streamed one would. A fraction
+    ``error_rate`` of calls fails with a retryable error before any output. Calls
+    block their worker thread like the real SDK does, so the executor, transport
+    and admission limits are exercised as in production.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        model_name: str = "fake-model",
+        latency: str = "lognormal",
+        latency_ms: float = 400.0,
+        latency_spread: float = 0.5,
+        chunk_interval_ms: float = 25.0,
+        answer_words: int = 120,
+        chunk_words: int = 4,
+        file_latency_ms: float = 30.0,
+        upload_latency_ms: float = 300.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.model_name = model_name
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.latency = LatencyDistribution(latency, latency_ms, latency_spread, self._rng)
+        self.file_latency = LatencyDistribution(latency, file_latency_ms, latency_spread, self._rng)
+        self.upload_latency = LatencyDistribution(latency, upload_latency_ms, latency_spread, self._rng)
+        self.chunk_interval = chunk_interval_ms / 1000
+        self.answer_words = answer_words
+        self.chunk_words = max(chunk_words, 1)
+        self.error_rate = error_rate
+        self.files: Dict[str, FakeFile] = {}
+        self._lock = threading.Lock()
+
+        self.calls: Dict[str, int] = {}
+        self.injected_errors = 0
+
+    def _begin(self, operation: str, latency: LatencyDistribution) -> None:
+        """Count the call, wait out its latency and maybe inject a failure."""
+        with self._rng_lock:
+            delay = latency.sample()
+            fail = self._rng.random() < self.error_rate
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            if fail:
+                self.injected_errors += 1
+        time.sleep(delay)
+        if fail:
+            raise FakeBackendError(f"Injected failure in fake {operation}")
+
+    def _file_handle(self, name: str, **fields) -> FakeFile:
+        return FakeFile(
+            name=name,
+            uri=f"https://fake-llm.local/v1beta/{name}",
+            display_name=fields.get("display_name"),
+            mime_type=fields.get("mime_type"),
+            size_bytes=fields.get("size_bytes", 0),
+            expiration_time=datetime.now(timezone.utc) + FAKE_FILE_LIFETIME,
+        )
+
+    def upload_file(self, file_path: str, mime_type: str = None, display_name: str = None):
+        self._begin("upload", self.upload_latency)
+        file = self._file_handle(
+            f"files/fake-{uuid.uuid4().hex[:16]}",
+            display_name=display_name,
+            mime_type=mime_type,
+            size_bytes=os.path.getsize(file_path),
+        )
+        with self._lock:
+            self.files[file.name] = file
+        return file
+
+    def list_files(self):
+        self._begin("list", self.file_latency)
+        with self._lock:
+            return list(self.files.values())
+
+    def get_file(self, file_name: str):
+        """Return the stored handle; unknown names get a synthetic one so a seeded database works."""
+        self._begin("get", self.file_latency)
+        with self._lock:
+            return self.files.get(file_name) or self._file_handle(file_name)
+
+    def delete_file(self, file_name: str):
+        self._begin("delete", self.file_latency)
+        with self._lock:
+            self.files.pop(file_name, None)
+
+    def _answer_chunks(self, contents: list) -> list:
+        files, others = split_contents(contents)
+        prompt = " ".join(part for part in others if isinstance(part, str))
+        words = [f"Fake answer using {len(files)} files for a {len(prompt)} character prompt:"]
+        words += [FAKE_ANSWER_WORDS[index % len(FAKE_ANSWER_WORDS)] for index in range(self.answer_words)]
+        return [
+            " ".join(words[start:start + self.chunk_words]) + " "
+            for start in range(0, len(words), self.chunk_words)
+        ]
+
+    def generate(self, contents: list):
+        self._begin("generate", self.latency)
+        chunks = self._answer_chunks(contents)
+        time.sleep(self.chunk_interval * (len(chunks) - 1))
+        return "".join(chunks).strip()
+
+    def stream_generate(self, contents: list):
+        self._begin("stream_generate", self.latency)
+        for index, chunk in enumerate(self._answer_chunks(contents)):
+            if index:
+                time.sleep(self.chunk_interval)
+            yield chunk
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **super().stats(),
+                "files": len(self.files),
+                "calls": dict(self.calls),
+                "injected_errors": self.injected_errors,
+            }
+
+
+def create_llm_backend() -> LLMBackend:
+    """Create the backend selected by ``settings.llm_backend``."""
+    if settings.llm_backend == "gemini":
+        return GeminiBackend(
+            api_key=settings.gemini_api_key,
+            model_name=settings.gemini_model,
+            context_cache_backend=settings.context_cache_backend,
+            context_cache_model=settings.context_cache_model,
+            ttl=settings.context_cache_ttl,
+            min_uses=settings.context_cache_min_uses,
+            max_entries=settings.context_cache_max_entries,
+            failure_cooldown=settings.context_cache_failure_cooldown
+        )
+    if settings.llm_backend == "fake":
+        return FakeBackend(
+            latency=settings.fake_llm_latency,
+            latency_ms=settings.fake_llm_latency_ms,
+            latency_spread=settings.fake_llm_latency_spread,
+            chunk_interval_ms=settings.fake_llm_chunk_interval_ms,
+            answer_words=settings.fake_llm_answer_words,
+            chunk_words=settings.fake_llm_chunk_words,
+            file_latency_ms=settings.fake_llm_file_latency_ms,
+            upload_latency_ms=settings.fake_llm_upload_latency_ms,
+            error_rate=settings.fake_llm_error_rate,
+            seed=settings.fake_llm_seed
+        )
+    raise ValueError(f"Unknown LLM backend: {settings.llm_backend}")
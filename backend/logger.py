@@ -1,11 +1,122 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
+import time
+from datetime import datetime, timezone
 from pathlib import Path
-from datetime import datetime
+from typing import Dict, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
 from config import settings
 
+# Attributes every LogRecord has; anything else was passed through ``extra``
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed with ``extra`` become top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "source": f"{record.filename}:{record.lineno}",
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Passes a fraction of the records of selected loggers.
+
+    ``rates`` maps logger names to the fraction kept; a rate applies to the
+    logger's children too. Warnings and errors are always kept.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.dropped = 0
+
+    def rate_for(self, name: str) -> float:
+        while name:
+            rate = self.rates.get(name)
+            if rate is not None:
+                return rate
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        if random.random() < self.rate_for(record.name):
+            return True
+        self.dropped += 1
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the writer thread without formatting them.
+
+    ``QueueHandler.prepare`` would render the message on the calling thread;
+    here records are queued as they are, so ``%``-style arguments are only
+    formatted by the writer. Arguments must therefore not be mutated after the
+    call. When the queue is full the record is dropped and counted rather than
+    blocking the event loop.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """Parse ``name=rate`` pairs such as ``rag_chat.access=0.1,rag_chat.retrieval=0.5``."""
+    rates = {}
+    for pair in value.split(","):
+        if pair.strip():
+            name, _, rate = pair.partition("=")
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+def create_file_handler(path: Path, rotation: str, max_bytes: int, backup_count: int) -> logging.Handler:
+    """Rotate daily at midnight (``time``) or at ``max_bytes`` (``size``)."""
+    if rotation == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when="midnight", backupCount=backup_count, encoding="utf-8", delay=True
+        )
+    if rotation == "size":
+        return logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+        )
+    raise ValueError(f"Unknown log rotation: {rotation}")
+
+
 # Create logs directory if it doesn't exist
-logs_dir = Path("logs")
+logs_dir = Path(settings.log_dir)
 logs_dir.mkdir(exist_ok=True)
 
 # Create logger
@@ -28,14 +139,25 @@ console_handler.setLevel(logging.INFO)
 console_handler.setFormatter(simple_formatter)
 
 # File handler
-log_file = logs_dir / f"app_{datetime.now().strftime('%Y%m%d')}.log"
-file_handler = logging.FileHandler(log_file)
+file_handler = create_file_handler(
+    logs_dir / "app.log", settings.log_rotation, settings.log_max_bytes, settings.log_backup_count
+)
 file_handler.setLevel(logging.DEBUG)
-file_handler.setFormatter(detailed_formatter)
+file_handler.setFormatter(JsonFormatter() if settings.log_format == "json" else detailed_formatter)
+
+# Callers only enqueue; the listener thread formats and writes to both handlers
+log_queue: queue.Queue = queue.Queue(maxsize=settings.log_queue_size)
+queue_handler = NonBlockingQueueHandler(log_queue)
+sampling_filter = SamplingFilter(parse_sample_rates(settings.log_sample_rates))
+queue_handler.addFilter(sampling_filter)
+queue_listener = logging.handlers.QueueListener(
+    log_queue, console_handler, file_handler, respect_handler_level=True
+)
+queue_listener.start()
+atexit.register(queue_listener.stop)
 
 # Add handlers
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
+logger.addHandler(queue_handler)
 
 
 def get_logger(name: str = None) -> logging.Logger:
@@ -43,3 +165,63 @@ def get_logger(name: str = None) -> logging.Logger:
     if name:
         return logging.getLogger(f"rag_chat.{name}")
     return logger
+
+
+def flush_logs() -> None:
+    """Block until queued records have been written."""
+    while log_queue.unfinished_tasks:
+        time.sleep(0.001)
+
+
+def logging_stats() -> dict:
+    return {
+        "queue_depth": log_queue.qsize(),
+        "dropped_full_queue": queue_handler.dropped,
+        "dropped_sampled": sampling_filter.dropped,
+    }
+
+
+access_logger = get_logger("access")
+
+
+class AccessLogMiddleware:
+    """
+    ASGI middleware writing one structured access line per request.
+
+    Method, path, status and duration are passed as ``extra`` fields, so they
+    are separate keys in the JSON log. The line goes to the ``rag_chat.access``
+    logger, which can be sampled with ``LOG_SAMPLE_RATES``.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status: Optional[int] = None
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            if access_logger.isEnabledFor(logging.INFO):
+                duration = time.perf_counter() - start_time
+                access_logger.info(
+                    "Request completed: %s %s - Status: %s - Time: %.3fs",
+                    scope["method"], scope["path"], status or 500, duration,
+                    extra={
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status or 500,
+                        "duration_ms": round(duration * 1000, 2),
+                    }
+                )
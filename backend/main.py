@@ -1,20 +1,29 @@
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
-import time
 
+from admission import AdmissionMiddleware, admission_controller
+from metrics import MetricsMiddleware, registry as metrics_registry
+from tracing import TracingMiddleware, tracer
+from query_profiler import QueryProfilerMiddleware, query_profiler
+from gemini_client import gemini_client
 from api.routes import router
 from database import init_db
+from ingestion import ingestion_queue
+from conversation import session_summarizer
 from config import settings
-from logger import get_logger
+from logger import AccessLogMiddleware, get_logger
 from exceptions import (
     DocumentUploadError, GeminiAPIError, SessionNotFoundError,
-    DocumentNotFoundError, FileSizeExceededError, InvalidFileTypeError
+    DocumentNotFoundError, FileSizeExceededError, InvalidFileTypeError,
+    JobNotFoundError, GeminiUnavailableError
 )
 
 logger = get_logger("main")
 
+API_PREFIX = "/api"
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -23,9 +32,15 @@ async def lifespan(app: FastAPI):
     logger.info("Starting up application...")
     init_db()
     logger.info("Database initialized")
+    await ingestion_queue.start()
+    logger.info("Ingestion queue started")
     yield
     # Shutdown
     logger.info("Shutting down application...")
+    await ingestion_queue.stop()
+    await session_summarizer.drain()
+    if tracer.exporter is not None:
+        tracer.exporter.shutdown()
 
 
 app = FastAPI(
@@ -35,40 +50,47 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# Configure CORS
+# Full templates of the API routes, keyed by id() of the route objects matched at runtime
+route_templates = {id(route): API_PREFIX + route.path for route in router.routes}
+
+# Per-client rate limits and the global LLM concurrency gate
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
+# Statement counts and DB time per request in X-DB-* headers
+if settings.query_profiler_enabled:
+    app.add_middleware(QueryProfilerMiddleware, profiler=query_profiler)
+
+# Added after admission so it also times rejected requests
+if settings.metrics_enabled:
+    app.add_middleware(
+        MetricsMiddleware,
+        route_templates=route_templates
+    )
+
+# One structured line per request, written off the event loop
+app.add_middleware(AccessLogMiddleware)
+
+# Wraps every other middleware, so the root span covers them all
+if settings.tracing_enabled:
+    app.add_middleware(TracingMiddleware, tracer=tracer, route_templates=route_templates)
+
+# Configure CORS; outermost, so responses produced by the middlewares above
+# (429/503 from admission) carry the CORS headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins_list,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-Next-Cursor"],
 )
 
 
-# Request logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Log all incoming requests."""
-    start_time = time.time()
-    
-    logger.info(f"Incoming request: {request.method} {request.url.path}")
-    
-    response = await call_next(request)
-    
-    process_time = time.time() - start_time
-    logger.info(
-        f"Request completed: {request.method} {request.url.path} - "
-        f"Status: {response.status_code} - Time: {process_time:.3f}s"
-    )
-    
-    return response
-
-
 # Global exception handlers
 @app.exception_handler(DocumentUploadError)
 async def document_upload_error_handler(request: Request, exc: DocumentUploadError):
     """Handle document upload errors."""
-    logger.error(f"Document upload error: {exc.detail}")
+    logger.error("Document upload error: %s", exc.detail)
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail}
@@ -78,17 +100,28 @@ async def document_upload_error_handler(request: Request, exc: DocumentUploadErr
 @app.exception_handler(GeminiAPIError)
 async def gemini_api_error_handler(request: Request, exc: GeminiAPIError):
     """Handle Gemini API errors."""
-    logger.error(f"Gemini API error: {exc.detail}")
+    logger.error("Gemini API error: %s", exc.detail)
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail}
     )
 
 
+@app.exception_handler(GeminiUnavailableError)
+async def gemini_unavailable_error_handler(request: Request, exc: GeminiUnavailableError):
+    """Handle calls rejected while the Gemini circuit breaker is open."""
+    logger.warning("Gemini unavailable: %s", exc.detail)
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers=exc.headers
+    )
+
+
 @app.exception_handler(SessionNotFoundError)
 async def session_not_found_error_handler(request: Request, exc: SessionNotFoundError):
     """Handle session not found errors."""
-    logger.warning(f"Session not found: {exc.detail}")
+    logger.warning("Session not found: %s", exc.detail)
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail}
@@ -98,7 +131,17 @@ async def session_not_found_error_handler(request: Request, exc: SessionNotFound
 @app.exception_handler(DocumentNotFoundError)
 async def document_not_found_error_handler(request: Request, exc: DocumentNotFoundError):
     """Handle document not found errors."""
-    logger.warning(f"Document not found: {exc.detail}")
+    logger.warning("Document not found: %s", exc.detail)
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail}
+    )
+
+
+@app.exception_handler(JobNotFoundError)
+async def job_not_found_error_handler(request: Request, exc: JobNotFoundError):
+    """Handle ingestion job not found errors."""
+    logger.warning("Ingestion job not found: %s", exc.detail)
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail}
@@ -108,7 +151,7 @@ async def document_not_found_error_handler(request: Request, exc: DocumentNotFou
 @app.exception_handler(FileSizeExceededError)
 async def file_size_exceeded_error_handler(request: Request, exc: FileSizeExceededError):
     """Handle file size exceeded errors."""
-    logger.warning(f"File size exceeded: {exc.detail}")
+    logger.warning("File size exceeded: %s", exc.detail)
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail}
@@ -118,7 +161,7 @@ async def file_size_exceeded_error_handler(request: Request, exc: FileSizeExceed
 @app.exception_handler(InvalidFileTypeError)
 async def invalid_file_type_error_handler(request: Request, exc: InvalidFileTypeError):
     """Handle invalid file type errors."""
-    logger.warning(f"Invalid file type: {exc.detail}")
+    logger.warning("Invalid file type: %s", exc.detail)
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail}
@@ -128,7 +171,7 @@ async def invalid_file_type_error_handler(request: Request, exc: InvalidFileType
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle all other exceptions."""
-    logger.error(f"Unhandled exception: {str(exc)}", exc_info=True)
+    logger.error("Unhandled exception: %s", exc, exc_info=True)
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={"detail": "An internal server error occurred"}
@@ -136,7 +179,7 @@ async def general_exception_handler(request: Request, exc: Exception):
 
 
 # Include routers
-app.include_router(router, prefix="/api", tags=["API"])
+app.include_router(router, prefix=API_PREFIX, tags=["API"])
 
 
 @app.get("/")
@@ -153,3 +196,64 @@ def read_root():
 def health_check():
     """Health check endpoint."""
     return {"status": "healthy"}
+
+
+def register_runtime_metrics():
+    """Expose component state that is already tracked; read only when /metrics is scraped."""
+    metrics_registry.callback(
+        "gemini_executor_in_flight", "Gemini calls running on the executor.",
+        lambda: [((), gemini_client.executor.stats()["in_flight"])]
+    )
+    metrics_registry.callback(
+        "gemini_executor_queue_depth", "Gemini calls waiting for an executor slot.",
+        lambda: [((), gemini_client.executor.stats()["queue_depth"])]
+    )
+    metrics_registry.callback(
+        "gemini_transport_events_total", "Gemini transport calls, retries, timeouts, failures and hedges.",
+        lambda: [
+            ((operation, name), value)
+            for operation, counters in gemini_client.transport.stats()["operations"].items()
+            for name, value in counters.items()
+        ],
+        kind="counter", labelnames=("operation", "event")
+    )
+    metrics_registry.callback(
+        "gemini_circuit_breaker_open", "1 while the Gemini circuit breaker rejects calls.",
+        lambda: [((), int(gemini_client.transport.breaker.state != "closed"))]
+    )
+    metrics_registry.callback(
+        "llm_gate_in_flight", "Chat requests and background LLM calls holding an LLM slot.",
+        lambda: [((), admission_controller.gate.stats()["in_flight"])]
+    )
+    metrics_registry.callback(
+        "llm_gate_queue_depth", "Chat requests and background LLM calls waiting for an LLM slot.",
+        lambda: [((), admission_controller.gate.stats()["queue_depth"])]
+    )
+    metrics_registry.callback(
+        "llm_gate_shed_total", "Chat requests and background LLM calls shed because the LLM queue was full or the wait timed out.",
+        lambda: [((), admission_controller.gate.stats()["shed"])], kind="counter"
+    )
+    metrics_registry.callback(
+        "ingestion_queue_depth", "Background upload jobs waiting for a worker.",
+        lambda: [((), ingestion_queue.stats()["queue_depth"])]
+    )
+
+
+if settings.metrics_enabled:
+    register_runtime_metrics()
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        """Prometheus metrics in the text exposition format."""
+        return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+
+if settings.query_profiler_enabled:
+    @app.get("/debug/queries", include_in_schema=False)
+    def debug_queries():
+        """Query profiler totals and the most recent slow queries, newest first."""
+        return {
+            **query_profiler.stats(),
+            "slow_threshold_ms": query_profiler.slow_threshold * 1000,
+            "recent_slow_queries": list(reversed(query_profiler.slow_queries)),
+        }
@@ -0,0 +1,335 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (1024, 10240, 102400, 1048576, 5242880, 10485760, 52428800)
+
+UNMATCHED_ROUTE = "unmatched"  # Requests answered before routing: 404s and admission rejections
+STATEMENT_TYPES = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+MAX_CACHED_STATEMENTS = 4096
+
+LabelValues = Tuple[object, ...]
+
+
+def escape_label(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    A metric family whose children are keyed by a tuple of label values.
+
+    Children are created on first use and reused afterwards, so recording a
+    value is a dict lookup and an update under an uncontended lock. Label
+    values are stored as given (status codes stay ints) and only turned into
+    text when the registry is scraped.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Return the child for these label values, in ``labelnames`` order."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """Yield ``(suffix, labels, value)`` for every child."""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{suffix}{labels} {format_value(value)}" for suffix, labels, value in self.samples())
+        return lines
+
+
+class CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self, lock: threading.Lock):
+        self.value = 0
+        self._lock = lock
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterChild(self._lock)
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield "", format_labels(self.labelnames, values), child.value
+
+
+class GaugeChild(CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Gauge(Counter):
+    """Value that goes up and down."""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return GaugeChild(self._lock)
+
+    def dec(self, amount: float = 1) -> None:
+        self.labels().dec(amount)
+
+
+class HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...], lock: threading.Lock):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self._lock = lock
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(Metric):
+    """Distribution over fixed buckets; counts are kept per bucket and summed on scrape."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return HistogramChild(self.buckets, self._lock)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            with self._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", format_labels(self.labelnames, values, f'le="{format_value(bound)}"'), cumulative
+            labels = format_labels(self.labelnames, values)
+            yield "_sum", labels, total
+            yield "_count", labels, cumulative
+
+
+class CallbackMetric(Metric):
+    """Metric read from existing component state when scraped; costs nothing in between."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        kind: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Iterable[Tuple[LabelValues, float]]],
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.collect = collect
+
+    def samples(self):
+        for values, value in self.collect():
+            yield "", format_labels(self.labelnames, values), value
+
+
+class MetricsRegistry:
+    """Metric families rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        collect: Callable[[], Iterable[Tuple[LabelValues, float]]],
+        kind: str = "gauge",
+        labelnames: Sequence[str] = (),
+    ) -> CallbackMetric:
+        """Register a metric computed from ``collect()`` at scrape time, replacing any earlier one."""
+        self._metrics.pop(name, None)
+        return self.register(CallbackMetric(name, documentation, kind, labelnames, collect))
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status")
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency until the response body was sent.",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests being served.")
+GEMINI_CALL_SECONDS = registry.histogram(
+    "gemini_call_duration_seconds",
+    "Gemini calls including retries, by operation and outcome (ok, error, rejected, queue_timeout, cancelled).",
+    ("operation", "outcome"),
+)
+DB_QUERY_SECONDS = registry.histogram(
+    "db_query_duration_seconds", "Database statement execution time.", ("statement",), DB_BUCKETS
+)
+UPLOAD_SIZE_BYTES = registry.histogram(
+    "upload_size_bytes", "Sizes of staged uploads; _sum is the total bytes received.", (), SIZE_BUCKETS
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request count, latency and in-flight requests.
+
+    The route label is the matched route template (e.g.
+    ``/api/sessions/{session_id}/messages``), read from the scope after routing,
+    so label cardinality stays bounded. ``route_templates`` maps the ``id()`` of
+    routes of included routers to their full template, since the matched route
+    may only know the path relative to its router's prefix.
+    """
+
+    def __init__(self, app: ASGIApp, route_templates: Optional[Dict[int, str]] = None):
+        self.app = app
+        self.route_templates = route_templates or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            if route is None:
+                template = UNMATCHED_ROUTE
+            else:
+                template = self.route_templates.get(id(route)) or getattr(route, "path", UNMATCHED_ROUTE)
+            HTTP_REQUEST_SECONDS.labels(scope["method"], template, status).observe(elapsed)
+            HTTP_REQUESTS.labels(scope["method"], template, status).inc()
+
+
+_statement_types: Dict[str, str] = {}
+
+
+def statement_type(statement: str) -> str:
+    """Classify a statement by its verb; compiled statements recur, so results are cached."""
+    kind = _statement_types.get(statement)
+    if kind is None:
+        verb = statement.lstrip()[:6].upper()
+        kind = verb if verb in STATEMENT_TYPES else "OTHER"
+        if len(_statement_types) >= MAX_CACHED_STATEMENTS:
+            _statement_types.clear()
+        _statement_types[statement] = kind
+    return kind
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_time = getattr(context, "_metrics_start_time", None)
+    if start_time is not None:
+        DB_QUERY_SECONDS.labels(statement_type(statement)).observe(time.perf_counter() - start_time)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time every statement run on a (sync) engine; pass ``async_engine.sync_engine`` for async ones."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,161 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateColumn
+
+from database import Base
+from logger import get_logger
+from models import CHUNK_FTS_TABLE, ChatSession, Document, DocumentChunk, Message
+
+logger = get_logger("migrations")
+
+# Kept out of Base.metadata so create_all never touches it
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    """One schema change; ``upgrade`` runs inside its own transaction."""
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+def column_names(connection: Connection, table: str) -> set:
+    return {column["name"] for column in inspect(connection).get_columns(table)}
+
+
+def add_column(connection: Connection, column: Column) -> None:
+    """Add a model column to its table unless it is already there."""
+    if column.name not in column_names(connection, column.table.name):
+        ddl = CreateColumn(column).compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE {column.table.name} ADD COLUMN {ddl}"))
+
+
+def create_index(connection: Connection, table: Table, name: str) -> None:
+    index = next(index for index in table.indexes if index.name == name)
+    index.create(connection, checkfirst=True)
+
+
+def add_document_hash_and_expiry(connection: Connection) -> None:
+    add_column(connection, Document.__table__.c.content_hash)
+    add_column(connection, Document.__table__.c.gemini_expires_at)
+    create_index(connection, Document.__table__, "ix_documents_content_hash")
+
+
+def add_session_summary(connection: Connection) -> None:
+    add_column(connection, ChatSession.__table__.c.summary)
+    add_column(connection, ChatSession.__table__.c.summarized_message_id)
+
+
+def drop_chunk_embeddings(connection: Connection) -> None:
+    """
+    Embeddings moved to the vector store. The old NOT NULL column would reject
+    new chunks; chunks indexed before the move have no vectors and are only
+    found through BM25 until their document is uploaded again.
+    """
+    if "embedding" in column_names(connection, DocumentChunk.__tablename__):
+        connection.execute(text(f"ALTER TABLE {DocumentChunk.__tablename__} DROP COLUMN embedding"))
+
+
+def create_chunk_fts(connection: Connection) -> None:
+    """Create the full-text index over existing chunks (SQLite only)."""
+    if connection.dialect.name != "sqlite":
+        return
+    connection.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {CHUNK_FTS_TABLE} USING fts5("
+        "text, content='document_chunks', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')"
+    ))
+    connection.execute(text(f"INSERT INTO {CHUNK_FTS_TABLE}({CHUNK_FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def create_list_indexes(connection: Connection) -> None:
+    create_index(connection, Message.__table__, "ix_messages_session_id_created_at")
+    create_index(connection, Document.__table__, "ix_documents_is_active_uploaded_at_id")
+    create_index(connection, Document.__table__, "ix_documents_gemini_name")
+    create_index(connection, ChatSession.__table__, "ix_chat_sessions_updated_at_id")
+
+
+def add_session_counters(connection: Connection) -> None:
+    add_column(connection, ChatSession.__table__.c.message_count)
+    add_column(connection, ChatSession.__table__.c.last_message_at)
+    connection.execute(text(
+        "UPDATE chat_sessions SET "
+        "message_count = (SELECT COUNT(*) FROM messages WHERE messages.session_id = chat_sessions.id), "
+        "last_message_at = (SELECT MAX(created_at) FROM messages WHERE messages.session_id = chat_sessions.id)"
+    ))
+
+
+def backfill_list_sort_columns(connection: Connection) -> None:
+    """
+    Fill NULL sort columns of the cursor-paged lists, which a keyset seek skips
+    and a cursor cannot encode. New rows get them NOT NULL; SQLite cannot add the
+    constraint to an existing column, so older tables rely on the model default.
+    """
+    connection.execute(text(
+        "UPDATE chat_sessions SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL"
+    ))
+    connection.execute(text("UPDATE documents SET uploaded_at = CURRENT_TIMESTAMP WHERE uploaded_at IS NULL"))
+
+
+# Append only; versions are never renumbered
+MIGRATIONS: List[Migration] = [
+    Migration(1, "document content hash and Gemini file expiry", add_document_hash_and_expiry),
+    Migration(2, "rolling session summary", add_session_summary),
+    Migration(3, "chunk embeddings moved to the vector store", drop_chunk_embeddings),
+    Migration(4, "full-text index over chunks", create_chunk_fts),
+    Migration(5, "composite indexes for list endpoints", create_list_indexes),
+    Migration(6, "session message counters", add_session_counters),
+    Migration(7, "non-null list sort columns", backfill_list_sort_columns),
+]
+
+
+def applied_versions(connection: Connection) -> set:
+    return set(connection.scalars(select(schema_migrations.c.version)))
+
+
+def record(connection: Connection, migration: Migration) -> None:
+    connection.execute(schema_migrations.insert().values(
+        version=migration.version, name=migration.name, applied_at=datetime.utcnow()
+    ))
+
+
+def upgrade_database(engine: Engine) -> List[int]:
+    """
+    Bring a database up to the current schema; returns the versions applied.
+
+    Missing tables are created from the models first. A database that had no
+    tables at all is created current, so its migrations are only recorded.
+    Otherwise each pending migration runs and is recorded in its own
+    transaction, so an interrupted upgrade resumes where it stopped.
+    """
+    with engine.begin() as connection:
+        fresh = not inspect(connection).get_table_names()
+        Base.metadata.create_all(bind=connection)
+        migration_metadata.create_all(bind=connection)
+        if fresh:
+            for migration in MIGRATIONS:
+                record(connection, migration)
+            return []
+
+    applied = []
+    for migration in MIGRATIONS:
+        with engine.begin() as connection:
+            if migration.version in applied_versions(connection):
+                continue
+            logger.info("Applying migration %s: %s", migration.version, migration.name)
+            migration.upgrade(connection)
+            record(connection, migration)
+        applied.append(migration.version)
+    return applied
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import DDL, event, Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -10,12 +10,21 @@ class ChatSession(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=True)
+    summary = Column(Text, nullable=True)  # Rolling summary of messages older than the recent window
+    summarized_message_id = Column(Integer, nullable=True)  # Last message folded into the summary
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")  # Maintained by save_message
+    last_message_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)  # Keyset sort column
     
     # Relationships
     messages = relationship("Message", back_populates="session", cascade="all, delete-orphan")
     
+    __table_args__ = (
+        # Session list, newest activity first
+        Index("ix_chat_sessions_updated_at_id", "updated_at", "id"),
+    )
+    
     def __repr__(self):
         return f"<ChatSession(id={self.id}, title={self.title})>"
 
@@ -31,13 +40,55 @@ class Document(Base):
     file_size = Column(Integer, nullable=False)
     gemini_uri = Column(String(500), nullable=False)
     gemini_name = Column(String(500), nullable=False)
-    uploaded_at = Column(DateTime, default=datetime.utcnow)
+    gemini_expires_at = Column(DateTime, nullable=True)
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 of the file content
+    uploaded_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Keyset sort column
     is_active = Column(Boolean, default=True)
     
+    __table_args__ = (
+        # Document list: active documents, newest first
+        Index("ix_documents_is_active_uploaded_at_id", "is_active", "uploaded_at", "id"),
+        # File lookups of every chat turn
+        Index("ix_documents_gemini_name", "gemini_name"),
+    )
+    
     def __repr__(self):
         return f"<Document(id={self.id}, filename={self.filename})>"
 
 
+class DocumentChunk(Base):
+    """Chunk of a document's extracted text with its embedding, used for retrieval."""
+    __tablename__ = "document_chunks"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
+    ordinal = Column(Integer, nullable=False)  # Position of the chunk within the document
+    text = Column(Text, nullable=False)  # Embeddings live in the vector store, keyed by chunk id
+    
+    def __repr__(self):
+        return f"<DocumentChunk(id={self.id}, document_id={self.document_id}, ordinal={self.ordinal})>"
+
+
+# BM25 full-text index over chunk text. It is an external-content FTS5 table, so
+# the text is stored once in document_chunks; lexical_index.py keeps it in sync.
+CHUNK_FTS_TABLE = "document_chunks_fts"
+
+event.listen(
+    DocumentChunk.__table__,
+    "after_create",
+    DDL(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {CHUNK_FTS_TABLE} USING fts5("
+        "text, content='document_chunks', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')"
+    ).execute_if(dialect="sqlite")
+)
+event.listen(
+    DocumentChunk.__table__,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {CHUNK_FTS_TABLE}").execute_if(dialect="sqlite")
+)
+
+
 class Message(Base):
     """Message model to store chat history."""
     __tablename__ = "messages"
@@ -51,5 +102,33 @@ class Message(Base):
     # Relationships
     session = relationship("ChatSession", back_populates="messages")
     
+    __table_args__ = (
+        # Messages of a session in order
+        Index("ix_messages_session_id_created_at", "session_id", "created_at"),
+    )
+    
     def __repr__(self):
         return f"<Message(id={self.id}, role={self.role}, session_id={self.session_id})>"
+
+
+class IngestionJob(Base):
+    """Background ingestion job for a staged upload."""
+    __tablename__ = "ingestion_jobs"
+    
+    id = Column(String(32), primary_key=True)
+    status = Column(String(20), nullable=False, index=True)  # 'queued', 'running', 'succeeded' or 'failed'
+    progress = Column(Integer, default=0)  # Percent complete
+    attempts = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    original_filename = Column(String(255), nullable=False)
+    staged_path = Column(String(500), nullable=False)
+    mime_type = Column(String(100), nullable=False)
+    file_size = Column(Integer, nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=True)
+    deduplicated = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<IngestionJob(id={self.id}, status={self.status})>"
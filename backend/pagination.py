@@ -0,0 +1,126 @@
+import base64
+import binascii
+import json
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+from sqlalchemy import event, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from exceptions import InvalidCursorError
+
+Cursor = Tuple[datetime, int]
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    """Opaque cursor for the row after which the next page starts; sort columns are NOT NULL."""
+    payload = json.dumps([sort_value.isoformat(), row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(payload)
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        raise InvalidCursorError(cursor) from None
+
+
+def projected_columns(schema: Type[BaseModel], model) -> list:
+    """The model columns a response schema needs, in schema field order."""
+    return [getattr(model, name) for name in schema.model_fields if hasattr(model, name)]
+
+
+async def fetch_page(
+    db: AsyncSession,
+    query: Select,
+    sort_column,
+    id_column,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List, Optional[str]]:
+    """
+    Return one page of rows in descending ``(sort_column, id_column)`` order
+    and the cursor of the next page, or None on the last page.
+
+    The page starts right after the cursor's row with a row-value comparison,
+    so the database seeks in an index on the two columns instead of skipping
+    ``OFFSET`` rows; deep pages cost the same as the first. One extra row is
+    read to tell whether another page follows. The sort column must be
+    selected by ``query``.
+    """
+    if cursor is not None:
+        query = query.where(tuple_(sort_column, id_column) < tuple_(*decode_cursor(cursor)))
+    rows = (await db.execute(query.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1))).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]._mapping
+    return rows, encode_cursor(last[sort_column.key], last[id_column.key])
+
+
+class TotalCache:
+    """
+    Row counts of list queries, reused for ``ttl`` seconds.
+
+    Entries for a tracked model are dropped when a session of this process
+    commits or rolls back a flushed change to it. A session with such changes
+    pending counts afresh and caches nothing, so uncommitted rows never reach
+    other requests. Writes from other processes show up once the entry
+    expires, so totals are approximate across workers.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[tuple, Tuple[int, float]] = {}
+        self._models: Dict[type, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def track(self, model) -> None:
+        if not self._models:
+            event.listen(Session, "after_flush", self._after_flush)
+            event.listen(Session, "after_commit", self._after_end)
+            event.listen(Session, "after_soft_rollback", self._after_end)
+        self._models[model] = model.__tablename__
+
+    def _after_flush(self, session: Session, flush_context) -> None:
+        changed = {
+            self._models[type(instance)]
+            for instance in (*session.new, *session.dirty, *session.deleted)
+            if type(instance) in self._models
+        }
+        if changed:
+            session.info.setdefault(self, set()).update(changed)
+
+    def _after_end(self, session: Session, *args) -> None:
+        for table in session.info.pop(self, ()):
+            self.invalidate(table)
+
+    def invalidate(self, table: str) -> None:
+        for key in [key for key in self._entries if key[0] == table]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def count(self, db: AsyncSession, key: tuple, query: Select) -> int:
+        """Count the rows of ``query``; ``key`` starts with the table name."""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > now:
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+        if self.ttl > 0 and key[0] not in db.sync_session.info.get(self, ()):
+            self._entries[key] = (total, now + self.ttl)
+        return total
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
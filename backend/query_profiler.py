@@ -0,0 +1,211 @@
+import contextvars
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import settings
+from logger import get_logger
+
+logger = get_logger("query_profiler")
+
+MAX_LOGGED_CHARS = 2000  # Statements and parameters are truncated in the slow-query log
+
+
+class QueryProfile:
+    """Statements run on behalf of one request."""
+    __slots__ = ("count", "total_time", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.statements: Dict[str, int] = {}
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.total_time += elapsed
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+    @property
+    def max_repeats(self) -> int:
+        """Executions of the most repeated statement; a high value hints at an N+1 pattern."""
+        return max(self.statements.values(), default=0)
+
+    def summary(self) -> dict:
+        return {
+            "statements": self.count,
+            "db_time_ms": round(self.total_time * 1000, 2),
+            "max_repeats": self.max_repeats,
+        }
+
+
+_current_profile: contextvars.ContextVar[Optional[QueryProfile]] = contextvars.ContextVar(
+    "query_profile", default=None
+)
+
+
+def truncate(text: str) -> str:
+    return text if len(text) <= MAX_LOGGED_CHARS else text[:MAX_LOGGED_CHARS] + "..."
+
+
+def redact(parameters, executemany: bool) -> str:
+    """Stand-in for bound values, which may hold message text or other user data."""
+    if executemany:
+        return f"<{len(parameters)} parameter sets redacted>"
+    return f"<{len(parameters or ())} parameters redacted>"
+
+
+class QueryProfiler:
+    """
+    Times statements through engine events.
+
+    Statements are attributed to the request whose ``QueryProfile`` is current;
+    the context variable follows requests into SQLAlchemy's async greenlets and
+    Starlette's threadpool. Statements slower than ``slow_threshold`` seconds are
+    logged with their parameters and, on SQLite, their ``EXPLAIN QUERY PLAN``,
+    and the latest ``slow_log_size`` of them are kept for the debug endpoint.
+    Nothing is registered when the profiler is disabled.
+    """
+
+    def __init__(
+        self,
+        slow_threshold: float,
+        explain: bool = True,
+        slow_log_size: int = 100,
+        warn_statements: int = 50,
+        log_parameters: bool = False,
+    ):
+        self.slow_threshold = slow_threshold
+        self.explain = explain
+        self.log_parameters = log_parameters
+        self.warn_statements = warn_statements
+        self.slow_queries = deque(maxlen=slow_log_size)
+
+        self.statements = 0
+        self.total_time = 0.0
+        self.requests = 0
+        self.heavy_requests = 0
+
+    def instrument(self, engine: Engine) -> None:
+        """Profile every statement run on a (sync) engine; pass ``async_engine.sync_engine`` for async ones."""
+        if not event.contains(engine, "before_cursor_execute", self._before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._profiler_start_time = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start_time = getattr(context, "_profiler_start_time", None)
+        if start_time is None:
+            return
+        elapsed = time.perf_counter() - start_time
+        self.statements += 1
+        self.total_time += elapsed
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.record(statement, elapsed)
+        if elapsed >= self.slow_threshold:
+            self._log_slow_query(conn, statement, parameters, executemany, elapsed)
+
+    def query_plan(self, conn, statement: str, parameters) -> Optional[List[str]]:
+        """
+        Return the SQLite query plan of a statement, one line per step.
+
+        Runs on the raw DB-API connection so the lookup is not itself profiled.
+        """
+        if not self.explain or conn.dialect.name != "sqlite":
+            return None
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            return [row[-1] for row in cursor.fetchall()]
+        except Exception as e:
+            logger.debug("Could not explain slow query: %s", e)
+            return None
+        finally:
+            cursor.close()
+
+    def _log_slow_query(self, conn, statement: str, parameters, executemany: bool, elapsed: float) -> None:
+        plan = None if executemany else self.query_plan(conn, statement, parameters)
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(elapsed * 1000, 2),
+            "statement": truncate(statement),
+            "parameters": truncate(repr(parameters)) if self.log_parameters else redact(parameters, executemany),
+            "plan": plan,
+        }
+        self.slow_queries.append(entry)
+        plan_text = f" - plan: {'; '.join(plan)}" if plan else ""
+        logger.warning(
+            "Slow query (%sms): %s - parameters: %s%s",
+            entry["duration_ms"], entry["statement"], entry["parameters"], plan_text
+        )
+
+    def finish(self, profile: QueryProfile, method: str, path: str) -> None:
+        self.requests += 1
+        if profile.count >= self.warn_statements:
+            self.heavy_requests += 1
+            logger.warning(
+                "%s %s ran %s statements in %.1fms (most repeated: %s times)",
+                method, path, profile.count, profile.total_time * 1000, profile.max_repeats
+            )
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "statements": self.statements,
+            "db_time_ms": round(self.total_time * 1000, 1),
+            "heavy_requests": self.heavy_requests,
+            "slow_queries": len(self.slow_queries),
+        }
+
+
+class QueryProfilerMiddleware:
+    """
+    ASGI middleware collecting a ``QueryProfile`` per request.
+
+    The summary of statements run before the response started is sent in the
+    ``X-DB-Statements``, ``X-DB-Time-Ms`` and ``X-DB-Max-Repeats`` headers;
+    statements run while a body streams only count towards the log and stats.
+    """
+
+    def __init__(self, app: ASGIApp, profiler: QueryProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile()
+
+        async def send_with_profile(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-statements", str(profile.count).encode()))
+                headers.append((b"x-db-time-ms", f"{profile.total_time * 1000:.2f}".encode()))
+                headers.append((b"x-db-max-repeats", str(profile.max_repeats).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            _current_profile.reset(token)
+            self.profiler.finish(profile, scope["method"], scope["path"])
+
+
+query_profiler = QueryProfiler(
+    slow_threshold=settings.slow_query_threshold_ms / 1000,
+    explain=settings.slow_query_explain,
+    slow_log_size=settings.slow_query_log_size,
+    warn_statements=settings.query_profiler_warn_statements,
+    log_parameters=settings.slow_query_log_parameters,
+)
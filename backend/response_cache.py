@@ -0,0 +1,220 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from embeddings import Embedder, embedder
+from file_cache import normalize_file_name
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+TRAILING_PUNCTUATION = " ?!.,;:"
+
+CacheKey = Tuple[str, Tuple[str, ...]]
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return WHITESPACE_PATTERN.sub(" ", query.lower()).strip().rstrip(TRAILING_PUNCTUATION)
+
+
+def cache_key(query: str, file_uris: List[str]) -> CacheKey:
+    """Key a chat turn by its normalized query and sorted set of file names."""
+    return normalize_query(query), tuple(sorted({normalize_file_name(uri) for uri in file_uris}))
+
+
+@dataclass
+class CachedResponse:
+    """A generated answer and what it cost to produce."""
+    response: str
+    latency: float  # Seconds the original generation took
+    expires_at: float
+    query_vector: Optional[np.ndarray] = None
+
+
+@dataclass
+class CacheLookup:
+    """Result of a cache lookup; passed back to ``put`` on a miss."""
+    key: CacheKey
+    response: Optional[str] = None
+    layer: Optional[str] = None  # 'exact' or 'semantic' on a hit
+    query_vector: Optional[np.ndarray] = field(default=None, repr=False)
+
+    @property
+    def hit(self) -> bool:
+        return self.response is not None
+
+
+class ResponseCache:
+    """
+    LRU cache of chat answers keyed by normalized query and file set.
+
+    The exact layer matches the normalized query text. When a semantic threshold is
+    set, a miss falls back to comparing the query embedding against cached queries
+    over the same file set and reuses the answer of the closest one if its cosine
+    similarity reaches the threshold. Entries expire after ``ttl`` seconds and are
+    dropped as soon as any file they were generated from is deleted.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        semantic_threshold: Optional[float] = None,
+        embedder: Optional[Embedder] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+        self.embedder = embedder
+        self._entries: "OrderedDict[CacheKey, CachedResponse]" = OrderedDict()
+        self._by_file_set: Dict[Tuple[str, ...], Set[CacheKey]] = {}
+        self._by_file: Dict[str, Set[CacheKey]] = {}
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.saved_latency = 0.0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.semantic_threshold is not None and self.embedder is not None
+
+    def _remove(self, key: CacheKey) -> None:
+        """Drop an entry and its reverse-index links. Caller holds the lock."""
+        self._entries.pop(key, None)
+        file_set = key[1]
+        keys = self._by_file_set.get(file_set)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_file_set[file_set]
+        for name in file_set:
+            keys = self._by_file.get(name)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_file[name]
+
+    def _live_entry(self, key: CacheKey, now: float) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            self._remove(key)
+            return None
+        return entry
+
+    def _record_hit(self, key: CacheKey, entry: CachedResponse, layer: str) -> CacheLookup:
+        self._entries.move_to_end(key)
+        if layer == "exact":
+            self.exact_hits += 1
+        else:
+            self.semantic_hits += 1
+        self.saved_latency += entry.latency
+        return CacheLookup(key=key, response=entry.response, layer=layer, query_vector=entry.query_vector)
+
+    def _semantic_match(self, key: CacheKey, query_vector: np.ndarray, now: float) -> Optional[CacheKey]:
+        """Return the cached key over the same files whose query is most similar."""
+        candidates = [
+            candidate for candidate in list(self._by_file_set.get(key[1], ()))
+            if self._live_entry(candidate, now) is not None
+            and self._entries[candidate].query_vector is not None
+        ]
+        if not candidates:
+            return None
+        matrix = np.stack([self._entries[candidate].query_vector for candidate in candidates])
+        scores = matrix @ query_vector
+        best = int(np.argmax(scores))
+        return candidates[best] if scores[best] >= self.semantic_threshold else None
+
+    async def get(self, query: str, file_uris: List[str]) -> CacheLookup:
+        """Look up an answer for a chat turn."""
+        key = cache_key(query, file_uris)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live_entry(key, now)
+            if entry is not None:
+                return self._record_hit(key, entry, "exact")
+
+        if not self.semantic_enabled:
+            with self._lock:
+                self.misses += 1
+            return CacheLookup(key=key)
+
+        query_vector = await run_in_threadpool(self.embedder.embed_query, key[0])
+        with self._lock:
+            match = self._semantic_match(key, query_vector, now)
+            if match is not None:
+                lookup = self._record_hit(match, self._entries[match], "semantic")
+                lookup.query_vector = query_vector
+                return lookup
+            self.misses += 1
+        return CacheLookup(key=key, query_vector=query_vector)
+
+    def put(self, lookup: CacheLookup, response: str, latency: float) -> None:
+        """Cache the answer generated after a miss."""
+        if not response:
+            return
+        key = lookup.key
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = CachedResponse(
+                response=response,
+                latency=latency,
+                expires_at=time.monotonic() + self.ttl,
+                query_vector=lookup.query_vector,
+            )
+            self._by_file_set.setdefault(key[1], set()).add(key)
+            for name in key[1]:
+                self._by_file.setdefault(name, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_file(self, uri: str) -> int:
+        """Drop every answer generated from the given file; returns the count."""
+        name = normalize_file_name(uri)
+        with self._lock:
+            keys = list(self._by_file.get(name, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        """Drop all cached answers."""
+        with self._lock:
+            self._entries.clear()
+            self._by_file_set.clear()
+            self._by_file.clear()
+
+    def stats(self) -> dict:
+        """Return a snapshot of cache counters."""
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "saved_latency_ms": round(self.saved_latency * 1000, 1),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+response_cache = ResponseCache(
+    max_entries=settings.response_cache_size,
+    ttl=settings.response_cache_ttl,
+    semantic_threshold=settings.response_cache_semantic_threshold,
+    embedder=embedder,
+)
@@ -0,0 +1,276 @@
+import re
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from conversation import ConversationHistory, build_history_prompt, pack_context
+from database import release_connection
+from embeddings import embedder
+from file_cache import normalize_file_name
+from gemini_client import gemini_client
+import lexical_index
+from logger import get_logger
+from models import Document, DocumentChunk
+from text_extraction import extract_text
+from upload_pipeline import StagedUpload
+from vector_store import vector_store
+
+logger = get_logger("retrieval")
+
+WHITESPACE_PATTERN = re.compile(r"[ \t]+")
+
+RAG_PROMPT_TEMPLATE = """Answer the question using the document excerpts below. \
+If the excerpts do not contain the answer, say so.
+
+{passages}
+
+Question: {query}"""
+
+
+@dataclass
+class Passage:
+    """A chunk of document text selected for a query."""
+    chunk_id: int
+    document_id: int
+    filename: str
+    text: str
+    score: float
+
+
+def chunk_text(text: str, chunk_size: int, overlap: int) -> List[str]:
+    """
+    Split text into overlapping windows of about ``chunk_size`` characters.
+
+    Window boundaries are moved back to the nearest whitespace so words are not cut.
+    """
+    text = WHITESPACE_PATTERN.sub(" ", text).strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            boundary = text.rfind(" ", start + chunk_size // 2, end)
+            if boundary != -1:
+                end = boundary
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        next_start = max(end - overlap, start + 1)
+        boundary = text.find(" ", next_start, end)
+        start = boundary + 1 if boundary != -1 else next_start
+    return chunks
+
+
+def build_chunks(document_id: int, staged: StagedUpload) -> Tuple[List[DocumentChunk], np.ndarray]:
+    """Extract, chunk and embed a staged file. Runs on a worker thread."""
+    text = extract_text(staged.path, staged.mime_type)
+    chunks = chunk_text(text, settings.chunk_size, settings.chunk_overlap)
+    if not chunks:
+        return [], np.zeros((0, embedder.dim), dtype=np.float32)
+    vectors = embedder.embed(chunks)
+    return [
+        DocumentChunk(document_id=document_id, ordinal=ordinal, text=chunk)
+        for ordinal, chunk in enumerate(chunks)
+    ], vectors
+
+
+async def save_chunks(db: AsyncSession, indexed: List[Tuple[int, List[DocumentChunk], np.ndarray]]) -> None:
+    """
+    Persist chunk rows and their full-text entries in one commit, then append their
+    vectors to the vector store.
+
+    ``indexed`` holds ``(document_id, chunks, vectors)`` per document.
+    """
+    db.add_all(chunk for _, chunks, _ in indexed for chunk in chunks)
+    await db.flush()
+    await lexical_index.index_documents(db, [document_id for document_id, chunks, _ in indexed if chunks])
+    await db.commit()
+    for document_id, chunks, vectors in indexed:
+        if chunks:
+            await run_in_threadpool(
+                vector_store.add, document_id, [chunk.id for chunk in chunks], vectors
+            )
+
+
+async def index_document(db: AsyncSession, document: Document, staged: StagedUpload) -> int:
+    """
+    Chunk and embed a newly uploaded document for retrieval.
+
+    Failures are logged rather than raised: an unindexed document is still usable
+    as whole-file context.
+    """
+    try:
+        chunks, vectors = await run_in_threadpool(build_chunks, document.id, staged)
+        if chunks:
+            await save_chunks(db, [(document.id, chunks, vectors)])
+        logger.info("Indexed %s chunks for document %s", len(chunks), document.id)
+        return len(chunks)
+    except Exception as e:
+        await db.rollback()
+        await db.refresh(document)
+        logger.warning("Could not index document %s: %s", document.id, e)
+        return 0
+
+
+async def find_documents(db: AsyncSession, file_uris: List[str]) -> dict:
+    """Map each requested file URI or name to its active Document, where one exists."""
+    names = {uri: normalize_file_name(uri) for uri in file_uris}
+    result = await db.scalars(
+        select(Document).where(
+            Document.is_active == True,
+            or_(Document.gemini_name.in_(set(names.values())), Document.gemini_uri.in_(file_uris))
+        )
+    )
+    by_name = {}
+    by_uri = {}
+    for document in result:
+        by_name[document.gemini_name] = document
+        by_uri[document.gemini_uri] = document
+    return {
+        uri: by_uri.get(uri) or by_name.get(name)
+        for uri, name in names.items()
+        if uri in by_uri or name in by_name
+    }
+
+
+async def indexed_document_ids(db: AsyncSession, document_ids: List[int]) -> set:
+    """Return the subset of document ids that have retrieval chunks."""
+    result = await db.scalars(
+        select(DocumentChunk.document_id)
+        .where(DocumentChunk.document_id.in_(document_ids))
+        .distinct()
+    )
+    return set(result.all())
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int) -> List[Tuple[int, float]]:
+    """
+    Fuse ranked id lists into one ranking of ``(id, score)``, best first.
+
+    Each list contributes ``1 / (k + rank)`` per id, so only ranks matter and BM25
+    and cosine scores never need to be put on a common scale.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+async def retrieve(db: AsyncSession, query: str, document_ids: List[int], k: int) -> List[Passage]:
+    """
+    Return the ``k`` chunks of the given documents most relevant to the query.
+
+    Vector similarity and BM25 each rank their best candidates, and the two
+    rankings are combined with reciprocal rank fusion, so exact identifiers that
+    embeddings blur still surface.
+    """
+    candidates = max(k, settings.retrieval_candidates)
+    query_vector = await run_in_threadpool(embedder.embed_query, query)
+    chunk_ids, _ = await run_in_threadpool(vector_store.search, query_vector, document_ids, candidates)
+    rankings = [chunk_ids.tolist()]
+    if settings.lexical_search_enabled:
+        rankings.append(await lexical_index.search(db, query, document_ids, candidates))
+
+    best = dict(reciprocal_rank_fusion(rankings, settings.retrieval_rrf_k)[:k])
+    if not best:
+        return []
+
+    result = await db.execute(
+        select(DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.text, Document.original_filename)
+        .join(Document, Document.id == DocumentChunk.document_id)
+        .where(DocumentChunk.id.in_(best))
+    )
+    passages = [
+        Passage(
+            chunk_id=row.id,
+            document_id=row.document_id,
+            filename=row.original_filename,
+            text=row.text,
+            score=best[row.id]
+        )
+        for row in result
+    ]
+    passages.sort(key=lambda passage: passage.score, reverse=True)
+    return passages
+
+
+def build_rag_prompt(query: str, passages: List[Passage]) -> str:
+    """Build the model prompt from the query and the selected passages."""
+    formatted = "\n\n".join(
+        f"[{index}] ({passage.filename})\n{passage.text}"
+        for index, passage in enumerate(passages, start=1)
+    )
+    return RAG_PROMPT_TEMPLATE.format(passages=formatted, query=query)
+
+
+async def build_chat_prompt(
+    db: AsyncSession,
+    query: str,
+    file_uris: List[str],
+    history: Optional[ConversationHistory] = None,
+) -> Tuple[list, List[str]]:
+    """
+    Assemble the generation contents for a chat turn from the database alone.
+
+    Documents that were indexed at upload contribute only their top-k passages;
+    any other requested file (unindexed or unknown to the database) is attached
+    whole, as before retrieval existed. Passages, the session summary and recent
+    turns are packed into ``settings.context_token_budget``. Returns the contents
+    and the files still to be attached whole, whose handles may need network
+    round trips to resolve.
+    """
+    start_time = time.perf_counter()
+    documents = await find_documents(db, file_uris) if file_uris else {}
+    indexed_ids = set()
+    if settings.retrieval_enabled and documents:
+        indexed_ids = await indexed_document_ids(db, [document.id for document in documents.values()])
+
+    whole_files = [
+        uri for uri in file_uris
+        if uri not in documents or documents[uri].id not in indexed_ids
+    ]
+    passages = []
+    if indexed_ids:
+        passages = await retrieve(db, query, list(indexed_ids), settings.retrieval_top_k)
+
+    packed = pack_context(
+        query, passages, history, settings.context_token_budget, settings.context_passage_share
+    )
+    prompt = build_rag_prompt(query, packed.passages) if indexed_ids else query
+    logger.info(
+        "Packed context: ~%s tokens, %s/%s passages from %s documents, %s/%s turns, "
+        "summary %s, %s whole files in %.1fms",
+        packed.tokens, len(packed.passages), len(passages), len(indexed_ids),
+        len(packed.turns), len(history.turns) if history else 0,
+        "included" if packed.summary else "absent", len(whole_files),
+        (time.perf_counter() - start_time) * 1000
+    )
+    return [build_history_prompt(packed, prompt)], whole_files
+
+
+async def build_chat_contents(
+    db: AsyncSession,
+    query: str,
+    file_uris: List[str],
+    history: Optional[ConversationHistory] = None,
+) -> list:
+    """
+    Assemble the generation contents for a chat turn, with whole files attached.
+
+    Ends the session's transaction once the database reads are done, so no
+    connection is held while file handles are fetched or the model runs.
+    """
+    contents, whole_files = await build_chat_prompt(db, query, file_uris, history)
+    await release_connection(db)
+    if whole_files:
+        contents.extend(await gemini_client.aget_files(whole_files))
+    return contents
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
 
@@ -13,6 +13,8 @@ class ChatSessionResponse(BaseModel):
     """Schema for chat session response."""
     id: int
     title: Optional[str]
+    message_count: int = 0
+    last_message_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
     
@@ -31,6 +33,22 @@ class DocumentUploadResponse(BaseModel):
     gemini_uri: str
     gemini_name: str
     uploaded_at: datetime
+    deduplicated: bool = Field(False, description="True if an identical active document was reused")
+
+
+class BatchUploadItem(BaseModel):
+    """Schema for the result of one file in a batch upload."""
+    filename: str
+    status: str = Field(..., description="'uploaded', 'deduplicated' or 'failed'")
+    document: Optional[DocumentUploadResponse] = None
+    error: Optional[str] = None
+
+
+class BatchUploadResponse(BaseModel):
+    """Schema for batch upload response."""
+    results: List[BatchUploadItem]
+    succeeded: int
+    failed: int
 
 
 class DocumentResponse(BaseModel):
@@ -51,7 +69,27 @@ class DocumentResponse(BaseModel):
 class DocumentListResponse(BaseModel):
     """Schema for document list response."""
     documents: List[DocumentResponse]
-    total: int
+    total: Optional[int] = Field(None, description="Matching documents; omitted when include_total is false")
+    next_cursor: Optional[str] = Field(None, description="Pass as cursor to get the next page; null on the last page")
+
+
+# Ingestion Job Schemas
+class IngestionJobResponse(BaseModel):
+    """Schema for background ingestion job status."""
+    id: str
+    status: str
+    progress: int
+    attempts: int
+    error: Optional[str]
+    original_filename: str
+    file_size: int
+    document_id: Optional[int]
+    deduplicated: bool
+    created_at: datetime
+    updated_at: datetime
+    
+    class Config:
+        from_attributes = True
 
 
 # Message Schemas
@@ -71,6 +109,10 @@ class ChatRequest(BaseModel):
     query: str = Field(..., min_length=1, max_length=5000, description="User query")
     session_id: Optional[int] = Field(None, description="Chat session ID. If not provided, a new session will be created")
     file_uris: List[str] = Field(default_factory=list, description="List of Gemini file URIs to use as context")
+    mode: Literal["standard", "map_reduce"] = Field(
+        "standard",
+        description="'map_reduce' asks each group of files separately and merges the partial answers"
+    )
 
 
 class ChatResponse(BaseModel):
@@ -78,6 +120,7 @@ class ChatResponse(BaseModel):
     session_id: int
     message: MessageResponse
     response: str
+    cached: bool = False  # Answer served from the response cache
 
 
 class SessionMessagesResponse(BaseModel):
@@ -1,27 +1,103 @@
+import os
 import pytest
 import sys
 from pathlib import Path
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.pool import NullPool
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+# Run offline against the in-process fake model without simulated latency;
+# tests stub the calls whose results they assert on
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY_MS", "0")
+os.environ.setdefault("FAKE_LLM_FILE_LATENCY_MS", "0")
+os.environ.setdefault("FAKE_LLM_UPLOAD_LATENCY_MS", "0")
+os.environ.setdefault("FAKE_LLM_CHUNK_INTERVAL_MS", "0")
+# Tests that trace requests sample explicitly
+os.environ.setdefault("TRACING_SAMPLE_RATE", "0")
+
 from main import app
-from database import Base, get_db
+from admission import admission_controller
+from api.routes import list_totals
+from database import Base, create_engines, get_db
+from conversation import session_summarizer
+from gemini_client import gemini_client
+from ingestion import ingestion_queue
 from models import ChatSession, Document, Message
+from response_cache import response_cache
+from transport import CircuitBreaker
+from vector_store import vector_store
+
+# The test database is exercised through both driver spellings of its URL
+TEST_DATABASE_URLS = ["sqlite:///./test.db", "sqlite+aiosqlite:///./test.db"]
+
+
+@pytest.fixture(scope="function", params=TEST_DATABASE_URLS)
+def engines(request):
+    """Create the sync and async engines for the test database."""
+    # NullPool keeps async connections from outliving each test client's event loop
+    engine, async_engine = create_engines(request.param, poolclass=NullPool)
+    yield engine, async_engine
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def isolated_vector_store(tmp_path):
+    """Point the vector store at a fresh directory for each test."""
+    default_directory, default_dim = vector_store.directory, vector_store.dim
+    vector_store.open(str(tmp_path / "vector_store"), default_dim)
+    yield vector_store
+    vector_store.open(default_directory, default_dim)
+
+
+@pytest.fixture(autouse=True)
+def empty_response_cache():
+    """Start each test without cached chat answers."""
+    response_cache.clear()
+    yield response_cache
+    response_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def empty_list_totals():
+    """Count list totals afresh in each test's database."""
+    list_totals.clear()
+    yield list_totals
+    list_totals.clear()
+
 
-# Create test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+@pytest.fixture(autouse=True)
+def fresh_rate_limits():
+    """Give each test full rate limit buckets."""
+    if admission_controller.limiter is not None:
+        admission_controller.limiter.reset()
+    yield admission_controller
+
+
+@pytest.fixture(autouse=True)
+def single_attempt_transport(monkeypatch):
+    """
+    Make Gemini calls single-attempt with a fresh breaker, so stubbed failures
+    surface directly; transport retries are covered in test_transport.py.
+    """
+    monkeypatch.setattr(gemini_client.transport, "max_attempts", 1)
+    monkeypatch.setattr(
+        gemini_client.transport, "breaker", CircuitBreaker(failure_threshold=1000, reset_timeout=30)
+    )
+    return gemini_client.transport
 
 
 @pytest.fixture(scope="function")
-def db():
+def db(engines):
     """Create a fresh database for each test."""
+    engine, _ = engines
     Base.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     db = TestingSessionLocal()
     try:
         yield db
@@ -30,18 +106,46 @@ def db():
         Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture
+def checked_out_connections(engines):
+    """Count the test async engine's connections currently checked out of its pool."""
+    _, async_engine = engines
+    pool_engine = async_engine.sync_engine
+    counter = {"checked_out": 0}
+    
+    def on_checkout(*args):
+        counter["checked_out"] += 1
+    
+    def on_checkin(*args):
+        counter["checked_out"] -= 1
+    
+    event.listen(pool_engine, "checkout", on_checkout)
+    event.listen(pool_engine, "checkin", on_checkin)
+    yield counter
+    event.remove(pool_engine, "checkout", on_checkout)
+    event.remove(pool_engine, "checkin", on_checkin)
+
+
 @pytest.fixture(scope="function")
-def client(db):
+def client(db, engines):
     """Create a test client with database dependency override."""
-    def override_get_db():
-        try:
-            yield db
-        finally:
-            pass
+    _, async_engine = engines
+    TestingAsyncSessionLocal = async_sessionmaker(
+        async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as async_db:
+            yield async_db
     
     app.dependency_overrides[get_db] = override_get_db
+    default_session_factory = ingestion_queue.session_factory
+    ingestion_queue.session_factory = TestingAsyncSessionLocal
+    session_summarizer.session_factory = TestingAsyncSessionLocal
     with TestClient(app) as test_client:
         yield test_client
+    ingestion_queue.session_factory = default_session_factory
+    session_summarizer.session_factory = default_session_factory
     app.dependency_overrides.clear()
 
 
@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+from admission import ConcurrencyGate, RateLimiter, TokenBucket, admission_controller, route_group
+from config import settings
+from exceptions import ServiceOverloadedError
+from gemini_client import gemini_client
+
+
+def test_token_bucket_allows_burst_then_refills():
+    """Test that a bucket admits its capacity at once and refills at its rate."""
+    bucket = TokenBucket(rate=2.0, capacity=3, now=0.0)
+    assert [bucket.take(0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take(0.0) == pytest.approx(0.5)
+    assert bucket.take(0.5) == 0.0
+
+
+def test_rate_limiter_isolates_clients_and_route_groups():
+    """Test that buckets are kept per client and per route group."""
+    limiter = RateLimiter({"chat": 6, "default": 600}, burst=1)
+    assert limiter.check("alice", "chat") == 0
+    assert limiter.check("alice", "chat") > 0
+    assert limiter.check("bob", "chat") == 0
+    assert limiter.check("alice", "default") == 0
+    assert limiter.stats() == {"clients": 3, "allowed": 3, "limited": 1}
+
+
+def test_rate_limiter_drops_idle_clients():
+    """Test that the least recently used buckets are evicted."""
+    limiter = RateLimiter({"default": 60}, burst=1, max_clients=2)
+    for client in ("a", "b", "c"):
+        limiter.check(client, "default")
+    assert limiter.stats()["clients"] == 2
+    assert limiter.check("a", "default") == 0
+
+
+def test_route_group():
+    """Test mapping of paths to rate limit groups."""
+    assert route_group("/api/chat/stream") == "chat"
+    assert route_group("/api/upload/batch") == "upload"
+    assert route_group("/api/documents") == "default"
+    assert route_group("/health") is None
+
+
+def test_gate_sheds_when_queue_is_full():
+    """Test that requests beyond the slots and queue are rejected at once."""
+    gate = ConcurrencyGate(max_concurrency=1, max_queue=1, queue_timeout=5)
+    
+    async def scenario():
+        held = await gate.acquire()
+        waiter = asyncio.ensure_future(gate.acquire())
+        await asyncio.sleep(0)
+        assert gate.stats()["queue_depth"] == 1
+        with pytest.raises(ServiceOverloadedError) as excinfo:
+            await gate.acquire()
+        assert excinfo.value.status_code == 503
+        assert int(excinfo.value.headers["Retry-After"]) >= 1
+        gate.release(held, 0.1)
+        gate.release(await waiter, 0.1)
+    
+    asyncio.run(scenario())
+    stats = gate.stats()
+    assert stats["admitted"] == 2
+    assert stats["shed"] == 1
+    assert stats["in_flight"] == 0
+    assert stats["queue_depth"] == 0
+
+
+def test_gate_sheds_after_queue_timeout():
+    """Test that a queued request gives up after the queue timeout."""
+    gate = ConcurrencyGate(max_concurrency=1, max_queue=4, queue_timeout=0.05)
+    
+    async def scenario():
+        held = await gate.acquire()
+        with pytest.raises(ServiceOverloadedError):
+            await gate.acquire()
+        gate.release(held, 0.1)
+    
+    asyncio.run(scenario())
+    assert gate.stats()["shed"] == 1
+    assert gate.stats()["queue_depth"] == 0
+
+
+def test_gate_try_acquire_and_slot():
+    """Test that a free slot is taken without waiting and none is taken while requests queue."""
+    gate = ConcurrencyGate(max_concurrency=2, max_queue=4, queue_timeout=5)
+    
+    async def scenario():
+        extra = await gate.try_acquire()
+        assert extra is not None
+        async with gate.slot():
+            assert gate.stats()["in_flight"] == 2
+            assert await gate.try_acquire() is None
+        gate.release(extra, 0.1)
+        
+        held = [await gate.acquire(), await gate.acquire()]
+        waiter = asyncio.ensure_future(gate.acquire())
+        await asyncio.sleep(0.01)
+        gate.release(held.pop(), 0.1)
+        assert await gate.try_acquire() is None  # The freed slot goes to the queued request
+        gate.release(await waiter, 0.1)
+        gate.release(held.pop(), 0.1)
+    
+    asyncio.run(scenario())
+    assert gate.stats()["in_flight"] == 0
+    assert gate.stats()["admitted"] == 5
+
+
+def test_chat_is_rate_limited_per_client(client, monkeypatch):
+    """Test that a client over its chat rate gets 429 while other routes still work."""
+    monkeypatch.setattr(
+        admission_controller, "limiter", RateLimiter({"chat": 1, "upload": 1, "default": 600}, burst=2)
+    )
+    monkeypatch.setattr(gemini_client, "generate", lambda contents: "Answer")
+    
+    for _ in range(2):
+        assert client.post("/api/chat", json={"query": "Hi"}).status_code == 200
+    response = client.post("/api/chat", json={"query": "Hi"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    
+    assert client.get("/api/documents").status_code == 200
+    stats = client.get("/api/stats").json()["admission"]
+    assert stats["rate_limiter"]["limited"] == 1
+    assert stats["llm_gate"]["in_flight"] == 0
+    assert stats["llm_gate"]["admitted"] >= 2
+
+
+def test_rate_limited_cross_origin_request_gets_cors_headers(client, monkeypatch):
+    """Test that a browser can read a 429 from another origin, including Retry-After."""
+    monkeypatch.setattr(
+        admission_controller, "limiter", RateLimiter({"chat": 1, "upload": 1, "default": 600}, burst=1)
+    )
+    monkeypatch.setattr(gemini_client, "generate", lambda contents: "Answer")
+    origin = settings.cors_origins_list[0]
+    
+    assert client.post("/api/chat", json={"query": "Hi"}, headers={"Origin": origin}).status_code == 200
+    response = client.post("/api/chat", json={"query": "Hi"}, headers={"Origin": origin})
+    assert response.status_code == 429
+    assert response.headers["Access-Control-Allow-Origin"] == origin
+    assert "retry-after" in response.headers["Access-Control-Expose-Headers"].lower()
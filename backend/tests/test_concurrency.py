@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+
+from concurrency import BoundedExecutor
+
+
+def test_run_respects_concurrency_limit():
+    """Test that no more than max_concurrency calls run at once."""
+    executor = BoundedExecutor(max_workers=8, max_concurrency=2, name="test")
+    lock = threading.Lock()
+    active = []
+    peak = []
+    
+    def work():
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.02)
+        with lock:
+            active.pop()
+        return "ok"
+    
+    async def main():
+        return await asyncio.gather(*(executor.run(work) for _ in range(6)))
+    
+    results = asyncio.run(main())
+    executor.shutdown()
+    
+    assert results == ["ok"] * 6
+    assert max(peak) == 2
+    stats = executor.stats()
+    assert stats["completed"] == 6
+    assert stats["peak_in_flight"] == 2
+    assert stats["peak_queue_depth"] >= 4
+    assert stats["in_flight"] == 0 and stats["queue_depth"] == 0
+
+
+def test_run_keeps_event_loop_responsive():
+    """Test that blocking calls do not stall other coroutines."""
+    executor = BoundedExecutor(max_workers=1, max_concurrency=1, name="test")
+    
+    async def main():
+        ticks = 0
+        task = asyncio.ensure_future(executor.run(time.sleep, 0.1))
+        while not task.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        return ticks
+    
+    assert asyncio.run(main()) >= 5
+    executor.shutdown()
+
+
+def test_run_counts_failures():
+    """Test that exceptions propagate and are counted."""
+    executor = BoundedExecutor(max_workers=1, max_concurrency=1, name="test")
+    
+    def boom():
+        raise RuntimeError("boom")
+    
+    async def main():
+        try:
+            await executor.run(boom)
+        except RuntimeError as e:
+            return str(e)
+    
+    assert asyncio.run(main()) == "boom"
+    assert executor.stats()["failed"] == 1
+    executor.shutdown()
+
+
+def test_stream_yields_items_and_closes_early():
+    """Test streaming a blocking generator and stopping partway through."""
+    executor = BoundedExecutor(max_workers=2, max_concurrency=1, name="test")
+    closed = []
+    
+    def numbers():
+        try:
+            for i in range(10):
+                yield i
+        finally:
+            closed.append(True)
+    
+    async def main():
+        items = []
+        stream = executor.stream(numbers)
+        async for item in stream:
+            items.append(item)
+            if item == 2:
+                break
+        await stream.aclose()
+        return items
+    
+    assert asyncio.run(main()) == [0, 1, 2]
+    assert closed == [True]
+    assert executor.stats()["in_flight"] == 0
+    executor.shutdown()
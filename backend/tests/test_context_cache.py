@@ -0,0 +1,175 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from context_cache import ContextCacheRegistry, LocalCachingAPI, create_context_cache, split_contents
+from gemini_client import gemini_client
+from llm_backend import GeminiBackend
+
+
+def make_file(name):
+    """Build a stand-in for a Gemini file handle."""
+    return SimpleNamespace(name=name, uri=f"https://example.com/{name}")
+
+
+class RecordingModel:
+    """Model stub that records the contents of every request."""
+    
+    def __init__(self):
+        self.requests = []
+    
+    def generate_content(self, contents, stream=False):
+        self.requests.append(list(contents))
+        if stream:
+            return iter([SimpleNamespace(text="streamed")])
+        return SimpleNamespace(text="answer")
+
+
+@pytest.fixture
+def local_context_cache(monkeypatch):
+    """Route the shared client through a recording model and the local caching stub."""
+    model = RecordingModel()
+    registry = ContextCacheRegistry(LocalCachingAPI(lambda: model), ttl=60, min_uses=2)
+    backend = GeminiBackend(api_key="test", model_name="gemini-test")
+    backend.model = model
+    backend.context_cache = registry
+    monkeypatch.setattr(gemini_client, "backend", backend)
+    return model, registry
+
+
+def test_split_contents():
+    """Test that file handles are separated from text parts."""
+    file = make_file("files/a")
+    assert split_contents(["question", file]) == ([file], ["question"])
+
+
+def test_registry_caches_recurring_file_sets():
+    """Test that a file set is cached on its second use and reused afterwards."""
+    api = LocalCachingAPI(lambda: None)
+    registry = ContextCacheRegistry(api, ttl=60, min_uses=2)
+    files = [make_file("files/a"), make_file("files/b")]
+    
+    assert registry.lookup("model", files) is None
+    handle = registry.lookup("model", list(reversed(files)))
+    assert handle is not None
+    assert registry.lookup("model", files) is handle
+    assert registry.lookup("other-model", files) is None
+    assert registry.stats()["creates"] == 1
+    assert registry.stats()["hits"] == 1
+
+
+def test_registry_refreshes_ttl():
+    """Test that an entry past half its TTL is extended."""
+    registry = ContextCacheRegistry(LocalCachingAPI(lambda: None), ttl=0.1, min_uses=1)
+    files = [make_file("files/a")]
+    handle = registry.lookup("model", files)
+    expire_time = handle.expire_time
+    time.sleep(0.06)
+    assert registry.lookup("model", files) is handle
+    assert registry.stats()["refreshes"] == 1
+    assert handle.expire_time > expire_time
+
+
+def test_registry_backs_off_after_failure():
+    """Test that a file set that cannot be cached is not retried immediately."""
+    class FailingAPI(LocalCachingAPI):
+        calls = 0
+        
+        def create(self, model_name, files, ttl):
+            FailingAPI.calls += 1
+            raise ValueError("content too small to cache")
+    
+    registry = ContextCacheRegistry(FailingAPI(lambda: None), ttl=60, min_uses=1, failure_cooldown=60)
+    files = [make_file("files/a")]
+    assert registry.lookup("model", files) is None
+    assert registry.lookup("model", files) is None
+    assert FailingAPI.calls == 1
+    assert registry.stats()["failures"] == 1
+
+
+def test_registry_creates_in_background():
+    """Test that an executor moves creation off the lookup and serves refreshes from the old handle."""
+    release = threading.Event()
+    
+    class SlowCachingAPI(LocalCachingAPI):
+        def create(self, model_name, files, ttl):
+            release.wait(5)
+            return super().create(model_name, files, ttl)
+    
+    executor = ThreadPoolExecutor(max_workers=1)
+    registry = ContextCacheRegistry(SlowCachingAPI(lambda: None), ttl=60, min_uses=2, executor=executor)
+    files = [make_file("files/a")]
+    
+    registry.lookup("model", files)
+    started = time.monotonic()
+    assert registry.lookup("model", files) is None
+    assert time.monotonic() - started < 1
+    assert registry.lookup("model", files) is None  # Still pending: no second create
+    release.set()
+    executor.submit(lambda: None).result(5)
+    
+    handle = registry.lookup("model", files)
+    assert handle is not None
+    registry._entries[("model", ("files/a",))].expires_at = time.monotonic() + 10
+    assert registry.lookup("model", files) is handle
+    executor.shutdown(wait=True)
+    assert registry.stats()["creates"] == 1
+    assert registry.stats()["refreshes"] == 1
+
+
+def test_gemini_cache_requires_versioned_model():
+    """Test that the Gemini cache backend is disabled unless a versioned model is known."""
+    assert create_context_cache("gemini", lambda: None, "gemini-1.5-flash") is None
+    
+    registry = create_context_cache("gemini", lambda: None, "gemini-1.5-flash-002", ttl=60)
+    assert registry.api.model_name == "gemini-1.5-flash-002"
+    registry = create_context_cache("gemini", lambda: None, "gemini-1.5-flash", "gemini-1.5-flash-001", ttl=60)
+    assert registry.api.model_name == "gemini-1.5-flash-001"
+    assert registry.executor is not None
+
+
+def test_registry_invalidates_deleted_files():
+    """Test that deleting a file deletes caches that contain it."""
+    api = LocalCachingAPI(lambda: None)
+    registry = ContextCacheRegistry(api, ttl=60, min_uses=1)
+    registry.lookup("model", [make_file("files/a"), make_file("files/b")])
+    registry.lookup("model", [make_file("files/c")])
+    
+    registry.invalidate_file("files/b")
+    assert registry.stats()["entries"] == 1
+    assert len(api.contents) == 1
+
+
+def test_generate_uses_context_cache_on_follow_up_turns(local_context_cache):
+    """Test that follow-up turns send only the question and reuse the cached files."""
+    model, registry = local_context_cache
+    files = [make_file("files/handbook")]
+    
+    gemini_client.generate(["first question"] + files)
+    gemini_client.generate(["second question"] + files)
+    assert list(gemini_client.stream_generate(["third question"] + files)) == ["streamed"]
+    
+    # The model sees the files on every turn: attached on the first, from the cache after
+    assert model.requests[0] == ["first question", files[0]]
+    assert model.requests[1:] == [[files[0], "second question"], [files[0], "third question"]]
+    assert registry.stats()["creates"] == 1
+    assert registry.stats()["hits"] == 1
+
+
+def test_generate_falls_back_when_cache_is_gone(local_context_cache):
+    """Test that a cache rejected upstream is dropped and the turn retried uncached."""
+    model, registry = local_context_cache
+    files = [make_file("files/handbook")]
+    gemini_client.generate(["first"] + files)
+    gemini_client.generate(["second"] + files)
+    [handle] = registry.api.contents.values()
+    handle.expire_time = datetime.now(timezone.utc) - timedelta(seconds=1)
+    
+    assert gemini_client.generate(["third"] + files) == "answer"
+    assert registry.stats()["fallbacks"] == 1
+    assert registry.stats()["entries"] == 0
+    assert model.requests[-1] == ["third", files[0]]
@@ -0,0 +1,174 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from admission import ConcurrencyGate, admission_controller
+from config import settings
+from conversation import (
+    ConversationHistory, Turn, build_history_prompt, estimate_tokens, pack_context, update_summary
+)
+from exceptions import ServiceOverloadedError
+from gemini_client import gemini_client
+from models import ChatSession, Message
+from retrieval import Passage
+
+
+def make_passage(index, words):
+    """Build a passage of roughly ``words`` words."""
+    return Passage(chunk_id=index, document_id=1, filename="doc.txt", text="word " * words, score=1.0 / (index + 1))
+
+
+def test_estimate_tokens():
+    """Test the character-based token estimate."""
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("a" * 400) == 101
+
+
+def test_pack_context_keeps_everything_within_budget():
+    """Test that small contexts are packed whole."""
+    history = ConversationHistory(summary="Earlier they asked about leave.", turns=[
+        Turn("user", "How many days?"), Turn("assistant", "Twenty five.")
+    ])
+    packed = pack_context("And sick leave?", [make_passage(0, 10)], history, budget=1000, passage_share=0.6)
+    assert packed.summary == history.summary
+    assert packed.turns == history.turns
+    assert len(packed.passages) == 1
+    assert packed.tokens <= 1000
+
+
+def test_pack_context_drops_oldest_turns_and_lowest_passages():
+    """Test that a tight budget keeps the newest turns and best passages."""
+    turns = [Turn("user" if i % 2 == 0 else "assistant", f"message {i} " + "x" * 200) for i in range(10)]
+    passages = [make_passage(i, 50) for i in range(6)]
+    packed = pack_context("question", passages, ConversationHistory(turns=turns), budget=400, passage_share=0.5)
+    
+    assert packed.tokens <= 400
+    assert 0 < len(packed.turns) < len(turns)
+    assert packed.turns == turns[-len(packed.turns):]
+    assert 0 < len(packed.passages) < len(passages)
+    assert packed.passages == passages[:len(packed.passages)]
+
+
+def test_build_history_prompt():
+    """Test prompt layout with and without history."""
+    history = ConversationHistory(summary="S", turns=[Turn("user", "Hi"), Turn("assistant", "Hello")])
+    packed = pack_context("Q", [], history, budget=100, passage_share=0.5)
+    prompt = build_history_prompt(packed, "Q")
+    assert prompt == "Summary of the earlier conversation:\nS\n\nRecent conversation:\nUser: Hi\nAssistant: Hello\n\nQ"
+    assert build_history_prompt(pack_context("Q", [], None, 100, 0.5), "Q") == "Q"
+
+
+def test_chat_sends_history_and_rolls_summary(client, db, monkeypatch):
+    """Test that earlier turns are sent and older ones folded into a stored summary."""
+    monkeypatch.setattr(settings, "history_recent_messages", 2)
+    monkeypatch.setattr(settings, "summary_batch_messages", 2)
+    prompts = []
+    
+    def fake_generate(contents):
+        prompts.append(contents[0])
+        if contents[0].startswith("You maintain a running summary"):
+            return "The user asked about vacation and parking."
+        return f"Answer {len(prompts)}"
+    
+    monkeypatch.setattr(gemini_client, "generate", fake_generate)
+    
+    session_id = client.post("/api/chat", json={"query": "How many vacation days?"}).json()["session_id"]
+    client.post("/api/chat", json={"query": "Where do I park?", "session_id": session_id})
+    assert "User: How many vacation days?" in prompts[-1]
+    
+    # Two messages have now left the recent window and are summarized in the background
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        db.expire_all()
+        session = db.get(ChatSession, session_id)
+        if session.summary:
+            break
+        time.sleep(0.02)
+    assert session.summary == "The user asked about vacation and parking."
+    assert session.summarized_message_id is not None
+    
+    client.post("/api/chat", json={"query": "And on weekends?", "session_id": session_id})
+    prompt = prompts[-1]
+    assert prompt.startswith("Summary of the earlier conversation:\nThe user asked about vacation and parking.")
+    assert "User: Where do I park?" in prompt
+    assert "How many vacation days?" not in prompt
+    assert prompt.endswith("And on weekends?")
+
+
+def test_update_summary_releases_connection_and_keeps_newer_summary(
+    engines, db, checked_out_connections, monkeypatch
+):
+    """Test that no connection is held while summarizing and a concurrent update is not overwritten."""
+    monkeypatch.setattr(settings, "history_recent_messages", 0)
+    monkeypatch.setattr(settings, "summary_batch_messages", 1)
+    session = ChatSession(title="Summary")
+    db.add(session)
+    db.commit()
+    db.add_all([Message(session_id=session.id, role="user", content=f"Question {i}") for i in range(2)])
+    db.commit()
+    session_factory = async_sessionmaker(engines[1], expire_on_commit=False)
+    during_generation = []
+    
+    def fake_generate(contents):
+        during_generation.append(checked_out_connections["checked_out"])
+        return "Two questions were asked."
+    
+    monkeypatch.setattr(gemini_client, "generate", fake_generate)
+    
+    async def summarize():
+        async with session_factory() as async_db:
+            return await update_summary(async_db, await async_db.get(ChatSession, session.id))
+    
+    assert asyncio.run(summarize()) is True
+    assert during_generation == [0]
+    db.expire_all()
+    assert db.get(ChatSession, session.id).summary == "Two questions were asked."
+    
+    # Another update lands while the model is writing this one
+    db.add(Message(session_id=session.id, role="user", content="Question 2"))
+    db.commit()
+    
+    def racing_generate(contents):
+        with db.bind.begin() as connection:
+            connection.exec_driver_sql("UPDATE chat_sessions SET summary = 'Newer', summarized_message_id = 99")
+        return "Stale summary"
+    
+    monkeypatch.setattr(gemini_client, "generate", racing_generate)
+    assert asyncio.run(summarize()) is False
+    db.expire_all()
+    assert db.get(ChatSession, session.id).summary == "Newer"
+
+
+def test_update_summary_waits_for_the_llm_gate(engines, db, monkeypatch):
+    """Test that background summaries take an LLM gate slot and are shed when none frees up."""
+    monkeypatch.setattr(settings, "history_recent_messages", 0)
+    monkeypatch.setattr(settings, "summary_batch_messages", 1)
+    gate = ConcurrencyGate(max_concurrency=1, max_queue=4, queue_timeout=0.05)
+    monkeypatch.setattr(admission_controller, "gate", gate)
+    session = ChatSession(title="Busy")
+    db.add(session)
+    db.commit()
+    db.add(Message(session_id=session.id, role="user", content="Question"))
+    db.commit()
+    session_factory = async_sessionmaker(engines[1], expire_on_commit=False)
+    calls = []
+    monkeypatch.setattr(gemini_client, "generate", lambda contents: calls.append(contents) or "Summary")
+    
+    async def summarize():
+        async with session_factory() as async_db:
+            return await update_summary(async_db, await async_db.get(ChatSession, session.id))
+    
+    async def summarize_while_gate_is_full():
+        held = await gate.acquire()
+        try:
+            with pytest.raises(ServiceOverloadedError):
+                await summarize()
+        finally:
+            gate.release(held, 0.1)
+    
+    asyncio.run(summarize_while_gate_is_full())
+    assert calls == []
+    assert asyncio.run(summarize()) is True
+    assert gate.stats()["admitted"] == 2
@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from admission import ConcurrencyGate, admission_controller
+from config import settings
+from fanout import NO_INFORMATION, Shard, group_files, map_shards
+from gemini_client import gemini_client
+from models import Message
+from tests.test_routes import parse_sse
+
+FILES = [f"files/doc{i}" for i in range(5)]
+
+
+@pytest.fixture
+def fake_map_reduce(monkeypatch):
+    """Stub Gemini so map requests answer per file group and reduce requests are recorded."""
+    monkeypatch.setattr(settings, "fanout_group_size", 2)
+    monkeypatch.setattr(gemini_client, "get_file", lambda name: name)
+    calls = {"map": [], "reduce": []}
+    
+    def fake_generate(contents):
+        if contents[0].startswith("You are answering one part"):
+            group = contents[1:]
+            calls["map"].append(group)
+            time.sleep(0.2)
+            if "files/doc2" in group:
+                raise RuntimeError("shard quota exceeded")
+            if "files/doc4" in group:
+                return NO_INFORMATION
+            return f"Facts from {' and '.join(group)}."
+        calls["reduce"].append(contents[0])
+        return "Merged answer."
+    
+    def fake_stream(contents):
+        calls["reduce"].append(contents[0])
+        yield "Merged "
+        yield "answer."
+    
+    monkeypatch.setattr(gemini_client, "generate", fake_generate)
+    monkeypatch.setattr(gemini_client, "stream_generate", fake_stream)
+    return calls
+
+
+def test_group_files():
+    """Test grouping keeps order and drops duplicates."""
+    assert group_files(["a", "b", "a", "c"], 2) == [["a", "b"], ["c"]]
+    assert group_files([], 2) == []
+
+
+def test_chat_stream_map_reduce(client, db, fake_map_reduce):
+    """Test that shards run in parallel, report progress and are merged in one reduce call."""
+    start_time = time.perf_counter()
+    response = client.post("/api/chat/stream", json={
+        "query": "Summarize the findings", "file_uris": FILES, "mode": "map_reduce"
+    })
+    elapsed = time.perf_counter() - start_time
+    events = parse_sse(response.text)
+    
+    names = [name for name, _ in events]
+    assert names == ["session", "progress", "progress", "progress", "token", "token", "done"]
+    progress = [data for name, data in events if name == "progress"]
+    assert [data["completed"] for data in progress] == [1, 2, 3]
+    assert sorted(data["status"] for data in progress) == ["empty", "failed", "ok"]
+    # Three 0.2s shards in parallel take about as long as one
+    assert elapsed < 0.5
+    
+    [reduce_prompt] = fake_map_reduce["reduce"]
+    assert "Facts from files/doc0 and files/doc1." in reduce_prompt
+    assert "doc4" not in reduce_prompt
+    assert reduce_prompt.endswith("Question: Summarize the findings")
+    
+    session_id = events[0][1]["session_id"]
+    messages = db.query(Message).filter(Message.session_id == session_id).all()
+    assert [(m.role, m.content) for m in messages] == [
+        ("user", "Summarize the findings"), ("assistant", "Merged answer.")
+    ]
+
+
+def test_chat_map_reduce(client, fake_map_reduce):
+    """Test the non-streaming map-reduce mode."""
+    response = client.post("/api/chat", json={
+        "query": "Summarize the findings", "file_uris": FILES, "mode": "map_reduce"
+    })
+    assert response.status_code == 200
+    assert response.json()["response"] == "Merged answer."
+    assert len(fake_map_reduce["map"]) == 3
+
+
+def test_chat_map_reduce_fails_when_every_shard_fails(client, fake_map_reduce):
+    """Test that a turn with no successful shard reports an error."""
+    response = client.post("/api/chat/stream", json={
+        "query": "Summarize", "file_uris": ["files/doc2"], "mode": "map_reduce"
+    })
+    events = parse_sse(response.text)
+    assert [name for name, _ in events] == ["session", "progress", "error"]
+    assert "shard quota exceeded" in events[-1][1]["detail"]
+    assert fake_map_reduce["reduce"] == []
+
+
+def test_shard_files_resolved_concurrently_without_connection(
+    client, fake_map_reduce, checked_out_connections, monkeypatch
+):
+    """Test that file handles for every shard are fetched at once, after the connection is released."""
+    during_lookup = []
+    
+    def slow_get_file(name):
+        during_lookup.append(checked_out_connections["checked_out"])
+        time.sleep(0.1)
+        return name
+    
+    monkeypatch.setattr(gemini_client, "get_file", slow_get_file)
+    start_time = time.perf_counter()
+    client.post("/api/chat", json={"query": "Summarize", "file_uris": FILES, "mode": "map_reduce"})
+    
+    assert during_lookup == [0] * len(FILES)
+    # Map shards take 0.2s; five sequential 0.1s lookups would add 0.5s
+    assert time.perf_counter() - start_time < 0.5
+
+
+def test_map_shards_stay_within_the_llm_gate(monkeypatch):
+    """Test that shards beyond the request's own slot only run on free gate slots."""
+    gate = ConcurrencyGate(max_concurrency=3, max_queue=4, queue_timeout=5)
+    monkeypatch.setattr(admission_controller, "gate", gate)
+    lock = threading.Lock()
+    in_flight = {"now": 0, "peak": 0}
+    
+    def fake_generate(contents):
+        with lock:
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        time.sleep(0.05)
+        with lock:
+            in_flight["now"] -= 1
+        return "facts"
+    
+    monkeypatch.setattr(gemini_client, "generate", fake_generate)
+    shards = [Shard(index=i, file_uris=[f"files/doc{i}"], contents=["map"]) for i in range(6)]
+    
+    async def scenario(slots_held):
+        held = [await gate.acquire() for _ in range(slots_held)]
+        try:
+            return [result async for result in map_shards(shards, concurrency=8)]
+        finally:
+            for semaphore in held:
+                gate.release(semaphore, 0.1)
+    
+    # The chat request holds one slot; the other two are free
+    results = asyncio.run(scenario(1))
+    assert [result.answer for result in results] == ["facts"] * 6
+    assert in_flight["peak"] == 3
+    assert gate.stats()["in_flight"] == 0
+    
+    # With every other slot taken, the shards run one at a time in the request's slot
+    in_flight["peak"] = 0
+    assert len(asyncio.run(scenario(3))) == 6
+    assert in_flight["peak"] == 1
+
+
+def test_chat_rejects_unknown_mode(client):
+    """Test request validation of the query mode."""
+    response = client.post("/api/chat", json={"query": "Hi", "mode": "scatter"})
+    assert response.status_code == 422
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from file_cache import FileHandleCache, normalize_file_name
+from gemini_client import GeminiClient
+from llm_backend import FakeBackend
+
+
+def make_file(name, expires_in=None):
+    """Build a stand-in for a Gemini file handle."""
+    expiration_time = None
+    if expires_in is not None:
+        expiration_time = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
+    return SimpleNamespace(name=name, expiration_time=expiration_time)
+
+
+def test_normalize_file_name():
+    """Test that names and download URIs map to the same key."""
+    assert normalize_file_name("files/abc") == "files/abc"
+    assert normalize_file_name(
+        "https://generativelanguage.googleapis.com/v1beta/files/abc"
+    ) == "files/abc"
+
+
+def test_cache_hit_and_miss_counters():
+    """Test hit and miss accounting."""
+    cache = FileHandleCache(max_entries=4, default_ttl=60)
+    assert cache.get("files/a") is None
+    cache.put("files/a", make_file("files/a"))
+    assert cache.get("files/a").name == "files/a"
+    
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_cache_evicts_least_recently_used():
+    """Test LRU eviction once the cache is full."""
+    cache = FileHandleCache(max_entries=2, default_ttl=60)
+    cache.put("files/a", make_file("files/a"))
+    cache.put("files/b", make_file("files/b"))
+    cache.get("files/a")
+    cache.put("files/c", make_file("files/c"))
+    
+    assert cache.get("files/b") is None
+    assert cache.get("files/a") is not None
+    assert cache.get("files/c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_ttl_follows_file_expiration():
+    """Test that entries expire ahead of the file's own expiration time."""
+    cache = FileHandleCache(max_entries=4, default_ttl=3600, expiry_margin=0)
+    cache.put("files/soon", make_file("files/soon", expires_in=0.05))
+    cache.put("files/expired", make_file("files/expired", expires_in=-10))
+    
+    assert cache.get("files/soon") is not None
+    assert cache.get("files/expired") is None
+    time.sleep(0.1)
+    assert cache.get("files/soon") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_cache_invalidate():
+    """Test explicit invalidation."""
+    cache = FileHandleCache(max_entries=4, default_ttl=60)
+    cache.put("files/a", make_file("files/a"))
+    cache.invalidate("files/a")
+    assert cache.get("files/a") is None
+
+
+def test_aget_files_fetches_misses_concurrently(monkeypatch):
+    """Test that misses resolve in parallel and repeat turns hit the cache."""
+    client = GeminiClient(backend=FakeBackend())
+    lock = threading.Lock()
+    active = []
+    peak = []
+    calls = []
+    
+    def fake_get_file(name):
+        with lock:
+            calls.append(name)
+            active.append(name)
+            peak.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.remove(name)
+        if name == "files/missing":
+            raise ValueError("not found")
+        return make_file(name, expires_in=3600)
+    
+    monkeypatch.setattr(client.backend, "get_file", fake_get_file)
+    uris = ["files/a", "files/b", "files/c", "files/missing"]
+    
+    files = asyncio.run(client.aget_files(uris))
+    assert [f.name for f in files] == ["files/a", "files/b", "files/c"]
+    assert max(peak) > 1
+    
+    calls.clear()
+    files = asyncio.run(client.aget_files(uris[:3]))
+    assert [f.name for f in files] == ["files/a", "files/b", "files/c"]
+    assert calls == []
+    client.executor.shutdown()
+
+
+def test_delete_file_invalidates_cache(monkeypatch):
+    """Test that deleting a file drops its cached handle."""
+    client = GeminiClient(backend=FakeBackend(file_latency_ms=0))
+    client.file_cache.put("files/a", make_file("files/a"))
+    
+    client.delete_file("files/a")
+    assert client.file_cache.get("files/a") is None
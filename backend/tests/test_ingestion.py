@@ -0,0 +1,167 @@
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from gemini_client import gemini_client
+from ingestion import ingestion_queue
+from models import Document, IngestionJob
+
+
+def wait_for_job(client, job_id, timeout=5.0):
+    """Poll the job endpoint until the job finishes."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+@pytest.fixture
+def flaky_gemini_upload(monkeypatch):
+    """Gemini upload stub that fails a configurable number of times first."""
+    state = {"failures": 0, "calls": 0}
+    
+    def fake_upload_file(file_path, mime_type=None, display_name=None):
+        state["calls"] += 1
+        if state["calls"] <= state["failures"]:
+            raise ConnectionError("upstream unavailable")
+        return SimpleNamespace(
+            name=f"files/job{state['calls']}",
+            uri=f"https://example.com/files/job{state['calls']}",
+            expiration_time=datetime.now(timezone.utc) + timedelta(hours=48)
+        )
+    
+    monkeypatch.setattr(gemini_client, "upload_file", fake_upload_file)
+    monkeypatch.setattr(ingestion_queue, "retry_backoff", 0.01)
+    return state
+
+
+def test_async_upload_returns_job_and_completes(client, db, flaky_gemini_upload):
+    """Test that an async upload is accepted and processed in the background."""
+    response = client.post(
+        "/api/upload/async",
+        files={"file": ("notes.txt", b"background content", "text/plain")}
+    )
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "queued"
+    
+    job = wait_for_job(client, job["id"])
+    assert job["status"] == "succeeded"
+    assert job["progress"] == 100
+    assert job["attempts"] == 1
+    
+    document = db.get(Document, job["document_id"])
+    assert document.original_filename == "notes.txt"
+    assert document.gemini_name == "files/job1"
+
+
+def test_async_upload_retries_transient_failures(client, flaky_gemini_upload):
+    """Test that failed attempts are retried up to the limit."""
+    flaky_gemini_upload["failures"] = 2
+    job = client.post(
+        "/api/upload/async",
+        files={"file": ("notes.txt", b"retry content", "text/plain")}
+    ).json()
+    
+    job = wait_for_job(client, job["id"])
+    assert job["status"] == "succeeded"
+    assert job["attempts"] == 3
+
+
+def test_async_upload_fails_after_max_attempts(client, flaky_gemini_upload):
+    """Test that a job is marked failed once retries are exhausted."""
+    flaky_gemini_upload["failures"] = 10
+    job = client.post(
+        "/api/upload/async",
+        files={"file": ("notes.txt", b"doomed content", "text/plain")}
+    ).json()
+    
+    job = wait_for_job(client, job["id"])
+    assert job["status"] == "failed"
+    assert job["attempts"] == ingestion_queue.max_attempts
+    assert "upstream unavailable" in job["error"]
+
+
+def test_uploads_hold_no_connection_during_gemini_transfer(
+    client, db, flaky_gemini_upload, checked_out_connections, monkeypatch
+):
+    """Test that sync, batch and background uploads release the database connection before uploading."""
+    during_upload = []
+    upload_file = gemini_client.upload_file
+    
+    def recording_upload(*args, **kwargs):
+        during_upload.append(checked_out_connections["checked_out"])
+        return upload_file(*args, **kwargs)
+    
+    monkeypatch.setattr(gemini_client, "upload_file", recording_upload)
+    flaky_gemini_upload["failures"] = 2  # First sync upload fails, then the job's first attempt
+    
+    assert client.post("/api/upload", files={"file": ("a.txt", b"first", "text/plain")}).status_code == 400
+    job_id = client.post("/api/upload/async", files={"file": ("b.txt", b"second", "text/plain")}).json()["id"]
+    # Polled through the sync engine, whose connections are not counted
+    deadline = time.monotonic() + 5.0
+    while db.get(IngestionJob, job_id).status != "succeeded" and time.monotonic() < deadline:
+        db.expire_all()
+        time.sleep(0.02)
+    assert db.get(IngestionJob, job_id).attempts == 2
+    response = client.post(
+        "/api/upload/batch",
+        files=[("files", ("c.txt", b"third", "text/plain")), ("files", ("d.txt", b"fourth", "text/plain"))]
+    )
+    assert response.json()["succeeded"] == 2
+    
+    assert during_upload == [0, 0, 0, 0, 0]
+
+
+def test_queued_jobs_resume_after_restart(engines, db, flaky_gemini_upload, tmp_path):
+    """Test that jobs persisted as queued are picked up on startup."""
+    from fastapi.testclient import TestClient
+    from main import app
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+    
+    staged_path = tmp_path / "staged.txt"
+    staged_path.write_bytes(b"left over from a crash")
+    db.add(IngestionJob(
+        id="recovered",
+        status="running",
+        progress=30,
+        attempts=1,
+        original_filename="crash.txt",
+        staged_path=str(staged_path),
+        mime_type="text/plain",
+        file_size=22,
+        content_hash="0" * 64,
+    ))
+    db.commit()
+    
+    _, async_engine = engines
+    default_session_factory = ingestion_queue.session_factory
+    ingestion_queue.session_factory = async_sessionmaker(
+        async_engine, class_=AsyncSession, expire_on_commit=False
+    )
+    try:
+        with TestClient(app):
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                db.expire_all()
+                job = db.get(IngestionJob, "recovered")
+                if job.status == "succeeded":
+                    break
+                time.sleep(0.02)
+    finally:
+        ingestion_queue.session_factory = default_session_factory
+    
+    assert job.status == "succeeded"
+    assert job.attempts == 2
+    assert not staged_path.exists()
+
+
+def test_get_job_not_found(client):
+    """Test fetching an unknown job."""
+    response = client.get("/api/jobs/unknown")
+    assert response.status_code == 404
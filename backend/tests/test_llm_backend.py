@@ -0,0 +1,137 @@
+import asyncio
+import random
+import statistics
+import time
+
+import pytest
+
+import llm_backend
+from gemini_client import GeminiClient, gemini_client
+from llm_backend import FakeBackend, FakeBackendError, LatencyDistribution, create_llm_backend
+from tests.test_routes import parse_sse
+from transport import is_retryable
+
+
+def test_latency_distributions():
+    """Test that each distribution samples around its median."""
+    rng = random.Random(7)
+    assert LatencyDistribution("fixed", 100, 0.5, rng).sample() == 0.1
+    
+    uniform = [LatencyDistribution("uniform", 100, 0.5, rng).sample() for _ in range(200)]
+    assert all(0.05 <= delay <= 0.15 for delay in uniform)
+    
+    lognormal = [LatencyDistribution("lognormal", 100, 0.5, rng).sample() for _ in range(2000)]
+    assert statistics.median(lognormal) == pytest.approx(0.1, rel=0.1)
+    assert max(lognormal) > 0.25  # Long tail
+    
+    with pytest.raises(ValueError):
+        LatencyDistribution("gamma", 100, 0.5, rng)
+
+
+def test_fake_backend_file_lifecycle(tmp_path):
+    """Test upload, lookup and deletion of fake files."""
+    backend = FakeBackend(file_latency_ms=0, upload_latency_ms=0)
+    path = tmp_path / "notes.txt"
+    path.write_bytes(b"twelve bytes")
+    
+    file = backend.upload_file(str(path), mime_type="text/plain", display_name="notes.txt")
+    assert file.name.startswith("files/")
+    assert file.uri.endswith(file.name)
+    assert file.size_bytes == 12
+    assert backend.get_file(file.name) is file
+    assert backend.list_files() == [file]
+    
+    backend.delete_file(file.name)
+    assert backend.list_files() == []
+    # Unknown names resolve to synthetic handles so a seeded database stays usable
+    assert backend.get_file("files/seeded").name == "files/seeded"
+    assert backend.stats()["calls"] == {"upload": 1, "get": 2, "list": 2, "delete": 1}
+
+
+def test_fake_backend_streams_at_configured_cadence():
+    """Test that streamed chunks match the full answer and arrive at the chunk interval."""
+    backend = FakeBackend(latency="fixed", latency_ms=0, chunk_interval_ms=0, answer_words=10, chunk_words=3)
+    chunks = list(backend.stream_generate(["What is in the report?"]))
+    assert len(chunks) == 4  # Header phrase plus ten words, three words per chunk
+    assert "".join(chunks).strip() == backend.generate(["What is in the report?"])
+    
+    paced = FakeBackend(latency="fixed", latency_ms=20, chunk_interval_ms=10, answer_words=10, chunk_words=3)
+    start_time = time.perf_counter()
+    list(paced.stream_generate(["question"]))
+    assert time.perf_counter() - start_time >= 0.02 + 3 * 0.01
+
+
+def test_fake_backend_injects_retryable_errors():
+    """Test that injected failures are counted and retried by the transport."""
+    backend = FakeBackend(latency_ms=0, error_rate=1.0, seed=1)
+    with pytest.raises(FakeBackendError) as excinfo:
+        backend.generate(["question"])
+    assert is_retryable(excinfo.value)
+    with pytest.raises(FakeBackendError):
+        next(backend.stream_generate(["question"]))
+    assert backend.stats()["injected_errors"] == 2
+    
+    flaky = FakeBackend(latency_ms=0, chunk_interval_ms=0, error_rate=0.5, seed=3)
+    outcomes = []
+    for _ in range(200):
+        try:
+            flaky.generate(["question"])
+            outcomes.append(True)
+        except FakeBackendError:
+            outcomes.append(False)
+    assert 0.35 < outcomes.count(False) / len(outcomes) < 0.65
+
+
+def test_gemini_backend_requires_api_key(monkeypatch):
+    """Test that only the gemini backend needs an API key."""
+    monkeypatch.setattr(llm_backend.settings, "llm_backend", "gemini")
+    monkeypatch.setattr(llm_backend.settings, "gemini_api_key", None)
+    with pytest.raises(ValueError, match="GEMINI_API_KEY"):
+        create_llm_backend()
+    
+    monkeypatch.setattr(llm_backend.settings, "llm_backend", "fake")
+    assert isinstance(create_llm_backend(), FakeBackend)
+    
+    monkeypatch.setattr(llm_backend.settings, "llm_backend", "other")
+    with pytest.raises(ValueError):
+        create_llm_backend()
+
+
+def test_client_runs_fake_backend_through_transport():
+    """Test the async client path against the fake backend."""
+    client = GeminiClient(backend=FakeBackend(latency_ms=0, chunk_interval_ms=0, answer_words=8))
+    
+    async def scenario():
+        answer = await client.agenerate(["question"])
+        chunks = [chunk async for chunk in client.astream_generate(["question"])]
+        return answer, chunks
+    
+    answer, chunks = asyncio.run(scenario())
+    assert answer == "".join(chunks).strip()
+    assert client.executor.stats()["completed"] == 2
+    client.executor.shutdown()
+
+
+def test_full_request_path_offline(client, monkeypatch):
+    """Test upload and streamed chat end to end on the fake backend without stubs."""
+    monkeypatch.setattr(
+        gemini_client, "backend", FakeBackend(latency_ms=0, chunk_interval_ms=0, file_latency_ms=0, upload_latency_ms=0)
+    )
+    uploaded = client.post(
+        "/api/upload", files={"file": ("manual.txt", b"The pump must be serviced every 25 days.", "text/plain")}
+    )
+    assert uploaded.status_code == 200
+    
+    response = client.post(
+        "/api/chat/stream",
+        json={"query": "How often is the pump serviced?", "file_uris": [uploaded.json()["gemini_uri"]]},
+    )
+    events = parse_sse(response.text)
+    tokens = [data["text"] for event, data in events if event == "token"]
+    assert tokens[0].startswith("Fake answer using")
+    assert events[-1][0] == "done"
+    
+    stats = client.get("/api/stats").json()["llm_backend"]
+    assert stats["backend"] == "fake"
+    assert stats["calls"]["upload"] == 1
+    assert stats["calls"]["stream_generate"] == 1
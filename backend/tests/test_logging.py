@@ -0,0 +1,67 @@
+import json
+import logging
+import queue
+from logger import (
+    JsonFormatter, NonBlockingQueueHandler, SamplingFilter, create_file_handler, parse_sample_rates
+)
+
+
+def make_record(name="rag_chat.test", level=logging.INFO, msg="Hello %s", args=("world",), **extra):
+    record = logging.LogRecord(name, level, "module.py", 12, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_extra_fields():
+    """Test that messages are rendered and extra fields become keys."""
+    entry = json.loads(JsonFormatter().format(make_record(status=200, duration_ms=1.5)))
+    assert entry["message"] == "Hello world"
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "rag_chat.test"
+    assert entry["source"] == "module.py:12"
+    assert entry["status"] == 200
+    assert entry["duration_ms"] == 1.5
+
+
+def test_sampling_filter_applies_to_children_and_keeps_warnings():
+    """Test per-logger rates, inheritance by child loggers and warnings bypassing sampling."""
+    sampler = SamplingFilter(parse_sample_rates("rag_chat.access=0, rag_chat.retrieval=1"))
+    assert not sampler.filter(make_record("rag_chat.access"))
+    assert not sampler.filter(make_record("rag_chat.access.detail", logging.DEBUG))
+    assert sampler.filter(make_record("rag_chat.access", logging.WARNING))
+    assert sampler.filter(make_record("rag_chat.retrieval"))
+    assert sampler.filter(make_record("rag_chat.main"))
+    assert sampler.dropped == 2
+
+
+def test_queue_handler_defers_formatting_and_never_blocks():
+    """Test that records are queued unformatted and dropped once the queue is full."""
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(make_record())
+    handler.handle(make_record())
+    record = handler.queue.get_nowait()
+    assert record.msg == "Hello %s" and record.args == ("world",)
+    assert handler.dropped == 1
+
+
+def test_size_rotation(tmp_path):
+    """Test that the size-rotated file handler keeps the configured backups."""
+    handler = create_file_handler(tmp_path / "app.log", "size", max_bytes=200, backup_count=2)
+    handler.setFormatter(JsonFormatter())
+    for index in range(20):
+        handler.handle(make_record(args=(index,)))
+    handler.close()
+    assert sorted(path.name for path in tmp_path.glob("app.log*")) == ["app.log", "app.log.1", "app.log.2"]
+
+
+def test_access_log_has_structured_fields(client, caplog):
+    """Test the single access line written per request."""
+    with caplog.at_level(logging.INFO, logger="rag_chat.access"):
+        response = client.get("/api/sessions")
+    assert response.status_code == 200
+    records = [record for record in caplog.records if record.name == "rag_chat.access"]
+    assert len(records) == 1
+    assert records[0].method == "GET"
+    assert records[0].path == "/api/sessions"
+    assert records[0].status == 200
+    assert records[0].duration_ms >= 0
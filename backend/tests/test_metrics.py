@@ -0,0 +1,88 @@
+from metrics import Counter, Histogram, MetricsRegistry, statement_type
+from gemini_client import gemini_client
+
+
+def sample_value(text: str, series: str) -> float:
+    """Return the value of one exposition line, or 0 if the series is absent."""
+    for line in text.splitlines():
+        if line.startswith(series + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Test bucket placement, cumulative counts, sum and count."""
+    histogram = Histogram("job_seconds", "Job time.", ("kind",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.labels("import").observe(value)
+    
+    assert histogram.render() == [
+        "# HELP job_seconds Job time.",
+        "# TYPE job_seconds histogram",
+        'job_seconds_bucket{kind="import",le="0.1"} 2',
+        'job_seconds_bucket{kind="import",le="1.0"} 3',
+        'job_seconds_bucket{kind="import",le="+Inf"} 4',
+        'job_seconds_sum{kind="import"} 3.65',
+        'job_seconds_count{kind="import"} 4',
+    ]
+
+
+def test_labels_reuse_children_and_escape_on_render():
+    """Test that children are created once and label values are escaped when rendered."""
+    counter = Counter("events_total", "Events.", ("name",))
+    assert counter.labels('say "hi"\n') is counter.labels('say "hi"\n')
+    counter.labels('say "hi"\n').inc(2)
+    assert counter.render()[-1] == 'events_total{name="say \\"hi\\"\\n"} 2'
+
+
+def test_registry_callbacks_and_duplicates():
+    """Test scrape-time callbacks and rejection of duplicate names."""
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Requests.")
+    registry.callback("queue_depth", "Queued.", lambda: [((), 3)])
+    text = registry.render()
+    assert "# TYPE queue_depth gauge" in text
+    assert sample_value(text, "queue_depth") == 3
+    try:
+        registry.counter("requests_total", "Again.")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("duplicate metric was registered")
+
+
+def test_statement_type():
+    """Test statement classification for the DB histogram."""
+    assert statement_type("  select * from documents") == "SELECT"
+    assert statement_type("INSERT INTO messages VALUES (?)") == "INSERT"
+    assert statement_type("PRAGMA table_info(documents)") == "OTHER"
+
+
+def test_metrics_endpoint_labels_route_templates(client, sample_session, monkeypatch):
+    """Test request, DB, Gemini and upload series recorded through the full app."""
+    monkeypatch.setattr(gemini_client, "generate", lambda contents: "Answer")
+    series = (
+        'http_request_duration_seconds_count{method="GET",'
+        'route="/api/sessions/{session_id}/messages",status="200"}'
+    )
+    before = client.get("/metrics").text
+    
+    assert client.get(f"/api/sessions/{sample_session.id}/messages").status_code == 200
+    assert client.get("/api/sessions/999999/messages").status_code == 404
+    assert client.post("/api/chat", json={"query": "Hi"}).status_code == 200
+    assert client.post("/api/upload", files={"file": ("a.txt", b"twelve bytes", "text/plain")}).status_code == 200
+    
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert sample_value(text, series) == sample_value(before, series) + 1
+    assert sample_value(text, series.replace('"200"', '"404"')) >= 1
+    assert sample_value(text, 'http_requests_total{method="POST",route="/api/chat",status="200"}') >= 1
+    assert sample_value(text, 'gemini_call_duration_seconds_count{operation="generate",outcome="ok"}') >= 1
+    assert sample_value(text, 'db_query_duration_seconds_count{statement="SELECT"}') > 0
+    assert sample_value(text, "upload_size_bytes_sum") - sample_value(before, "upload_size_bytes_sum") == 12
+    # Only the /metrics request itself is in flight while rendering
+    assert sample_value(text, "http_requests_in_flight") == 1
+    assert "llm_gate_queue_depth 0" in text
+    assert "gemini_circuit_breaker_open 0" in text
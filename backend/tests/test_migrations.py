@@ -0,0 +1,141 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from migrations import MIGRATIONS, applied_versions, upgrade_database
+
+# Schema created by the first release, plus chunks with inline embeddings
+LEGACY_SCHEMA = [
+    "CREATE TABLE chat_sessions (id INTEGER NOT NULL, title VARCHAR(255), created_at DATETIME, "
+    "updated_at DATETIME, PRIMARY KEY (id))",
+    "CREATE TABLE documents (id INTEGER NOT NULL, filename VARCHAR(255) NOT NULL, "
+    "original_filename VARCHAR(255) NOT NULL, mime_type VARCHAR(100) NOT NULL, file_size INTEGER NOT NULL, "
+    "gemini_uri VARCHAR(500) NOT NULL, gemini_name VARCHAR(500) NOT NULL, uploaded_at DATETIME, "
+    "is_active BOOLEAN, PRIMARY KEY (id))",
+    "CREATE TABLE messages (id INTEGER NOT NULL, session_id INTEGER NOT NULL, role VARCHAR(20) NOT NULL, "
+    "content TEXT NOT NULL, created_at DATETIME, PRIMARY KEY (id), "
+    "FOREIGN KEY(session_id) REFERENCES chat_sessions (id))",
+    "CREATE TABLE document_chunks (id INTEGER NOT NULL, document_id INTEGER NOT NULL, "
+    "ordinal INTEGER NOT NULL, text TEXT NOT NULL, embedding BLOB NOT NULL, PRIMARY KEY (id))",
+]
+
+LEGACY_ROWS = [
+    "INSERT INTO chat_sessions VALUES (1, 'First', '2024-01-01 10:00:00', '2024-01-01 10:00:00')",
+    "INSERT INTO chat_sessions VALUES (2, 'Empty', '2024-01-02 10:00:00', '2024-01-02 10:00:00')",
+    "INSERT INTO messages VALUES (1, 1, 'user', 'Hi', '2024-01-01 10:00:00')",
+    "INSERT INTO messages VALUES (2, 1, 'assistant', 'Hello', '2024-01-01 10:00:05')",
+    "INSERT INTO documents VALUES (1, 'a.txt', 'a.txt', 'text/plain', 10, 'uri', 'files/a', "
+    "'2024-01-01 09:00:00', 1)",
+    "INSERT INTO document_chunks VALUES (1, 1, 0, 'quarterly revenue grew', x'00')",
+]
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    """A file database with the legacy schema and a few rows."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        for statement in LEGACY_SCHEMA + LEGACY_ROWS:
+            connection.execute(text(statement))
+    yield engine
+    engine.dispose()
+
+
+def index_names(engine, table: str) -> set:
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+def test_legacy_database_is_upgraded_in_place(legacy_engine):
+    """Test new columns, indexes, backfilled counters and the rebuilt full-text index."""
+    assert upgrade_database(legacy_engine) == [migration.version for migration in MIGRATIONS]
+
+    columns = {column["name"] for column in inspect(legacy_engine).get_columns("chat_sessions")}
+    assert {"summary", "summarized_message_id", "message_count", "last_message_at"} <= columns
+    chunk_columns = {column["name"] for column in inspect(legacy_engine).get_columns("document_chunks")}
+    assert "embedding" not in chunk_columns
+    assert "ix_messages_session_id_created_at" in index_names(legacy_engine, "messages")
+    assert "ix_documents_is_active_uploaded_at_id" in index_names(legacy_engine, "documents")
+    assert "ix_chat_sessions_updated_at_id" in index_names(legacy_engine, "chat_sessions")
+    assert "ingestion_jobs" in inspect(legacy_engine).get_table_names()
+
+    with legacy_engine.connect() as connection:
+        counters = connection.execute(
+            text("SELECT id, message_count, last_message_at FROM chat_sessions ORDER BY id")
+        ).all()
+        assert [tuple(row) for row in counters] == [(1, 2, "2024-01-01 10:00:05"), (2, 0, None)]
+        matches = connection.execute(
+            text("SELECT rowid FROM document_chunks_fts WHERE document_chunks_fts MATCH 'revenue'")
+        ).all()
+        assert [row[0] for row in matches] == [1]
+        # Chunks without an embedding can be inserted again
+        connection.execute(text("INSERT INTO document_chunks (document_id, ordinal, text) VALUES (1, 1, 'more')"))
+
+
+def test_null_sort_columns_are_backfilled(legacy_engine):
+    """Test that legacy rows without a list sort value get one, so cursors can encode them."""
+    with legacy_engine.begin() as connection:
+        connection.execute(text("INSERT INTO chat_sessions VALUES (3, 'Undated', '2024-01-03 10:00:00', NULL)"))
+        connection.execute(text(
+            "INSERT INTO documents VALUES (2, 'b.txt', 'b.txt', 'text/plain', 10, 'uri', 'files/b', NULL, 1)"
+        ))
+    upgrade_database(legacy_engine)
+    with legacy_engine.connect() as connection:
+        assert connection.scalar(text("SELECT updated_at FROM chat_sessions WHERE id = 3")) == "2024-01-03 10:00:00"
+        assert connection.scalar(text("SELECT COUNT(*) FROM documents WHERE uploaded_at IS NULL")) == 0
+
+
+def test_upgrade_is_recorded_and_not_repeated(legacy_engine):
+    """Test that applied versions are recorded and a second run is a no-op."""
+    upgrade_database(legacy_engine)
+    assert upgrade_database(legacy_engine) == []
+    with legacy_engine.connect() as connection:
+        assert applied_versions(connection) == {migration.version for migration in MIGRATIONS}
+
+
+def test_fresh_database_is_stamped(tmp_path):
+    """Test that a new database is created current and only records the migrations."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    assert upgrade_database(engine) == []
+    with engine.connect() as connection:
+        assert applied_versions(connection) == {migration.version for migration in MIGRATIONS}
+    assert "ix_messages_session_id_created_at" in index_names(engine, "messages")
+    engine.dispose()
+
+
+def test_list_queries_use_the_indexes(tmp_path):
+    """Test that the list endpoint queries are served by the composite indexes."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    upgrade_database(engine)
+    with engine.connect() as connection:
+        def plan(sql: str) -> str:
+            return " ".join(row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+        assert "ix_messages_session_id_created_at" in plan(
+            "SELECT * FROM messages WHERE session_id = 1 ORDER BY created_at"
+        )
+        assert "ix_documents_is_active_uploaded_at_id" in plan(
+            "SELECT * FROM documents WHERE is_active = 1 ORDER BY uploaded_at DESC"
+        )
+        assert "ix_chat_sessions_updated_at_id" in plan("SELECT * FROM chat_sessions ORDER BY updated_at DESC")
+    engine.dispose()
+
+
+def test_keyset_pages_seek_the_index(tmp_path):
+    """Test that a page after a cursor is a range seek with no separate sort."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'keyset.db'}")
+    upgrade_database(engine)
+    with engine.connect() as connection:
+        def plan(sql: str) -> str:
+            return " ".join(row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+        documents = plan(
+            "SELECT id, filename FROM documents WHERE is_active = 1 "
+            "AND (uploaded_at, id) < ('2024-01-01 00:00:00', 10) ORDER BY uploaded_at DESC, id DESC LIMIT 101"
+        )
+        assert "SEARCH documents USING INDEX ix_documents_is_active_uploaded_at_id" in documents
+        assert "TEMP B-TREE" not in documents
+        sessions = plan(
+            "SELECT id, title FROM chat_sessions "
+            "WHERE (updated_at, id) < ('2024-01-01 00:00:00', 10) ORDER BY updated_at DESC, id DESC LIMIT 101"
+        )
+        assert "SEARCH chat_sessions USING INDEX ix_chat_sessions_updated_at_id" in sessions
+        assert "TEMP B-TREE" not in sessions
+    engine.dispose()
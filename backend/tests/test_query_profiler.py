@@ -0,0 +1,111 @@
+import asyncio
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+import query_profiler as profiler_module
+from config import settings
+from database import engine
+from query_profiler import QueryProfile, QueryProfiler, QueryProfilerMiddleware, query_profiler
+
+
+def setup_table(connection):
+    connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+    connection.execute(text("INSERT INTO items (name) VALUES ('a'), ('b'), ('c')"))
+
+
+def test_profile_counts_statements_and_logs_slow_queries():
+    """Test per-request counts, repeats and slow-query entries with their plan."""
+    profiler = QueryProfiler(slow_threshold=0.0, slow_log_size=3, log_parameters=True)
+    sync_engine = create_engine("sqlite://")
+    profiler.instrument(sync_engine)
+    profile = QueryProfile()
+    token = profiler_module._current_profile.set(profile)
+    try:
+        with sync_engine.begin() as connection:
+            setup_table(connection)
+            for item_id in (1, 2, 3):
+                connection.execute(text("SELECT name FROM items WHERE id = :id"), {"id": item_id})
+    finally:
+        profiler_module._current_profile.reset(token)
+
+    assert profile.count == 5
+    assert profile.max_repeats == 3
+    assert profile.summary()["statements"] == 5
+    assert len(profiler.slow_queries) == 3
+    slow = profiler.slow_queries[-1]
+    assert slow["statement"] == "SELECT name FROM items WHERE id = ?"
+    assert slow["parameters"] == "(3,)"
+    assert any("items" in step for step in slow["plan"])
+    # EXPLAIN runs on the raw connection and is not counted itself
+    assert profiler.statements == 5
+
+
+def test_slow_query_parameters_redacted_by_default():
+    """Test that bound values stay out of the slow-query log unless enabled."""
+    profiler = QueryProfiler(slow_threshold=0.0)
+    sync_engine = create_engine("sqlite://")
+    profiler.instrument(sync_engine)
+    with sync_engine.begin() as connection:
+        setup_table(connection)
+        connection.execute(text("SELECT id FROM items WHERE name = :name"), {"name": "secret"})
+
+    slow = profiler.slow_queries[-1]
+    assert slow["parameters"] == "<1 parameters redacted>"
+    assert "secret" not in str(list(profiler.slow_queries))
+    assert any("items" in step for step in slow["plan"])
+
+
+def test_async_engine_is_profiled_in_request_context():
+    """Test attribution across the async engine's greenlets and EXPLAIN through aiosqlite."""
+    profiler = QueryProfiler(slow_threshold=0.0)
+    async_engine = create_async_engine("sqlite+aiosqlite://")
+    profiler.instrument(async_engine.sync_engine)
+
+    async def run():
+        profile = QueryProfile()
+        profiler_module._current_profile.set(profile)
+        async with async_engine.begin() as connection:
+            await connection.run_sync(setup_table)
+            await connection.execute(text("SELECT name FROM items ORDER BY name"))
+        await async_engine.dispose()
+        return profile
+
+    profile = asyncio.run(run())
+    assert profile.count == 3
+    assert profiler.slow_queries[-1]["plan"]
+
+
+def test_middleware_reports_profile_headers():
+    """Test the X-DB-* headers and the heavy request log."""
+    profiler = QueryProfiler(slow_threshold=10.0, warn_statements=2)
+    # The endpoint runs on a worker thread; share the in-memory database with it
+    sync_engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    profiler.instrument(sync_engine)
+    with sync_engine.begin() as connection:
+        setup_table(connection)
+
+    def items(request):
+        with sync_engine.connect() as connection:
+            query = text("SELECT name FROM items WHERE id = :id")
+            names = [connection.execute(query, {"id": item_id}).scalar() for item_id in (1, 2)]
+        return PlainTextResponse(",".join(names))
+
+    app = QueryProfilerMiddleware(Starlette(routes=[Route("/items", items)]), profiler)
+    response = TestClient(app).get("/items")
+    assert response.text == "a,b"
+    assert response.headers["x-db-statements"] == "2"
+    assert response.headers["x-db-max-repeats"] == "2"
+    assert float(response.headers["x-db-time-ms"]) >= 0
+    assert profiler.requests == 1
+    assert profiler.heavy_requests == 1
+    assert not profiler.slow_queries
+
+
+def test_engines_hooked_only_when_enabled():
+    """Test that a disabled profiler leaves the engines untouched."""
+    hooked = event.contains(engine, "before_cursor_execute", query_profiler._before_cursor_execute)
+    assert hooked == settings.query_profiler_enabled
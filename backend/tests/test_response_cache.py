@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+from embeddings import HashingEmbedder
+from gemini_client import gemini_client
+from models import Message
+from response_cache import ResponseCache, cache_key, response_cache
+
+
+def cache_answer(cache, query, file_uris, response, latency=1.0):
+    """Run a lookup and store an answer on a miss."""
+    lookup = asyncio.run(cache.get(query, file_uris))
+    assert not lookup.hit
+    cache.put(lookup, response, latency)
+
+
+def test_cache_key_normalizes_query_and_files():
+    """Test that casing, spacing, punctuation and file order do not change the key."""
+    assert cache_key("What is  the Policy?", ["files/b", "https://x/files/a"]) == cache_key(
+        "what is the policy", ["files/a", "files/b", "files/a"]
+    )
+    assert cache_key("policy", ["files/a"]) != cache_key("policy", ["files/b"])
+
+
+def test_exact_hit_reports_saved_latency():
+    """Test exact hits and latency accounting."""
+    cache = ResponseCache(max_entries=8, ttl=60)
+    cache_answer(cache, "How many days off?", ["files/a"], "Twenty five.", latency=2.0)
+    
+    lookup = asyncio.run(cache.get("how many days off", ["files/a"]))
+    assert lookup.hit
+    assert lookup.layer == "exact"
+    assert lookup.response == "Twenty five."
+    
+    stats = cache.stats()
+    assert stats["exact_hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+    assert stats["saved_latency_ms"] == 2000.0
+
+
+def test_semantic_hit_requires_same_files_and_threshold():
+    """Test that similar queries reuse answers only over the same file set."""
+    cache = ResponseCache(max_entries=8, ttl=60, semantic_threshold=0.6, embedder=HashingEmbedder(dim=256))
+    cache_answer(cache, "how many vacation days do employees get per year", ["files/a"], "25")
+    
+    lookup = asyncio.run(cache.get("how many vacation days do employees get", ["files/a"]))
+    assert lookup.hit
+    assert lookup.layer == "semantic"
+    assert lookup.response == "25"
+    
+    assert not asyncio.run(cache.get("how many vacation days do employees get", ["files/b"])).hit
+    assert not asyncio.run(cache.get("where is the parking garage", ["files/a"])).hit
+
+
+def test_lru_eviction_and_ttl():
+    """Test size-bounded eviction and expiry."""
+    cache = ResponseCache(max_entries=2, ttl=60)
+    cache_answer(cache, "one", [], "1")
+    cache_answer(cache, "two", [], "2")
+    assert asyncio.run(cache.get("one", [])).hit  # "two" is now least recently used
+    cache_answer(cache, "three", [], "3")
+    assert cache.stats()["evictions"] == 1
+    assert not asyncio.run(cache.get("two", [])).hit
+    
+    short = ResponseCache(max_entries=2, ttl=0.01)
+    cache_answer(short, "one", [], "1")
+    time.sleep(0.02)
+    assert not asyncio.run(short.get("one", [])).hit
+    assert short.stats()["size"] == 0
+
+
+def test_invalidate_file_drops_dependent_answers():
+    """Test that deleting a file drops every answer that used it."""
+    cache = ResponseCache(max_entries=8, ttl=60)
+    cache_answer(cache, "q1", ["files/a", "files/b"], "r1")
+    cache_answer(cache, "q2", ["files/b"], "r2")
+    cache_answer(cache, "q3", ["files/c"], "r3")
+    
+    assert cache.invalidate_file("https://example.com/files/b") == 2
+    assert not asyncio.run(cache.get("q1", ["files/a", "files/b"])).hit
+    assert asyncio.run(cache.get("q3", ["files/c"])).hit
+
+
+def test_chat_cache_hit_skips_gemini_and_saves_messages(client, db, sample_document, monkeypatch):
+    """Test that a repeated opening question is answered from the cache and still recorded."""
+    calls = []
+    monkeypatch.setattr(gemini_client, "generate", lambda contents: calls.append(contents) or "Twenty five days.")
+    monkeypatch.setattr(gemini_client, "get_file", lambda name: name)
+    monkeypatch.setattr(gemini_client, "delete_file", lambda name: None)
+    request = {"query": "How many days?", "file_uris": ["files/test"]}
+    
+    first = client.post("/api/chat", json=request).json()
+    second = client.post("/api/chat", json={**request, "query": "how many days"}).json()
+    assert len(calls) == 1
+    assert first["cached"] is False
+    assert second["cached"] is True
+    assert second["response"] == "Twenty five days."
+    
+    messages = db.query(Message).filter(Message.session_id == second["session_id"]).all()
+    assert [(m.role, m.content) for m in messages] == [("user", "how many days"), ("assistant", "Twenty five days.")]
+    
+    # Follow-up questions depend on earlier turns and are never served from the cache
+    follow_up = client.post("/api/chat", json={**request, "session_id": first["session_id"]}).json()
+    assert follow_up["cached"] is False
+    assert len(calls) == 2
+    
+    # Deleting the document invalidates its answers
+    client.delete(f"/api/documents/{sample_document.id}")
+    assert client.post("/api/chat", json=request).json()["cached"] is False
+    assert len(calls) == 3
+
+
+def test_chat_stream_replays_cached_answer(client, monkeypatch):
+    """Test that the streaming endpoint fills and serves the cache."""
+    def fake_stream(contents):
+        yield "Hello "
+        yield "world"
+    
+    def unexpected_stream(contents):
+        raise AssertionError("cache was bypassed")
+    
+    monkeypatch.setattr(gemini_client, "stream_generate", fake_stream)
+    request = {"query": "Hi"}
+    client.post("/api/chat/stream", json=request)
+    hits = response_cache.stats()["exact_hits"]
+    
+    monkeypatch.setattr(gemini_client, "stream_generate", unexpected_stream)
+    response = client.post("/api/chat/stream", json=request)
+    assert "Hello world" in response.text
+    assert '"cached": true' in response.text
+    assert response_cache.stats()["exact_hits"] == hits + 1
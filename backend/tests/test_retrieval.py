@@ -0,0 +1,171 @@
+import zipfile
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from sqlalchemy import text
+
+from config import settings
+from embeddings import HashingEmbedder
+from gemini_client import gemini_client
+from lexical_index import build_match_query
+from models import CHUNK_FTS_TABLE
+from retrieval import chunk_text, reciprocal_rank_fusion
+from text_extraction import DOCX_MIME_TYPE, extract_text
+from vector_store import top_k
+
+HANDBOOK = " ".join(
+    [f"Section {i}. The cafeteria opens at {i} o'clock and serves soup." for i in range(40)]
+    + ["The vacation policy grants employees twenty five days of paid leave per year."]
+    + [f"Section {i}. Parking permits are issued by the front desk on floor {i}." for i in range(40)]
+)
+
+
+def test_chunk_text_respects_size_and_overlap():
+    """Test that chunks stay within size, overlap, and cover the whole text."""
+    chunks = chunk_text(HANDBOOK, chunk_size=300, overlap=50)
+    assert len(chunks) > 5
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    assert chunks[0].startswith("Section 0.")
+    assert chunks[-1].endswith("floor 39.")
+    # Consecutive chunks share text
+    assert chunks[1].split()[0] in chunks[0]
+
+
+def test_chunk_text_empty():
+    """Test chunking text with no content."""
+    assert chunk_text("   \n ", chunk_size=100, overlap=10) == []
+
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    """Test the offline embedder."""
+    embedder = HashingEmbedder(dim=64)
+    first = embedder.embed(["paid leave policy", "parking permits"])
+    second = embedder.embed(["paid leave policy", "parking permits"])
+    assert first.dtype == np.float32
+    assert first.shape == (2, 64)
+    assert np.array_equal(first, second)
+    assert np.allclose(np.linalg.norm(first, axis=1), 1.0)
+
+
+def test_top_k_orders_by_similarity():
+    """Test vectorized top-k selection."""
+    embedder = HashingEmbedder(dim=256)
+    chunks = chunk_text(HANDBOOK, chunk_size=200, overlap=0)
+    matrix = embedder.embed(chunks)
+    indexes, scores = top_k(embedder.embed_query("how many days of paid vacation leave"), matrix, 3)
+    assert len(indexes) == 3
+    assert list(scores) == sorted(scores, reverse=True)
+    assert "paid leave" in chunks[indexes[0]]
+
+
+def test_build_match_query_quotes_terms():
+    """Test that user text becomes safe, ORed FTS5 phrases."""
+    assert build_match_query('part AB-1234 "quoted"?') == '"part" OR "AB-1234" OR """quoted""?"'
+    assert build_match_query(" ? - ") == ""
+
+
+def test_reciprocal_rank_fusion():
+    """Test that ids ranked well in both lists win."""
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], k=60)
+    assert [chunk_id for chunk_id, _ in fused] == [1, 3, 2, 4]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+
+
+def test_extract_docx_text(tmp_path):
+    """Test paragraph extraction from a .docx file."""
+    path = tmp_path / "doc.docx"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr(
+            "word/document.xml",
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            "<w:body><w:p><w:r><w:t>Hello</w:t></w:r><w:r><w:t> world</w:t></w:r></w:p>"
+            "<w:p><w:r><w:t>Second paragraph</w:t></w:r></w:p></w:body></w:document>"
+        )
+    assert extract_text(str(path), DOCX_MIME_TYPE) == "Hello world\nSecond paragraph"
+
+
+def test_chat_sends_top_passages_instead_of_files(client, monkeypatch):
+    """Test that chat over an indexed document sends retrieved passages only."""
+    monkeypatch.setattr(gemini_client, "upload_file", lambda path, mime_type=None, display_name=None: SimpleNamespace(
+        name="files/handbook",
+        uri="https://example.com/files/handbook",
+        expiration_time=datetime.now(timezone.utc) + timedelta(hours=48)
+    ))
+    client.post("/api/upload", files={"file": ("handbook.txt", HANDBOOK.encode(), "text/plain")})
+    
+    sent = []
+    
+    def fake_generate(contents):
+        sent.append(contents)
+        return "Twenty five days."
+    
+    def fail_get_file(name):
+        raise AssertionError("indexed documents must not be attached whole")
+    
+    monkeypatch.setattr(gemini_client, "generate", fake_generate)
+    monkeypatch.setattr(gemini_client, "get_file", fail_get_file)
+    monkeypatch.setattr(settings, "retrieval_top_k", 2)
+    
+    response = client.post("/api/chat", json={
+        "query": "How many days of paid vacation leave do employees get?",
+        "file_uris": ["files/handbook"]
+    })
+    assert response.status_code == 200
+    assert response.json()["response"] == "Twenty five days."
+    
+    [contents] = sent
+    assert len(contents) == 1
+    prompt = contents[0]
+    assert "vacation policy grants employees twenty five days" in prompt
+    assert "(handbook.txt)" in prompt
+    assert len(prompt) < len(HANDBOOK)
+
+
+def fts_matches(db, query):
+    """Return the chunk ids matching a query in the full-text index."""
+    return db.execute(
+        text(f"SELECT rowid FROM {CHUNK_FTS_TABLE} WHERE {CHUNK_FTS_TABLE} MATCH :query"),
+        {"query": build_match_query(query)}
+    ).scalars().all()
+
+
+def test_lexical_index_follows_upload_and_delete(client, db, monkeypatch):
+    """Test that chunks enter the full-text index on upload and leave it on delete."""
+    monkeypatch.setattr(gemini_client, "upload_file", lambda path, mime_type=None, display_name=None: SimpleNamespace(
+        name="files/parts", uri="https://example.com/files/parts", expiration_time=None
+    ))
+    monkeypatch.setattr(gemini_client, "delete_file", lambda name: None)
+    catalog = HANDBOOK + " Replacement gasket part XK-9042 fits the rear pump housing."
+    document_id = client.post(
+        "/api/upload", files={"file": ("catalog.txt", catalog.encode(), "text/plain")}
+    ).json()["id"]
+    
+    assert len(fts_matches(db, "XK-9042")) == 1
+    assert fts_matches(db, "XK-9043") == []
+    
+    assert client.delete(f"/api/documents/{document_id}").status_code == 200
+    assert fts_matches(db, "XK-9042") == []
+    # Deleting again must not touch the index a second time
+    assert client.delete(f"/api/documents/{document_id}").status_code == 200
+
+
+def test_chat_finds_exact_identifier(client, monkeypatch):
+    """Test that hybrid retrieval surfaces the chunk holding an exact part number."""
+    monkeypatch.setattr(gemini_client, "upload_file", lambda path, mime_type=None, display_name=None: SimpleNamespace(
+        name="files/parts", uri="https://example.com/files/parts", expiration_time=None
+    ))
+    catalog = HANDBOOK + " Replacement gasket part XK-9042 fits the rear pump housing."
+    client.post("/api/upload", files={"file": ("catalog.txt", catalog.encode(), "text/plain")})
+    
+    sent = []
+    monkeypatch.setattr(gemini_client, "generate", lambda contents: sent.append(contents) or "Rear pump.")
+    monkeypatch.setattr(settings, "retrieval_top_k", 1)
+    
+    response = client.post("/api/chat", json={
+        "query": "Where does XK-9042 go?",
+        "file_uris": ["files/parts"]
+    })
+    assert response.status_code == 200
+    assert "XK-9042 fits the rear pump housing" in sent[0][0]
@@ -1,5 +1,11 @@
+import asyncio
+import json
 import pytest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
 from models import ChatSession, Document, Message
+from gemini_client import gemini_client
+from config import settings
 
 
 def test_create_session(client):
@@ -77,6 +83,93 @@ def test_list_documents_pagination(client, db):
     assert data["total"] == 5
 
 
+def test_list_documents_cursor_pages(client, db):
+    """Test walking documents by cursor, including rows with the same upload time."""
+    uploaded_at = datetime(2024, 1, 1, 12, 0, 0)
+    for i in range(5):
+        db.add(Document(
+            filename=f"test{i}.pdf",
+            original_filename=f"test{i}.pdf",
+            mime_type="application/pdf",
+            file_size=1024,
+            gemini_uri=f"https://example.com/test{i}.pdf",
+            gemini_name=f"files/test{i}",
+            uploaded_at=uploaded_at if i < 4 else uploaded_at + timedelta(hours=1)
+        ))
+    db.commit()
+    
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, "include_total": False}
+        if cursor:
+            params["cursor"] = cursor
+        data = client.get("/api/documents", params=params).json()
+        assert data["total"] is None
+        seen.extend(doc["filename"] for doc in data["documents"])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    
+    assert seen == ["test4.pdf", "test3.pdf", "test2.pdf", "test1.pdf", "test0.pdf"]
+
+
+def test_list_documents_invalid_cursor(client):
+    """Test that a malformed cursor is rejected."""
+    response = client.get("/api/documents?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+
+def test_list_documents_total_refreshed_after_delete(client, sample_document):
+    """Test that the cached total is dropped when a document is deleted."""
+    assert client.get("/api/documents").json()["total"] == 1
+    client.delete(f"/api/documents/{sample_document.id}")
+    assert client.get("/api/documents").json()["total"] == 0
+
+
+def test_list_totals_ignore_uncommitted_writes(engines, db, sample_document):
+    """Test that a total counted over uncommitted rows is not cached, and a rollback drops the entry."""
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from api.routes import list_totals
+    
+    session_factory = async_sessionmaker(engines[1], expire_on_commit=False)
+    query = select(Document.id)
+    key = (Document.__tablename__, "test")
+    misses = list_totals.misses
+    
+    async def scenario():
+        async with session_factory() as writer:
+            writer.add(Document(
+                filename="b.txt", original_filename="b.txt", mime_type="text/plain", file_size=1,
+                gemini_uri="uri", gemini_name="files/b"
+            ))
+            await writer.flush()
+            assert await list_totals.count(writer, key, query) == 2
+            async with session_factory() as reader:
+                assert await list_totals.count(reader, key, query) == 1
+            await writer.rollback()
+        async with session_factory() as reader:
+            return await list_totals.count(reader, key, query)
+    
+    # The reader's entry was counted before the flushed row was rolled back; it is dropped then
+    assert asyncio.run(scenario()) == 1
+    assert list_totals.misses - misses == 3
+
+
+def test_list_sessions_cursor_header(client, db):
+    """Test that sessions are paged through the X-Next-Cursor header."""
+    for i in range(3):
+        db.add(ChatSession(title=f"Session {i}", updated_at=datetime(2024, 1, 1 + i)))
+    db.commit()
+    
+    response = client.get("/api/sessions?limit=2")
+    assert [s["title"] for s in response.json()] == ["Session 2", "Session 1"]
+    
+    response = client.get("/api/sessions", params={"limit": 2, "cursor": response.headers["X-Next-Cursor"]})
+    assert [s["title"] for s in response.json()] == ["Session 0"]
+    assert "X-Next-Cursor" not in response.headers
+
+
 def test_delete_document(client, sample_document):
     """Test deleting a document."""
     response = client.delete(f"/api/documents/{sample_document.id}")
@@ -110,3 +203,224 @@ def test_root_endpoint(client):
     data = response.json()
     assert "message" in data
     assert "version" in data
+
+
+def parse_sse(body: str):
+    """Parse a Server-Sent Events body into (event, data) pairs."""
+    events = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_chat_stream(client, db, sample_session, monkeypatch):
+    """Test streaming chat emits tokens and saves the assistant message."""
+    def fake_stream(contents):
+        yield "Hello "
+        yield "world"
+    
+    monkeypatch.setattr(gemini_client, "stream_generate", fake_stream)
+    
+    response = client.post(
+        "/api/chat/stream",
+        json={"query": "Hi", "session_id": sample_session.id}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    
+    events = parse_sse(response.text)
+    assert [name for name, _ in events] == ["session", "token", "token", "done"]
+    assert events[0][1]["session_id"] == sample_session.id
+    assert "".join(data["text"] for name, data in events if name == "token") == "Hello world"
+    assert events[-1][1]["ttft_ms"] <= events[-1][1]["total_ms"]
+    
+    messages = db.query(Message).filter(Message.session_id == sample_session.id).all()
+    assert [(m.role, m.content) for m in messages] == [("user", "Hi"), ("assistant", "Hello world")]
+
+
+def test_chat_maintains_session_counters(client, sample_session, monkeypatch):
+    """Test that saved messages update the session's count and last message time."""
+    monkeypatch.setattr(gemini_client, "generate", lambda contents: "Answer")
+    
+    for query in ("First", "Second"):
+        response = client.post("/api/chat", json={"query": query, "session_id": sample_session.id})
+        assert response.status_code == 200
+    
+    sessions = client.get("/api/sessions").json()
+    session = next(item for item in sessions if item["id"] == sample_session.id)
+    assert session["message_count"] == 4
+    assert session["last_message_at"] is not None
+    messages = client.get(f"/api/sessions/{sample_session.id}/messages").json()["messages"]
+    assert session["last_message_at"] == messages[-1]["created_at"]
+
+
+def test_chat_releases_connection_during_generation(client, sample_session, checked_out_connections, monkeypatch):
+    """Test that no pooled connection is held while the model generates or streams."""
+    during_generation = []
+    
+    def fake_generate(contents):
+        during_generation.append(checked_out_connections["checked_out"])
+        return "Answer"
+    
+    def fake_stream(contents):
+        during_generation.append(checked_out_connections["checked_out"])
+        yield "Streamed"
+        during_generation.append(checked_out_connections["checked_out"])
+    
+    monkeypatch.setattr(gemini_client, "generate", fake_generate)
+    monkeypatch.setattr(gemini_client, "stream_generate", fake_stream)
+    
+    assert client.post("/api/chat", json={"query": "First", "session_id": sample_session.id}).status_code == 200
+    response = client.post("/api/chat/stream", json={"query": "Second", "session_id": sample_session.id})
+    assert parse_sse(response.text)[-1][0] == "done"
+    assert client.post("/api/chat", json={"query": "New session"}).status_code == 200
+    
+    assert during_generation == [0, 0, 0, 0]
+
+
+def test_chat_stream_upstream_error(client, db, sample_session, monkeypatch):
+    """Test streaming chat reports upstream failures as an error event."""
+    def failing_stream(contents):
+        yield "partial"
+        raise RuntimeError("quota exceeded")
+    
+    monkeypatch.setattr(gemini_client, "stream_generate", failing_stream)
+    
+    response = client.post(
+        "/api/chat/stream",
+        json={"query": "Hi", "session_id": sample_session.id}
+    )
+    events = parse_sse(response.text)
+    assert events[-1][0] == "error"
+    assert "quota exceeded" in events[-1][1]["detail"]
+    
+    roles = [m.role for m in db.query(Message).filter(Message.session_id == sample_session.id)]
+    assert roles == ["user"]
+
+
+def test_stats(client):
+    """Test runtime statistics endpoint."""
+    response = client.get("/api/stats")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["gemini_executor"]["in_flight"] == 0
+    assert "queue_depth" in data["gemini_executor"]
+
+
+@pytest.fixture
+def fake_gemini_upload(monkeypatch):
+    """Replace the Gemini upload with a local stub that records calls."""
+    calls = []
+    
+    def fake_upload_file(file_path, mime_type=None, display_name=None):
+        calls.append(file_path)
+        return SimpleNamespace(
+            name=f"files/upload{len(calls)}",
+            uri=f"https://example.com/files/upload{len(calls)}",
+            expiration_time=datetime.now(timezone.utc) + timedelta(hours=48)
+        )
+    
+    monkeypatch.setattr(gemini_client, "upload_file", fake_upload_file)
+    return calls
+
+
+def test_upload_document(client, fake_gemini_upload):
+    """Test uploading a document."""
+    response = client.post(
+        "/api/upload",
+        files={"file": ("notes.txt", b"hello world", "text/plain")}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["gemini_name"] == "files/upload1"
+    assert data["file_size"] == 11
+    assert data["deduplicated"] is False
+    assert len(fake_gemini_upload) == 1
+
+
+def test_upload_duplicate_reuses_document(client, fake_gemini_upload):
+    """Test that re-uploading identical content skips the Gemini upload."""
+    first = client.post("/api/upload", files={"file": ("a.txt", b"same content", "text/plain")}).json()
+    second = client.post("/api/upload", files={"file": ("b.txt", b"same content", "text/plain")}).json()
+    
+    assert second["id"] == first["id"]
+    assert second["deduplicated"] is True
+    assert len(fake_gemini_upload) == 1
+    assert client.get("/api/documents").json()["total"] == 1
+
+
+def test_upload_duplicate_of_expired_file_uploads_again(client, db, fake_gemini_upload):
+    """Test that an expired Gemini file is not reused."""
+    first = client.post("/api/upload", files={"file": ("a.txt", b"same content", "text/plain")}).json()
+    document = db.get(Document, first["id"])
+    document.gemini_expires_at = datetime.utcnow() - timedelta(minutes=1)
+    db.commit()
+    
+    second = client.post("/api/upload", files={"file": ("a.txt", b"same content", "text/plain")}).json()
+    assert second["id"] != first["id"]
+    assert second["deduplicated"] is False
+    assert len(fake_gemini_upload) == 2
+
+
+def test_upload_rejects_oversized_file(client, fake_gemini_upload, monkeypatch):
+    """Test that files over the size limit are rejected before reaching Gemini."""
+    monkeypatch.setattr(settings, "max_file_size", 16)
+    response = client.post(
+        "/api/upload",
+        files={"file": ("big.txt", b"x" * 64, "text/plain")}
+    )
+    assert response.status_code == 413
+    assert fake_gemini_upload == []
+
+
+def test_upload_rejects_mislabelled_file(client, fake_gemini_upload):
+    """Test that the sniffed content type wins over the declared one."""
+    response = client.post(
+        "/api/upload",
+        files={"file": ("image.pdf", b"\x89PNG\r\n\x1a\n" + b"\x00" * 64, "application/pdf")}
+    )
+    assert response.status_code == 415
+    assert fake_gemini_upload == []
+
+
+def test_upload_batch(client, fake_gemini_upload):
+    """Test uploading several files in one request with per-file results."""
+    response = client.post(
+        "/api/upload/batch",
+        files=[
+            ("files", ("a.txt", b"first document", "text/plain")),
+            ("files", ("b.txt", b"second document", "text/plain")),
+            ("files", ("a-copy.txt", b"first document", "text/plain")),
+            ("files", ("bad.pdf", b"\x89PNG\r\n\x1a\n" + b"\x00" * 64, "application/pdf")),
+        ]
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["status"] for r in data["results"]] == ["uploaded", "uploaded", "deduplicated", "failed"]
+    assert data["succeeded"] == 3
+    assert data["failed"] == 1
+    assert data["results"][2]["document"]["id"] == data["results"][0]["document"]["id"]
+    assert len(fake_gemini_upload) == 2
+    assert client.get("/api/documents").json()["total"] == 2
+
+
+def test_upload_batch_isolates_upstream_failures(client, monkeypatch):
+    """Test that one failed Gemini upload does not abort the rest of the batch."""
+    def fake_upload_file(file_path, mime_type=None, display_name=None):
+        if display_name == "fails.txt":
+            raise ConnectionError("upload reset")
+        return SimpleNamespace(name=f"files/{display_name}", uri=f"https://example.com/{display_name}")
+    
+    monkeypatch.setattr(gemini_client, "upload_file", fake_upload_file)
+    response = client.post(
+        "/api/upload/batch",
+        files=[
+            ("files", ("ok.txt", b"fine", "text/plain")),
+            ("files", ("fails.txt", b"broken", "text/plain")),
+        ]
+    )
+    data = response.json()
+    assert [r["status"] for r in data["results"]] == ["uploaded", "failed"]
+    assert "upload reset" in data["results"][1]["error"]
+    assert client.get("/api/documents").json()["total"] == 1
@@ -0,0 +1,127 @@
+import json
+import pytest
+import tracing
+from gemini_client import gemini_client
+from tracing import Span, Trace, TraceFileExporter, Tracer, current_span, span, tracer, trace_to_otlp
+
+TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+@pytest.fixture
+def traced(tmp_path, monkeypatch):
+    """Trace every request into a scratch file."""
+    exporter = TraceFileExporter(str(tmp_path / "traces.jsonl"), max_bytes=1048576, backup_count=2)
+    monkeypatch.setattr(tracer, "sample_rate", 1.0)
+    monkeypatch.setattr(tracer, "exporter", exporter)
+    yield exporter
+    exporter.shutdown()
+
+
+def read_traces(exporter: TraceFileExporter) -> list:
+    exporter.flush()
+    with open(exporter.path) as f:
+        return [json.loads(line) for line in f]
+
+
+def spans_of(document: dict) -> list:
+    return document["resourceSpans"][0]["scopeSpans"][0]["spans"]
+
+
+def test_span_is_noop_without_sampled_request():
+    """Test that stages outside a sampled request record nothing."""
+    with span("stage") as child:
+        assert child is None
+        assert current_span() is None
+
+
+def test_spans_nest_and_record_errors():
+    """Test parent links, the current span and error status."""
+    trace = Trace("a" * 32, "req-1")
+    root = Span(trace, "root", None)
+    token = tracing._current_span.set(root)
+    try:
+        with span("outer", files=2) as outer:
+            with span("inner") as inner:
+                assert current_span() is inner
+            with pytest.raises(ValueError):
+                with span("failing"):
+                    raise ValueError("boom")
+    finally:
+        tracing._current_span.reset(token)
+    root.end()
+
+    by_name = {item["name"]: item for item in spans_of(trace_to_otlp(trace))}
+    assert by_name["inner"]["parentSpanId"] == outer.span_id
+    assert by_name["outer"]["parentSpanId"] == root.span_id
+    assert "parentSpanId" not in by_name["root"]
+    assert by_name["failing"]["status"] == {"code": 2, "message": "ValueError: boom"}
+    assert {"key": "files", "value": {"intValue": "2"}} in by_name["outer"]["attributes"]
+    assert {"key": "request_id", "value": {"stringValue": "req-1"}} in by_name["inner"]["attributes"]
+
+
+def test_exporter_rotates_files(tmp_path):
+    """Test that the export file is rotated at its size limit, keeping backups."""
+    exporter = TraceFileExporter(str(tmp_path / "traces.jsonl"), max_bytes=600, backup_count=2)
+    for index in range(10):
+        trace = Trace(f"{index:032x}", f"req-{index}")
+        Span(trace, "request", None).end()
+        exporter.export(trace)
+    exporter.flush()
+    exporter.shutdown()
+
+    assert exporter.exported == 10
+    assert (tmp_path / "traces.jsonl.1").exists()
+    assert (tmp_path / "traces.jsonl.2").exists()
+    assert not (tmp_path / "traces.jsonl.3").exists()
+    with open(tmp_path / "traces.jsonl") as f:
+        last = json.loads(f.readlines()[-1])
+    assert spans_of(last)[0]["traceId"] == f"{9:032x}"
+
+
+def test_chat_request_is_traced(client, sample_session, traced, monkeypatch):
+    """Test stage spans, Server-Timing and export for a sampled chat request."""
+    monkeypatch.setattr(gemini_client, "generate", lambda contents: "Answer")
+
+    response = client.post(
+        "/api/chat",
+        json={"query": "Hello", "file_uris": [], "session_id": sample_session.id},
+        headers={"X-Request-ID": "req-42"},
+    )
+    assert response.status_code == 200
+    assert response.headers["x-request-id"] == "req-42"
+    timing = response.headers["server-timing"]
+    for stage in ("session.lookup", "message.save_user", "gemini.generate", "message.save_assistant", "db.query"):
+        assert f"{stage};dur=" in timing
+    assert timing.split(", ")[-1].startswith("total;dur=")
+
+    spans = spans_of(read_traces(traced)[-1])
+    root = next(item for item in spans if "parentSpanId" not in item)
+    assert root["name"] == "POST /api/chat"
+    assert root["kind"] == 2
+    assert {"key": "http.status_code", "value": {"intValue": "200"}} in root["attributes"]
+    assert all(item["traceId"] == root["traceId"] for item in spans)
+    assert all({"key": "request_id", "value": {"stringValue": "req-42"}} in item["attributes"] for item in spans)
+    save = next(item for item in spans if item["name"] == "message.save_user")
+    assert any(item["name"] == "db.query" and item["parentSpanId"] == save["spanId"] for item in spans)
+
+
+def test_sampling_and_traceparent(client, traced, monkeypatch):
+    """Test that unsampled requests are untouched and a sampled traceparent forces a trace."""
+    monkeypatch.setattr(tracer, "sample_rate", 0.0)
+    response = client.get("/api/sessions")
+    assert "server-timing" not in response.headers
+    assert "x-request-id" not in response.headers
+
+    response = client.get("/api/sessions", headers={"traceparent": TRACEPARENT})
+    assert "total;dur=" in response.headers["server-timing"]
+    spans = spans_of(read_traces(traced)[-1])
+    root = next(item for item in spans if item["name"] == "GET /api/sessions")
+    assert root["traceId"] == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert root["parentSpanId"] == "00f067aa0ba902b7"
+
+
+def test_tracer_disabled_outputs_never_sample():
+    """Test that a tracer with nowhere to report does not sample."""
+    assert not Tracer(1.0, exporter=None, server_timing=False).should_sample(TRACEPARENT)
+    assert Tracer(0.0, exporter=None).should_sample(TRACEPARENT)
+    assert not Tracer(0.0, exporter=None).should_sample(TRACEPARENT[:-2] + "00")
@@ -0,0 +1,217 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from concurrency import BoundedExecutor, QueueTimeoutError
+from gemini_client import gemini_client
+from transport import (
+    BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN, CircuitBreaker, CircuitOpenError,
+    DeadlineExceededError, ResilientTransport, backoff_delay, is_retryable
+)
+
+
+class FakeUpstream:
+    """Fault-injecting stand-in for a Gemini SDK call."""
+    
+    def __init__(self, failures=(), delays=()):
+        self.failures = list(failures)  # Exception to raise per call, None to succeed
+        self.delays = list(delays)  # Seconds to block per call
+        self.calls = 0
+        self._lock = threading.Lock()
+    
+    def __call__(self, value="ok"):
+        with self._lock:
+            call = self.calls
+            self.calls += 1
+        if call < len(self.delays):
+            time.sleep(self.delays[call])
+        if call < len(self.failures) and self.failures[call] is not None:
+            raise self.failures[call]
+        return value
+    
+    def stream(self, chunks=("a", "b"), fail_after=None, error=None):
+        """Yield chunks, raising ``error`` once ``fail_after`` chunks were sent."""
+        with self._lock:
+            call = self.calls
+            self.calls += 1
+        for index, chunk in enumerate(chunks):
+            if fail_after == index and (call < len(self.failures) and self.failures[call] is not None):
+                raise self.failures[call]
+            yield chunk
+
+
+def make_transport(max_attempts=3, timeout=1.0, threshold=5, reset_timeout=30.0, hedge_delay=None):
+    return ResilientTransport(
+        BoundedExecutor(max_workers=4, max_concurrency=4, name="test-transport"),
+        timeouts={"default": timeout},
+        max_attempts=max_attempts,
+        base_delay=0.001,
+        max_delay=0.01,
+        breaker=CircuitBreaker(failure_threshold=threshold, reset_timeout=reset_timeout),
+        hedge_delay=hedge_delay,
+    )
+
+
+def test_is_retryable():
+    """Test classification of transient and permanent errors."""
+    assert is_retryable(google_exceptions.ServiceUnavailable("down"))
+    assert is_retryable(google_exceptions.TooManyRequests("slow down"))
+    assert is_retryable(ConnectionError("reset"))
+    assert is_retryable(DeadlineExceededError("generate", 1.0))
+    assert not is_retryable(google_exceptions.InvalidArgument("bad"))
+    assert not is_retryable(ValueError("bad"))
+
+
+def test_backoff_delay_is_capped_and_jittered():
+    """Test that delays stay within the exponential cap."""
+    delays = [backoff_delay(attempt, 0.5, 2.0) for attempt in (1, 2, 3, 4, 5) for _ in range(20)]
+    assert all(0 <= delay <= 2.0 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_retries_transient_errors():
+    """Test that transient failures are retried until success."""
+    transport = make_transport()
+    upstream = FakeUpstream(failures=[google_exceptions.ServiceUnavailable("down"), ConnectionError("reset")])
+    assert asyncio.run(transport.call("generate", upstream, "answer")) == "answer"
+    assert upstream.calls == 3
+    stats = transport.stats()
+    assert stats["operations"]["generate"]["retries"] == 2
+    assert stats["breaker"]["state"] == BREAKER_CLOSED
+
+
+def test_does_not_retry_permanent_errors():
+    """Test that bad requests fail at once without tripping the breaker."""
+    transport = make_transport(threshold=1)
+    upstream = FakeUpstream(failures=[google_exceptions.InvalidArgument("bad")] * 3)
+    with pytest.raises(google_exceptions.InvalidArgument):
+        asyncio.run(transport.call("generate", upstream))
+    assert upstream.calls == 1
+    assert transport.breaker.state == BREAKER_CLOSED
+
+
+def test_deadline_bounds_each_attempt():
+    """Test that a hanging call is abandoned after its deadline and retried."""
+    transport = make_transport(max_attempts=2, timeout=0.05)
+    upstream = FakeUpstream(delays=[0.5, 0.5])
+    start_time = time.perf_counter()
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(transport.call("get", upstream))
+    assert time.perf_counter() - start_time < 0.4
+    counters = transport.stats()["operations"]["get"]
+    assert counters["timeouts"] == 2
+    assert counters["failures"] == 1
+
+
+def test_saturated_executor_does_not_open_breaker():
+    """Test that the deadline starts once a slot is free and queue timeouts are not upstream failures."""
+    transport = ResilientTransport(
+        BoundedExecutor(max_workers=1, max_concurrency=1, name="test-saturated"),
+        timeouts={"default": 0.3},
+        max_attempts=3,
+        base_delay=0.001,
+        max_delay=0.01,
+        breaker=CircuitBreaker(failure_threshold=1, reset_timeout=30),
+    )
+    upstream = FakeUpstream(delays=[0.2] * 4)
+    
+    async def saturate():
+        calls = [transport.call("generate", upstream) for _ in range(4)]
+        return await asyncio.gather(*calls, return_exceptions=True)
+    
+    results = asyncio.run(saturate())
+    # The second call queued 0.2s and ran 0.2s: over the timeout in total, within it per part
+    assert results[:2] == ["ok", "ok"]
+    assert all(isinstance(result, QueueTimeoutError) for result in results[2:])
+    assert upstream.calls == 2
+    assert transport.breaker.state == BREAKER_CLOSED
+    counters = transport.stats()["operations"]["generate"]
+    assert counters["queue_timeouts"] == 2
+    assert counters["timeouts"] == 0
+    assert counters["retries"] == 0
+    
+    async def queued_stream():
+        holders = asyncio.gather(*(transport.call("generate", FakeUpstream(delays=[0.2])) for _ in range(2)))
+        await asyncio.sleep(0.01)
+        try:
+            return [chunk async for chunk in transport.stream("generate", upstream.stream)]
+        finally:
+            await holders
+    
+    with pytest.raises(QueueTimeoutError):
+        asyncio.run(queued_stream())
+    assert transport.breaker.state == BREAKER_CLOSED
+
+
+def test_circuit_breaker_opens_and_recovers():
+    """Test fail-fast while open and recovery through a half-open probe."""
+    transport = make_transport(max_attempts=1, threshold=2, reset_timeout=0.05)
+    failing = FakeUpstream(failures=[ConnectionError("down")] * 2)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            asyncio.run(transport.call("generate", failing))
+    assert transport.breaker.state == BREAKER_OPEN
+    
+    healthy = FakeUpstream()
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(transport.call("generate", healthy))
+    assert healthy.calls == 0
+    
+    time.sleep(0.06)
+    assert transport.breaker.state == BREAKER_HALF_OPEN
+    assert asyncio.run(transport.call("generate", healthy)) == "ok"
+    assert transport.breaker.state == BREAKER_CLOSED
+    assert transport.stats()["breaker"]["opened"] == 1
+    assert transport.stats()["breaker"]["rejected"] == 1
+
+
+def test_hedged_read_beats_slow_primary():
+    """Test that a slow idempotent read is raced by a hedged duplicate."""
+    transport = make_transport(hedge_delay=0.02)
+    upstream = FakeUpstream(delays=[0.5, 0.0])
+    start_time = time.perf_counter()
+    assert asyncio.run(transport.call("get", upstream, "file", idempotent=True)) == "file"
+    assert time.perf_counter() - start_time < 0.3
+    counters = transport.stats()["operations"]["get"]
+    assert counters["hedges"] == 1
+    assert counters["hedge_wins"] == 1
+
+
+def test_stream_retries_only_before_first_chunk():
+    """Test stream retries before output starts, and fails fast after."""
+    transport = make_transport()
+    
+    async def collect(upstream, **kwargs):
+        return [chunk async for chunk in transport.stream("generate", upstream.stream, **kwargs)]
+    
+    early = FakeUpstream(failures=[ConnectionError("reset")])
+    assert asyncio.run(collect(early, fail_after=0)) == ["a", "b"]
+    assert early.calls == 2
+    
+    late = FakeUpstream(failures=[ConnectionError("reset")] * 3)
+    received = []
+    
+    async def consume():
+        async for chunk in transport.stream("generate", late.stream, fail_after=1):
+            received.append(chunk)
+    
+    with pytest.raises(ConnectionError):
+        asyncio.run(consume())
+    assert received == ["a"]
+    assert late.calls == 1
+
+
+def test_open_breaker_returns_503_with_retry_after(client, monkeypatch):
+    """Test that chat fails fast with Retry-After while Gemini is marked unavailable."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    monkeypatch.setattr(gemini_client.transport, "breaker", breaker)
+    monkeypatch.setattr(gemini_client, "generate", lambda contents: pytest.fail("breaker was bypassed"))
+    
+    response = client.post("/api/chat", json={"query": "Hi"})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert client.get("/api/stats").json()["gemini_transport"]["breaker"]["state"] == BREAKER_OPEN
@@ -0,0 +1,66 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from exceptions import FileSizeExceededError, InvalidFileTypeError
+from upload_pipeline import resolve_mime_type, stream_to_disk
+
+ALLOWED_TYPES = [
+    "application/pdf",
+    "text/plain",
+    "text/csv",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+]
+
+PDF_BYTES = b"%PDF-1.4\n1 0 obj\n<< /Type /Catalog >>\nendobj\n" * 10
+
+
+def test_stream_to_disk_computes_size_and_hash(tmp_path):
+    """Test that a single pass yields the size, hash and sniffed type."""
+    dest = tmp_path / "out.pdf"
+    mime_type, size, content_hash = stream_to_disk(
+        io.BytesIO(PDF_BYTES), str(dest), "application/pdf", 1024 * 1024, ALLOWED_TYPES
+    )
+    assert mime_type == "application/pdf"
+    assert size == len(PDF_BYTES)
+    assert content_hash == hashlib.sha256(PDF_BYTES).hexdigest()
+    assert dest.read_bytes() == PDF_BYTES
+
+
+def test_stream_to_disk_aborts_over_limit(tmp_path, monkeypatch):
+    """Test that the copy stops at the first chunk past the limit."""
+    monkeypatch.setattr("upload_pipeline.UPLOAD_CHUNK_SIZE", 100)
+    source = io.BytesIO(b"a" * 1000)
+    dest = tmp_path / "out.txt"
+    
+    with pytest.raises(FileSizeExceededError):
+        stream_to_disk(source, str(dest), "text/plain", 250, ALLOWED_TYPES)
+    
+    assert not dest.exists()
+    assert source.tell() == 300
+
+
+def test_stream_to_disk_rejects_disallowed_content(tmp_path):
+    """Test that content sniffing rejects a binary declared as PDF."""
+    dest = tmp_path / "out.pdf"
+    with pytest.raises(InvalidFileTypeError):
+        stream_to_disk(
+            io.BytesIO(b"\x89PNG\r\n\x1a\n" + b"\x00" * 64),
+            str(dest), "application/pdf", 1024, ALLOWED_TYPES
+        )
+    assert not os.path.exists(dest)
+
+
+def test_resolve_mime_type_keeps_specific_text_type():
+    """Test that a declared CSV type survives a plain-text sniff."""
+    assert resolve_mime_type(b"a,b\n1,2\n", "text/csv", ALLOWED_TYPES) == "text/csv"
+
+
+def test_resolve_mime_type_falls_back_to_declared_without_libmagic(monkeypatch):
+    """Test behaviour when libmagic is not installed."""
+    monkeypatch.setattr("upload_pipeline.magic", None)
+    assert resolve_mime_type(b"anything", "application/pdf", ALLOWED_TYPES) == "application/pdf"
+    with pytest.raises(InvalidFileTypeError):
+        resolve_mime_type(b"anything", "image/png", ALLOWED_TYPES)
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from embeddings import normalize_rows
+from vector_store import VectorStore
+
+
+def random_vectors(rows, dim, seed):
+    """Return unit-length float32 vectors."""
+    return normalize_rows(np.random.default_rng(seed).standard_normal((rows, dim)).astype(np.float32))
+
+
+def test_add_and_search(tmp_path):
+    """Test that search returns the closest live rows of the requested documents."""
+    store = VectorStore(str(tmp_path), dim=8)
+    first = random_vectors(3, 8, seed=1)
+    second = random_vectors(2, 8, seed=2)
+    store.add(1, [10, 11, 12], first)
+    store.add(2, [20, 21], second)
+
+    chunk_ids, scores = store.search(first[1], [1, 2], k=2)
+    assert chunk_ids[0] == 11
+    assert scores[0] == pytest.approx(1.0)
+    assert len(chunk_ids) == 2
+
+    # Rows of other documents are never returned
+    chunk_ids, _ = store.search(first[1], [2], k=5)
+    assert sorted(chunk_ids.tolist()) == [20, 21]
+
+
+def test_add_rejects_wrong_shape(tmp_path):
+    """Test that vectors must match the store dimension."""
+    store = VectorStore(str(tmp_path), dim=8)
+    with pytest.raises(ValueError):
+        store.add(1, [1, 2], random_vectors(2, 4, seed=0))
+
+
+def test_remove_document_tombstones_rows(tmp_path):
+    """Test that removed documents disappear from search results."""
+    store = VectorStore(str(tmp_path), dim=8, compact_ratio=0.9)
+    vectors = random_vectors(4, 8, seed=3)
+    store.add(1, [1, 2], vectors[:2])
+    store.add(2, [3, 4], vectors[2:])
+
+    assert store.remove_document(1) == 2
+    assert store.stats()["dead_rows"] == 2
+    chunk_ids, _ = store.search(vectors[0], [1, 2], k=4)
+    assert sorted(chunk_ids.tolist()) == [3, 4]
+
+
+def test_compaction_reclaims_dead_rows(tmp_path):
+    """Test that compaction rewrites the store without tombstoned rows."""
+    store = VectorStore(str(tmp_path), dim=8, compact_ratio=0.3)
+    vectors = random_vectors(6, 8, seed=4)
+    store.add(1, [1, 2, 3], vectors[:3])
+    store.add(2, [4, 5, 6], vectors[3:])
+
+    store.remove_document(1)  # Half the rows are dead, over the ratio
+
+    stats = store.stats()
+    assert stats["rows"] == 3
+    assert stats["dead_rows"] == 0
+    chunk_ids, scores = store.search(vectors[4], [2], k=1)
+    assert chunk_ids.tolist() == [5]
+    assert scores[0] == pytest.approx(1.0)
+
+
+def test_reopen_persists_vectors(tmp_path):
+    """Test that a reopened store maps the vectors written earlier."""
+    vectors = random_vectors(3, 8, seed=5)
+    VectorStore(str(tmp_path), dim=8).add(7, [1, 2, 3], vectors)
+
+    # The stored dimension wins over the one passed in
+    reopened = VectorStore(str(tmp_path), dim=16)
+    assert reopened.dim == 8
+    assert reopened.stats()["rows"] == 3
+    chunk_ids, _ = reopened.search(vectors[2], [7], k=1)
+    assert chunk_ids.tolist() == [3]
+
+
+def test_search_empty_store(tmp_path):
+    """Test searching a store with no vectors."""
+    store = VectorStore(str(tmp_path), dim=8)
+    chunk_ids, scores = store.search(random_vectors(1, 8, seed=6)[0], [1], k=3)
+    assert len(chunk_ids) == 0
+    assert len(scores) == 0
+
+
+def test_reopen_drops_unindexed_rows(tmp_path):
+    """Test that vectors appended without index records are cut off on open."""
+    first, second = random_vectors(2, 8, seed=7), random_vectors(1, 8, seed=8)
+    VectorStore(str(tmp_path), dim=8).add(1, [1, 2], first)
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(random_vectors(1, 8, seed=9).tobytes())
+
+    reopened = VectorStore(str(tmp_path), dim=8)
+    reopened.add(2, [3], second)
+
+    chunk_ids, scores = reopened.search(second[0], [2], k=1)
+    assert chunk_ids.tolist() == [3]
+    assert scores[0] == pytest.approx(1.0)
+    assert (tmp_path / "vectors.f32").stat().st_size == 3 * 8 * 4
+
+
+def test_failed_add_is_rolled_back(tmp_path, monkeypatch):
+    """Test that vectors are removed again when writing their index records fails."""
+    store = VectorStore(str(tmp_path), dim=8)
+    store.add(1, [1], random_vectors(1, 8, seed=10))
+
+    def failing_open(path, mode="r", *args, **kwargs):
+        if str(path).endswith("index.bin") and mode == "ab":
+            raise OSError("disk full")
+        return open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr("vector_store.open", failing_open, raising=False)
+    with pytest.raises(OSError):
+        store.add(2, [2], random_vectors(1, 8, seed=11))
+    monkeypatch.undo()
+
+    later = random_vectors(1, 8, seed=12)
+    store.add(3, [3], later)
+    chunk_ids, scores = store.search(later[0], [3], k=1)
+    assert chunk_ids.tolist() == [3]
+    assert scores[0] == pytest.approx(1.0)
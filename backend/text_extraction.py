@@ -0,0 +1,48 @@
+import zipfile
+from xml.etree import ElementTree
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDF text extraction is optional
+    PdfReader = None
+
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def extract_pdf_text(path: str) -> str:
+    """Extract the text layer of a PDF, page by page."""
+    if PdfReader is None:
+        return ""
+    reader = PdfReader(path)
+    return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def extract_docx_text(path: str) -> str:
+    """Extract paragraph text from a .docx file."""
+    with zipfile.ZipFile(path) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+    paragraphs = []
+    for paragraph in root.iter(f"{WORD_NAMESPACE}p"):
+        text = "".join(node.text or "" for node in paragraph.iter(f"{WORD_NAMESPACE}t"))
+        if text:
+            paragraphs.append(text)
+    return "\n".join(paragraphs)
+
+
+def extract_text(path: str, mime_type: str) -> str:
+    """
+    Extract plain text from an uploaded file.
+
+    Returns an empty string for formats that cannot be read locally (for example
+    PDFs when pypdf is not installed); such documents are still sent to the model
+    as whole files.
+    """
+    if mime_type == "application/pdf":
+        return extract_pdf_text(path)
+    if mime_type == DOCX_MIME_TYPE:
+        return extract_docx_text(path)
+    if mime_type.startswith("text/"):
+        with open(path, "rb") as f:
+            return f.read().decode("utf-8", errors="replace")
+    return ""
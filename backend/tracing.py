@@ -0,0 +1,374 @@
+import contextvars
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import settings
+from logger import get_logger
+from metrics import statement_type
+
+logger = get_logger("tracing")
+
+SERVICE_NAME = "rag-file-chat"
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+SERVER_TIMING_NAME = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class Trace:
+    """Spans of one sampled request."""
+    __slots__ = ("trace_id", "request_id", "spans")
+
+    def __init__(self, trace_id: str, request_id: str):
+        self.trace_id = trace_id
+        self.request_id = request_id
+        self.spans: List["Span"] = []
+
+
+class Span:
+    """A timed stage of a request."""
+    __slots__ = ("trace", "name", "span_id", "parent_id", "kind", "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], kind: int = SPAN_KIND_INTERNAL, **attributes):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if error is not None:
+                self.error = f"{type(error).__name__}: {error}"
+            self.trace.spans.append(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes) -> Optional[Span]:
+    """
+    Start a child of the current span without making it current.
+
+    For stages that cross ``yield`` in async generators; the caller ends it.
+    Returns None when the request is not sampled.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    return Span(parent.trace, name, parent.span_id, kind, request_id=parent.trace.request_id, **attributes)
+
+
+@contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes) -> Iterator[Optional[Span]]:
+    """Time a stage as a child of the current span; a no-op for unsampled requests."""
+    child = start_span(name, kind, **attributes)
+    if child is None:
+        yield None
+        return
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.end(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+
+def attribute_value(value) -> dict:
+    """Encode an attribute as an OTLP ``AnyValue``."""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def span_to_otlp(item: Span) -> dict:
+    encoded = {
+        "traceId": item.trace.trace_id,
+        "spanId": item.span_id,
+        "name": item.name,
+        "kind": item.kind,
+        "startTimeUnixNano": str(item.start_ns),
+        "endTimeUnixNano": str(item.end_ns),
+        "attributes": [{"key": key, "value": attribute_value(value)} for key, value in item.attributes.items()],
+        "status": {"code": STATUS_ERROR, "message": item.error} if item.error else {"code": STATUS_OK},
+    }
+    if item.parent_id:
+        encoded["parentSpanId"] = item.parent_id
+    return encoded
+
+
+def trace_to_otlp(trace: Trace) -> dict:
+    """Encode a trace as an OTLP/JSON ``TracesData`` document."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": "rag_file_chat.tracing"},
+                "spans": [span_to_otlp(item) for item in trace.spans],
+            }],
+        }]
+    }
+
+
+class TraceFileExporter:
+    """
+    Writes finished traces as OTLP/JSON lines (one ``TracesData`` per line, as
+    the OpenTelemetry collector's file exporter does) from a background thread.
+
+    The request path only enqueues; encoding and disk writes happen on the
+    writer thread. The file is rotated at ``max_bytes`` keeping
+    ``backup_count`` old files, and traces are dropped if the queue is full.
+    """
+
+    def __init__(self, path: str, max_bytes: int, backup_count: int, max_queue: int = 10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue: "queue.Queue[Optional[Trace]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+
+    def export(self, trace: Trace) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _rotate(self) -> None:
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _run(self) -> None:
+        while True:
+            trace = self._queue.get()
+            try:
+                if trace is None:
+                    return
+                line = json.dumps(trace_to_otlp(trace), separators=(",", ":")) + "\n"
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                    self._rotate()
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+                self.exported += 1
+            except Exception as e:
+                logger.warning("Could not export trace: %s", e)
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """Block until queued traces are written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def shutdown(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class Tracer:
+    """Decides sampling and hands finished traces to the exporter."""
+
+    def __init__(self, sample_rate: float, exporter: Optional[TraceFileExporter], server_timing: bool = True):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self.server_timing = server_timing
+        self.sampled = 0
+
+    def should_sample(self, traceparent: Optional[str]) -> bool:
+        if self.exporter is None and not self.server_timing:
+            return False
+        if traceparent is not None:
+            match = TRACEPARENT_PATTERN.match(traceparent)
+            if match and int(match.group(3), 16) & 1:
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def finish(self, trace: Trace) -> None:
+        self.sampled += 1
+        if self.exporter is not None:
+            self.exporter.export(trace)
+
+    def stats(self) -> dict:
+        return {
+            "sample_rate": self.sample_rate,
+            "sampled": self.sampled,
+            "exported": self.exporter.exported if self.exporter else 0,
+            "dropped": self.exporter.dropped if self.exporter else 0,
+        }
+
+
+def server_timing_header(trace: Trace, root: Span) -> str:
+    """Summarize finished stages as ``Server-Timing`` entries, summing repeated stages."""
+    totals: Dict[str, float] = {}
+    for item in trace.spans:
+        if item is not root:
+            name = SERVER_TIMING_NAME.sub("_", item.name)
+            totals[name] = totals.get(name, 0.0) + item.duration_ms
+    entries = [f"{name};dur={duration:.1f}" for name, duration in totals.items()]
+    entries.append(f"total;dur={root.duration_ms:.1f}")
+    return ", ".join(entries)
+
+
+def header_value(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening a root span per sampled request.
+
+    The request id comes from ``X-Request-ID`` or is generated, and is echoed
+    back. A sampled W3C ``traceparent`` header forces sampling and continues
+    its trace. For sampled requests the ``Server-Timing`` header lists the
+    stages finished before the response started; the trace is exported once
+    the body has been sent. Unsampled requests only pay for one random draw.
+    Root spans are named after the matched route template, looked up in
+    ``route_templates`` as in ``MetricsMiddleware``.
+    """
+
+    def __init__(self, app: ASGIApp, tracer: Tracer, route_templates: Optional[Dict[int, str]] = None):
+        self.app = app
+        self.tracer = tracer
+        self.route_templates = route_templates or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        traceparent = header_value(scope, b"traceparent")
+        if not self.tracer.should_sample(traceparent):
+            await self.app(scope, receive, send)
+            return
+
+        match = TRACEPARENT_PATTERN.match(traceparent or "")
+        trace_id, parent_id = (match.group(1), match.group(2)) if match else (os.urandom(16).hex(), None)
+        request_id = header_value(scope, b"x-request-id") or os.urandom(8).hex()
+        trace = Trace(trace_id, request_id)
+        root = Span(
+            trace, f"{scope['method']} {scope['path']}", parent_id, SPAN_KIND_SERVER,
+            request_id=request_id, **{"http.method": scope["method"], "url.path": scope["path"]}
+        )
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.status_code", message["status"])
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                if self.tracer.server_timing:
+                    headers.append((b"server-timing", server_timing_header(trace, root).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current_span.set(root)
+        error = None
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _current_span.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                template = self.route_templates.get(id(route)) or getattr(route, "path", scope["path"])
+                root.name = f"{scope['method']} {template}"
+                root.set_attribute("http.route", template)
+            root.end(error)
+            self.tracer.finish(trace)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._trace_span = start_span("db.query", SPAN_KIND_CLIENT, **{"db.operation": statement_type(statement)})
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    child = getattr(context, "_trace_span", None)
+    if child is not None:
+        child.end()
+        context._trace_span = None
+
+
+def _handle_error(exception_context):
+    context = exception_context.execution_context
+    child = getattr(context, "_trace_span", None) if context is not None else None
+    if child is not None:
+        child.end(exception_context.original_exception)
+        context._trace_span = None
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Record a span per statement of sampled requests on a (sync) engine."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+tracer = Tracer(
+    sample_rate=settings.tracing_sample_rate,
+    exporter=TraceFileExporter(
+        settings.tracing_file, settings.tracing_max_bytes, settings.tracing_backup_count
+    ) if settings.tracing_file else None,
+    server_timing=settings.tracing_server_timing,
+)
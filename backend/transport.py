@@ -0,0 +1,343 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional
+
+from concurrency import BoundedExecutor, QueueTimeoutError
+from logger import get_logger
+from metrics import GEMINI_CALL_SECONDS
+
+logger = get_logger("transport")
+
+# HTTP statuses of transient upstream failures (google.api_core exceptions carry them as .code)
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Circuit breaker states
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Gemini is unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when an operation does not finish within its deadline."""
+
+    def __init__(self, operation: str, timeout: float):
+        super().__init__(f"{operation} did not finish within {timeout:.1f}s")
+        self.operation = operation
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Return True for transient errors worth another attempt."""
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    return getattr(exc, "code", None) in RETRYABLE_STATUS_CODES
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Full-jitter exponential backoff for the given 1-based retry attempt."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Fails fast while upstream is degraded.
+
+    After ``failure_threshold`` consecutive retryable failures the breaker opens and
+    rejects calls for ``reset_timeout`` seconds. It then lets a single probe
+    through (half-open): success closes it again, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = BREAKER_CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == BREAKER_OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return BREAKER_HALF_OPEN
+            return self._state
+
+    def before_call(self) -> None:
+        """Raise ``CircuitOpenError`` unless a call may go upstream now."""
+        with self._lock:
+            if self._state == BREAKER_CLOSED:
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+            if self._state == BREAKER_OPEN and remaining <= 0:
+                self._state = BREAKER_HALF_OPEN
+            if self._state == BREAKER_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+            raise CircuitOpenError(max(remaining, 1.0))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = BREAKER_CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == BREAKER_HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != BREAKER_OPEN:
+                    self.opened += 1
+                    logger.warning(
+                        "Circuit breaker opened after %s consecutive failures", self._consecutive_failures
+                    )
+                self._state = BREAKER_OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def record_ignored(self) -> None:
+        """Release a probe whose outcome says nothing about upstream health."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class ResilientTransport:
+    """
+    Runs Gemini SDK calls on a ``BoundedExecutor`` with deadlines, retries,
+    a shared circuit breaker and optional hedging.
+
+    Each attempt is bounded by the operation's timeout, counted from when it gets
+    an executor slot. The wait for the slot is bounded by the same timeout but
+    reported as ``QueueTimeoutError``: local congestion is not retried and does
+    not count against the breaker. Retryable failures are
+    retried up to ``max_attempts`` times with capped, jittered exponential
+    backoff; other errors (bad requests, missing files) are raised at once and do
+    not count against the breaker. Idempotent reads can be hedged: if the first
+    attempt has not answered within ``hedge_delay`` a duplicate is started and the
+    first success wins. A timed-out call cannot be interrupted inside the SDK;
+    its worker thread finishes in the background and its result is dropped.
+    """
+
+    def __init__(
+        self,
+        executor: BoundedExecutor,
+        timeouts: Dict[str, float],
+        max_attempts: int,
+        base_delay: float,
+        max_delay: float,
+        breaker: CircuitBreaker,
+        hedge_delay: Optional[float] = None,
+    ):
+        self.executor = executor
+        self.timeouts = timeouts
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker
+        self.hedge_delay = hedge_delay
+
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, operation: str, name: str) -> None:
+        counters = self._counters.setdefault(
+            operation,
+            {"calls": 0, "retries": 0, "timeouts": 0, "queue_timeouts": 0, "failures": 0, "hedges": 0, "hedge_wins": 0}
+        )
+        counters[name] += 1
+
+    def _timeout(self, operation: str) -> float:
+        return self.timeouts.get(operation, self.timeouts["default"])
+
+    async def _attempt(self, operation: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        timeout = self._timeout(operation)
+        try:
+            return await self.executor.submit(fn, args, kwargs, queue_timeout=timeout, timeout=timeout)
+        except asyncio.TimeoutError:
+            self._count(operation, "timeouts")
+            raise DeadlineExceededError(operation, timeout) from None
+
+    async def _hedged_attempt(self, operation: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run an attempt, racing a duplicate if the first is slower than ``hedge_delay``."""
+        primary = asyncio.ensure_future(self._attempt(operation, fn, *args, **kwargs))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay)
+        if done:
+            return primary.result()
+
+        self._count(operation, "hedges")
+        hedge = asyncio.ensure_future(self._attempt(operation, fn, *args, **kwargs))
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count(operation, "hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, operation: str, fn: Callable[..., Any], *args, idempotent: bool = False, **kwargs) -> Any:
+        """Call ``fn(*args, **kwargs)`` with the resilience policy for ``operation``."""
+        start_time = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await self._call(operation, fn, *args, idempotent=idempotent, **kwargs)
+            outcome = "ok"
+            return result
+        except CircuitOpenError:
+            outcome = "rejected"
+            raise
+        except QueueTimeoutError:
+            outcome = "queue_timeout"
+            raise
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            GEMINI_CALL_SECONDS.labels(operation, outcome).observe(time.perf_counter() - start_time)
+
+    async def _call(self, operation: str, fn: Callable[..., Any], *args, idempotent: bool, **kwargs) -> Any:
+        self._count(operation, "calls")
+        attempt = 1
+        while True:
+            self.breaker.before_call()
+            try:
+                if idempotent and self.hedge_delay is not None:
+                    result = await self._hedged_attempt(operation, fn, *args, **kwargs)
+                else:
+                    result = await self._attempt(operation, fn, *args, **kwargs)
+            except (asyncio.CancelledError, QueueTimeoutError) as e:
+                if isinstance(e, QueueTimeoutError):
+                    self._count(operation, "queue_timeouts")
+                self.breaker.record_ignored()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    self.breaker.record_ignored()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_attempts:
+                    self._count(operation, "failures")
+                    raise
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                logger.warning(
+                    "Gemini %s attempt %s failed, retrying in %.2fs: %s", operation, attempt, delay, e
+                )
+                self._count(operation, "retries")
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def stream(self, operation: str, fn: Callable[..., Iterable], *args, **kwargs) -> AsyncIterator:
+        """
+        Stream ``fn(*args, **kwargs)`` with the resilience policy for ``operation``.
+
+        The deadline bounds the wait for each chunk once the stream has a slot. Failures are retried only until
+        the first chunk has been yielded, since a retry would repeat text the caller
+        already has.
+        """
+        start_time = time.perf_counter()
+        outcome = "error"
+        attempts = self._stream(operation, fn, *args, **kwargs)
+        try:
+            async for item in attempts:
+                yield item
+            outcome = "ok"
+        except CircuitOpenError:
+            outcome = "rejected"
+            raise
+        except QueueTimeoutError:
+            outcome = "queue_timeout"
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        finally:
+            await attempts.aclose()
+            GEMINI_CALL_SECONDS.labels(operation, outcome).observe(time.perf_counter() - start_time)
+
+    async def _stream(self, operation: str, fn: Callable[..., Iterable], *args, **kwargs) -> AsyncIterator:
+        self._count(operation, "calls")
+        timeout = self._timeout(operation)
+        attempt = 1
+        while True:
+            self.breaker.before_call()
+            upstream = self.executor.submit_stream(fn, args, kwargs, queue_timeout=timeout, timeout=timeout)
+            started = False
+            try:
+                while True:
+                    try:
+                        item = await upstream.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        self._count(operation, "timeouts")
+                        raise DeadlineExceededError(operation, timeout) from None
+                    if not started:
+                        started = True
+                        self.breaker.record_success()
+                    yield item
+                if not started:
+                    self.breaker.record_success()
+                return
+            except (asyncio.CancelledError, QueueTimeoutError) as e:
+                if isinstance(e, QueueTimeoutError):
+                    self._count(operation, "queue_timeouts")
+                if not started:
+                    self.breaker.record_ignored()
+                raise
+            except GeneratorExit:
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    if not started:
+                        self.breaker.record_ignored()
+                    raise
+                self.breaker.record_failure()
+                if started or attempt >= self.max_attempts:
+                    self._count(operation, "failures")
+                    raise
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                logger.warning(
+                    "Gemini %s attempt %s failed, retrying in %.2fs: %s", operation, attempt, delay, e
+                )
+                self._count(operation, "retries")
+                attempt += 1
+                await asyncio.sleep(delay)
+            finally:
+                await upstream.aclose()
+
+    def stats(self) -> dict:
+        """Return breaker state and per-operation counters."""
+        return {
+            "breaker": self.breaker.stats(),
+            "operations": {operation: dict(counters) for operation, counters in self._counters.items()},
+        }
@@ -0,0 +1,149 @@
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, List, Optional
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from exceptions import FileSizeExceededError, InvalidFileTypeError
+from metrics import UPLOAD_SIZE_BYTES
+
+try:
+    import magic
+except ImportError:  # python-magic needs the libmagic system library
+    magic = None
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+SNIFF_SIZE = 2048
+
+# Container formats that libmagic may report for a more specific declared type
+COMPATIBLE_MIME_TYPES = {
+    "application/zip": {
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    },
+}
+
+
+@dataclass
+class StagedUpload:
+    """An uploaded file written to local disk, with metadata gathered while streaming."""
+    path: str
+    original_filename: str
+    mime_type: str
+    size: int
+    content_hash: str
+
+    def discard(self) -> None:
+        """Remove the staged file if it still exists."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def sniff_mime_type(head: bytes) -> Optional[str]:
+    """Detect the MIME type from the first bytes of a file, if libmagic is available."""
+    if magic is None:
+        return None
+    return magic.from_buffer(head, mime=True)
+
+
+def resolve_mime_type(head: bytes, declared_type: Optional[str], allowed_types: List[str]) -> str:
+    """
+    Decide the file's MIME type from its content and validate it.
+
+    The client-supplied type is kept only when it agrees with the sniffed one, so a
+    renamed binary cannot pass as an allowed type.
+    """
+    sniffed_type = sniff_mime_type(head)
+    if sniffed_type is None:
+        mime_type = declared_type
+    elif declared_type == sniffed_type or declared_type in COMPATIBLE_MIME_TYPES.get(sniffed_type, ()):
+        mime_type = declared_type
+    elif declared_type and declared_type.startswith("text/") and sniffed_type.startswith("text/"):
+        # libmagic cannot tell CSV or Markdown from plain text reliably
+        mime_type = declared_type
+    else:
+        mime_type = sniffed_type
+
+    if mime_type not in allowed_types:
+        raise InvalidFileTypeError(mime_type, allowed_types)
+    return mime_type
+
+
+def stream_to_disk(
+    source: BinaryIO,
+    dest_path: str,
+    declared_type: Optional[str],
+    max_size: int,
+    allowed_types: List[str],
+):
+    """
+    Copy ``source`` to ``dest_path`` in one pass.
+
+    Size and SHA-256 are computed as chunks are written, the MIME type is sniffed
+    from the first chunk and the copy stops as soon as ``max_size`` is exceeded.
+    Returns ``(mime_type, size, content_hash)``; the destination is removed on error.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    mime_type = None
+    try:
+        with open(dest_path, "wb") as buffer:
+            while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                if mime_type is None:
+                    mime_type = resolve_mime_type(chunk[:SNIFF_SIZE], declared_type, allowed_types)
+                size += len(chunk)
+                if size > max_size:
+                    raise FileSizeExceededError(max_size)
+                digest.update(chunk)
+                buffer.write(chunk)
+        if mime_type is None:
+            mime_type = resolve_mime_type(b"", declared_type, allowed_types)
+    except BaseException:
+        try:
+            os.remove(dest_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return mime_type, size, digest.hexdigest()
+
+
+async def stage_upload(
+    file: UploadFile,
+    upload_dir: str = None,
+    max_size: int = None,
+) -> StagedUpload:
+    """
+    Stream an uploaded file to a unique path under ``upload_dir``.
+
+    Runs the whole copy on a worker thread so the event loop is never blocked, and
+    raises FileSizeExceededError or InvalidFileTypeError without leaving a file behind.
+    """
+    upload_dir = upload_dir or settings.upload_dir
+    max_size = settings.max_file_size if max_size is None else max_size
+    suffix = Path(file.filename or "").suffix
+    dest_path = os.path.join(upload_dir, f"{uuid.uuid4().hex}{suffix}")
+
+    mime_type, size, content_hash = await run_in_threadpool(
+        stream_to_disk,
+        file.file,
+        dest_path,
+        file.content_type,
+        max_size,
+        settings.allowed_file_types_list,
+    )
+    UPLOAD_SIZE_BYTES.observe(size)
+    return StagedUpload(
+        path=dest_path,
+        original_filename=file.filename,
+        mime_type=mime_type,
+        size=size,
+        content_hash=content_hash,
+    )
@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from config import settings
+from logger import get_logger
+
+logger = get_logger("vector_store")
+
+# One record per stored vector; record i describes row i of the vectors file
+INDEX_DTYPE = np.dtype([("chunk_id", "<i8"), ("document_id", "<i8"), ("alive", "u1")])
+
+VECTORS_FILE = "vectors.f32"
+INDEX_FILE = "index.bin"
+META_FILE = "meta.json"
+COMPACT_BLOCK_ROWS = 65536  # Rows copied at a time while compacting
+
+
+def top_k(query_vector: np.ndarray, matrix: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the row indexes and cosine scores of the ``k`` best matches, best first."""
+    scores = matrix @ query_vector
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    order = candidates[np.argsort(-scores[candidates])]
+    return order, scores[order]
+
+
+class VectorStore:
+    """
+    Append-only on-disk store of float32 embeddings, memory-mapped for search.
+
+    Vectors live in a flat ``rows x dim`` float32 file and a parallel index file maps
+    each row to its chunk and ``Document.id``. Opening the store only maps the two
+    files, so startup cost and resident memory do not grow with the corpus. Deleted
+    documents are tombstoned in place and their rows reclaimed by ``compact``.
+    """
+
+    def __init__(self, directory: str, dim: int, compact_ratio: float = 0.3):
+        self.compact_ratio = compact_ratio
+        self._lock = threading.Lock()
+        self.open(directory, dim)
+
+    def open(self, directory: str, dim: int) -> None:
+        """Open (creating if needed) the store in ``directory``."""
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                dim = json.load(f)["dim"]
+        else:
+            with open(meta_path, "w") as f:
+                json.dump({"dim": dim}, f)
+        with self._lock:
+            self.directory = directory
+            self.dim = dim
+            self._remap()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _remap(self) -> None:
+        """Map the current files, dropping any rows not present in both. Caller holds the lock."""
+        rows = min(self._file_rows(INDEX_FILE, INDEX_DTYPE.itemsize), self._file_rows(VECTORS_FILE, self.dim * 4))
+        self._truncate(rows)
+        if rows == 0:
+            self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+            self._index = np.zeros(0, dtype=INDEX_DTYPE)
+        else:
+            self._vectors = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode="r", shape=(rows, self.dim))
+            self._index = np.memmap(self._path(INDEX_FILE), dtype=INDEX_DTYPE, mode="r+", shape=(rows,))
+        self._dead = int(rows - np.count_nonzero(self._index["alive"])) if rows else 0
+
+    def _file_rows(self, name: str, row_bytes: int) -> int:
+        path = self._path(name)
+        return os.path.getsize(path) // row_bytes if os.path.exists(path) else 0
+
+    def _truncate(self, rows: int) -> None:
+        """
+        Cut both files back to ``rows`` rows. Caller holds the lock.
+
+        Row i of the index describes row i of the vectors file, so rows beyond
+        the shorter file (left by a failed or interrupted append) must go before
+        anything else is appended after them.
+        """
+        for name, size in ((VECTORS_FILE, rows * self.dim * 4), (INDEX_FILE, rows * INDEX_DTYPE.itemsize)):
+            path = self._path(name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                logger.warning("Truncating %s bytes of unmatched rows from %s", os.path.getsize(path) - size, path)
+                os.truncate(path, size)
+
+    def add(self, document_id: int, chunk_ids: Iterable[int], vectors: np.ndarray) -> None:
+        """Append the vectors for one document's chunks."""
+        chunk_ids = np.asarray(list(chunk_ids), dtype=np.int64)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.shape != (len(chunk_ids), self.dim):
+            raise ValueError(f"Expected vectors of shape ({len(chunk_ids)}, {self.dim}), got {vectors.shape}")
+
+        records = np.zeros(len(chunk_ids), dtype=INDEX_DTYPE)
+        records["chunk_id"] = chunk_ids
+        records["document_id"] = document_id
+        records["alive"] = 1
+
+        with self._lock:
+            rows = len(self._index)
+            # Vectors first, so an interrupted append never leaves index records past the
+            # end of the vectors file; a failed one is rolled back, a crash is cut on open
+            try:
+                with open(self._path(VECTORS_FILE), "ab") as f:
+                    f.write(vectors.tobytes())
+                with open(self._path(INDEX_FILE), "ab") as f:
+                    f.write(records.tobytes())
+            except BaseException:
+                self._truncate(rows)
+                raise
+            self._remap()
+
+    def remove_document(self, document_id: int) -> int:
+        """Tombstone every row of a document; compacts once enough rows are dead."""
+        with self._lock:
+            if len(self._index) == 0:
+                return 0
+            rows = np.flatnonzero((self._index["document_id"] == document_id) & (self._index["alive"] == 1))
+            if len(rows):
+                self._index["alive"][rows] = 0
+                self._index.flush()
+                self._dead += len(rows)
+            should_compact = self._dead > self.compact_ratio * len(self._index)
+        if should_compact:
+            self.compact()
+        return len(rows)
+
+    def compact(self) -> None:
+        """Rewrite the files without tombstoned rows."""
+        with self._lock:
+            alive = np.flatnonzero(self._index["alive"] == 1) if len(self._index) else np.zeros(0, dtype=np.int64)
+            removed = len(self._index) - len(alive)
+            if removed == 0:
+                return
+            vectors_tmp = self._path(VECTORS_FILE + ".tmp")
+            index_tmp = self._path(INDEX_FILE + ".tmp")
+            with open(vectors_tmp, "wb") as vectors_file, open(index_tmp, "wb") as index_file:
+                for start in range(0, len(alive), COMPACT_BLOCK_ROWS):
+                    block = alive[start:start + COMPACT_BLOCK_ROWS]
+                    vectors_file.write(np.ascontiguousarray(self._vectors[block]).tobytes())
+                    index_file.write(np.asarray(self._index[block]).tobytes())
+            self._vectors = self._index = None
+            os.replace(vectors_tmp, self._path(VECTORS_FILE))
+            os.replace(index_tmp, self._path(INDEX_FILE))
+            self._remap()
+        logger.info("Compacted vector store: removed %s rows, %s remain", removed, len(alive))
+
+    def search(self, query_vector: np.ndarray, document_ids: List[int], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(chunk_ids, scores)`` of the ``k`` best live rows of the given documents."""
+        with self._lock:
+            vectors, index = self._vectors, self._index
+        if len(index) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        mask = (index["alive"] == 1) & np.isin(index["document_id"], document_ids)
+        rows = np.flatnonzero(mask)
+        if len(rows) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        order, scores = top_k(query_vector.astype(np.float32), vectors[rows], k)
+        return np.asarray(index["chunk_id"][rows[order]]), scores
+
+    def stats(self) -> dict:
+        """Return a snapshot of store size."""
+        rows = len(self._index)
+        return {
+            "dim": self.dim,
+            "rows": rows,
+            "dead_rows": self._dead,
+            "bytes": rows * (self.dim * 4 + INDEX_DTYPE.itemsize),
+        }
+
+
+vector_store = VectorStore(
+    settings.vector_store_dir,
+    settings.embedding_dim,
+    compact_ratio=settings.vector_store_compact_ratio
+)
@@ -2,7 +2,6 @@
 
 import { useState, useRef, useEffect } from "react";
 import { Send, Bot, User, Paperclip, Loader2 } from "lucide-react";
-import axios from "axios";
 import { cn } from "@/lib/utils";
 
 interface Message {
@@ -46,18 +45,49 @@ export function ChatInterface() {
 
     try {
       // In a real app, we would pass selected file URIs here
-      const response = await axios.post("http://localhost:8000/api/chat", {
-        query: userMessage.content,
-        file_uris: [], // TODO: Add selected file context
+      const response = await fetch("http://localhost:8000/api/chat/stream", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          query: userMessage.content,
+          file_uris: [], // TODO: Add selected file context
+        }),
       });
+      if (!response.ok || !response.body) {
+        throw new Error(`Chat request failed with status ${response.status}`);
+      }
 
-      const botMessage: Message = {
-        role: "assistant",
-        content: response.data.response,
-        timestamp: new Date(),
-      };
+      setMessages((prev) => [...prev, { role: "assistant", content: "", timestamp: new Date() }]);
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Server-Sent Events frames are separated by a blank line
+        const frames = buffer.split("\n\n");
+        buffer = frames.pop() ?? "";
+        for (const frame of frames) {
+          const event = frame.match(/^event: (.*)$/m)?.[1];
+          const data = frame.match(/^data: (.*)$/m)?.[1];
+          if (!event || !data) continue;
 
-      setMessages((prev) => [...prev, botMessage]);
+          const payload = JSON.parse(data);
+          if (event === "token") {
+            setIsLoading(false);
+            setMessages((prev) => {
+              const last = prev[prev.length - 1];
+              return [...prev.slice(0, -1), { ...last, content: last.content + payload.text }];
+            });
+          } else if (event === "error") {
+            throw new Error(payload.detail);
+          }
+        }
+      }
     } catch (error) {
       console.error("Chat failed", error);
       const errorMessage: Message = {
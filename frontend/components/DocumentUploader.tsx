@@ -13,7 +13,7 @@ interface DocumentUploaderProps {
 
 export function DocumentUploader({ isOpen, onClose, onUploadComplete }: DocumentUploaderProps) {
   const [isDragging, setIsDragging] = useState(false);
-  const [file, setFile] = useState<File | null>(null);
+  const [files, setFiles] = useState<File[]>([]);
   const [isUploading, setIsUploading] = useState(false);
   const [uploadStatus, setUploadStatus] = useState<"idle" | "success" | "error">("idle");
   const fileInputRef = useRef<HTMLInputElement>(null);
@@ -32,37 +32,44 @@ export function DocumentUploader({ isOpen, onClose, onUploadComplete }: Document
   const handleDrop = (e: React.DragEvent) => {
     e.preventDefault();
     setIsDragging(false);
-    if (e.dataTransfer.files && e.dataTransfer.files[0]) {
-      setFile(e.dataTransfer.files[0]);
+    if (e.dataTransfer.files && e.dataTransfer.files.length > 0) {
+      setFiles(Array.from(e.dataTransfer.files));
       setUploadStatus("idle");
     }
   };
 
   const handleFileSelect = (e: React.ChangeEvent<HTMLInputElement>) => {
-    if (e.target.files && e.target.files[0]) {
-      setFile(e.target.files[0]);
+    if (e.target.files && e.target.files.length > 0) {
+      setFiles(Array.from(e.target.files));
       setUploadStatus("idle");
     }
   };
 
   const handleUpload = async () => {
-    if (!file) return;
+    if (files.length === 0) return;
 
     setIsUploading(true);
     const formData = new FormData();
-    formData.append("file", file);
+    files.forEach((f) => formData.append("files", f));
 
     try {
-      await axios.post("http://localhost:8000/api/upload", formData, {
+      // All selected files go in one batch request; the backend uploads them in parallel
+      const response = await axios.post("http://localhost:8000/api/upload/batch", formData, {
         headers: {
           "Content-Type": "multipart/form-data",
         },
       });
+      if (response.data.failed > 0) {
+        console.error("Some files failed to upload", response.data.results);
+        setUploadStatus("error");
+        if (response.data.succeeded > 0) onUploadComplete();
+        return;
+      }
       setUploadStatus("success");
       setTimeout(() => {
         onUploadComplete();
         onClose();
-        setFile(null);
+        setFiles([]);
         setUploadStatus("idle");
       }, 1500);
     } catch (error) {
@@ -84,7 +91,7 @@ export function DocumentUploader({ isOpen, onClose, onUploadComplete }: Document
         </div>
 
         <div className="p-6">
-          {!file ? (
+          {files.length === 0 ? (
             <div
               className={cn(
                 "border-2 border-dashed rounded-xl p-8 text-center transition-all cursor-pointer",
@@ -103,12 +110,13 @@ export function DocumentUploader({ isOpen, onClose, onUploadComplete }: Document
                 className="hidden"
                 onChange={handleFileSelect}
                 accept=".pdf,.txt,.md,.csv"
+                multiple
               />
               <div className="w-12 h-12 bg-gradient-secondary rounded-full flex items-center justify-center mx-auto mb-4 shadow-lg shadow-primary-500/30">
                 <Upload size={24} className="text-white" />
               </div>
               <p className="text-sm font-medium text-slate-200">
-                Dosyayı buraya sürükleyin veya seçin
+                Dosyaları buraya sürükleyin veya seçin
               </p>
               <p className="text-xs text-slate-500 mt-1">PDF, TXT, MD, CSV (Max 10MB)</p>
             </div>
@@ -119,11 +127,15 @@ export function DocumentUploader({ isOpen, onClose, onUploadComplete }: Document
                   <File size={20} />
                 </div>
                 <div className="flex-1 overflow-hidden">
-                  <p className="text-sm font-medium text-slate-200 truncate">{file.name}</p>
-                  <p className="text-xs text-slate-500">{(file.size / 1024).toFixed(1)} KB</p>
+                  <p className="text-sm font-medium text-slate-200 truncate">
+                    {files.length === 1 ? files[0].name : `${files.length} dosya`}
+                  </p>
+                  <p className="text-xs text-slate-500">
+                    {(files.reduce((total, f) => total + f.size, 0) / 1024).toFixed(1)} KB
+                  </p>
                 </div>
                 <button 
-                  onClick={() => setFile(null)} 
+                  onClick={() => setFiles([])} 
                   className="text-slate-400 hover:text-red-400 transition-colors"
                   disabled={isUploading}
                 >